@@ -1,34 +1,336 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
 
-def analysis_function(df,n_clusters=4):
+from pools import get_executor, prune_files, reset_executor
+from profiling import collected_result, profiled, run_collected
+
+FEATURE_COLUMNS = ['评分', '评分人数', '年份']  # 聚类使用的特征
+MINIBATCH_MIN_ROWS = 100000  # algorithm='auto'时行数达到该值改用MiniBatchKMeans
+MINIBATCH_BATCH_SIZE = 4096  # MiniBatchKMeans每批的行数
+WARM_START_MAX_CHANGED = 0.1  # 与上次拟合相比变化的行占比不超过该值时，以上次的质心为初值
+MODEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.analysis_model')  # 模型持久化目录
+MODEL_CACHE_MAX_ENTRIES = 32  # 内存中缓存的模型个数上限
+MODEL_CACHE_MAX_FILES = 256  # 持久化的模型文件个数上限
+PCA_COMPONENTS = 3  # 保存的主成分个数，二维图取前两个
+PCA_INCREMENTAL_MIN_ROWS = 100000  # 行数达到该值时改用IncrementalPCA分批拟合
+PCA_BATCH_SIZE = 50000  # IncrementalPCA每批的行数
+SWEEP_K_VALUES = range(2, 11)  # k扫描的默认候选聚类个数
+SILHOUETTE_SAMPLE_SIZE = 5000  # 计算轮廓系数的抽样行数
+SWEEP_CACHE_MAX_ENTRIES = 16  # 缓存的k扫描结果个数上限
+
+
+def _features(df):
+    """取聚类特征，评价人数取对数；返回新的ndarray，不会修改df"""
+    features=df[FEATURE_COLUMNS].to_numpy(dtype=float, copy=True)
+    features[:, 1]=np.log1p(features[:, 1])
+    return features
+
+
+def _data_fingerprint(features, n_clusters, algorithm):
+    """特征数据与聚类参数的指纹"""
+    h = hashlib.blake2b(repr((features.shape, n_clusters, algorithm)).encode('utf-8'), digest_size=16)
+    h.update(np.ascontiguousarray(features).tobytes())
+    return h.hexdigest()
+
+
+def _row_hashes(features):
+    """逐行哈希，用于估计两次分析之间变化的行数"""
+    return pd.util.hash_pandas_object(pd.DataFrame(features), index=False).to_numpy()
+
+
+def _resolve_algorithm(algorithm, n_rows):
+    if algorithm == 'auto':
+        return 'minibatch' if n_rows >= MINIBATCH_MIN_ROWS else 'kmeans'
+    if algorithm not in ('kmeans', 'minibatch'):
+        raise ValueError("algorithm must be 'auto', 'kmeans' or 'minibatch'")
+    return algorithm
+
+
+def _fit_projection(scaled):
+    """
+    拟合PCA投影，行数较多时用IncrementalPCA分批拟合，内存与批大小相关
+    :return: 拟合好的PCA对象
+    """
+    from sklearn.decomposition import PCA, IncrementalPCA
+    n_components=min(PCA_COMPONENTS, scaled.shape[1])
+    if len(scaled) >= PCA_INCREMENTAL_MIN_ROWS:
+        pca=IncrementalPCA(n_components=n_components, batch_size=PCA_BATCH_SIZE)
+    else:
+        pca=PCA(n_components=n_components)
+    return pca.fit(scaled)
+
+
+def _project(pca, scaled):
+    """分批投影到主成分空间，坐标以float32保存"""
+    coords=np.empty((len(scaled), pca.n_components_), dtype=np.float32)
+    for start in range(0, len(scaled), PCA_BATCH_SIZE):
+        coords[start:start + PCA_BATCH_SIZE]=pca.transform(scaled[start:start + PCA_BATCH_SIZE])
+    return coords
+
+
+def _make_model(algorithm, n_clusters, init=None, batch_size=MINIBATCH_BATCH_SIZE):
+    """创建聚类模型，给定init(初始质心)时只做一次初始化"""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    kwargs = {'n_clusters': n_clusters, 'random_state': 42}
+    if init is not None:
+        kwargs.update(init=init, n_init=1)
+    if algorithm == 'minibatch':
+        return MiniBatchKMeans(batch_size=batch_size, **kwargs)
+    return KMeans(**kwargs)
+
+
+class ModelCache:
+    """
+    拟合好的 (scaler, 聚类模型, PCA投影) 缓存，key: 数据指纹，PCA投影可以为None
+    内存中按LRU保留 max_entries 个，同时持久化到磁盘，进程重启或其他工作进程中同样命中
+    """
+
+    def __init__(self, directory=MODEL_CACHE_DIR, max_entries=MODEL_CACHE_MAX_ENTRIES,
+                 max_files=MODEL_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self._entries = OrderedDict()  # key: 数据指纹, value: (scaler, model, pca)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """获取缓存的 (scaler, model, pca)，未命中时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.load(f)
+            if not isinstance(entry, tuple) or len(entry) != 3:
+                raise ValueError('outdated model file')
+        except Exception:
+            # 文件不存在、损坏、格式过期或由不兼容的scikit-learn版本写入时视为未命中
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, scaler, model, pca=None):
+        """缓存并原子写入持久化文件，写入失败时只保留内存缓存"""
+        entry = (scaler, model, pca)
+        with self._lock:
+            self._remember(key, entry)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        prune_files(self.directory, '.pkl', self.max_files)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+model_cache = ModelCache()  # 进程内共享的模型缓存
+
+_last_fits = {}  # key: (n_clusters, 算法), value: (行哈希, scaler, model)，最近一次拟合，用于warm start
+_last_fits_lock = threading.Lock()
+
+
+def _warm_start_centers(row_hashes, scaler, n_clusters, algorithm):
+    """
+    与最近一次同参数的拟合相比变化的行不多时，将其质心换算到新的标准化空间作为初值
+    :return: 初始质心，无法warm start时返回None
+    """
+    with _last_fits_lock:
+        last = _last_fits.get((n_clusters, algorithm))
+    if last is None:
+        return None
+    old_hashes, old_scaler, old_model = last
+    unchanged = np.isin(row_hashes, old_hashes).sum()
+    changed = 1 - unchanged / max(len(row_hashes), len(old_hashes))
+    if changed > WARM_START_MAX_CHANGED:
+        return None
+    return scaler.transform(old_scaler.inverse_transform(old_model.cluster_centers_))
+
+
+@profiled()
+def analysis_function(df,n_clusters=4,algorithm='auto',warm_start=True,batch_size=MINIBATCH_BATCH_SIZE):
     #df是包括电影名，评分，评价人数和上映年份的DataFrame
     #n_clusters把电影分成几类，默认是4类
-    df_copy=df.copy()
-    features=df_copy[['评分', '评分人数', '年份']].copy()
-    features['评分人数']=np.log1p(features['评分人数'])
+    #algorithm: 'kmeans' / 'minibatch' / 'auto'(行数达到MINIBATCH_MIN_ROWS时使用MiniBatchKMeans)
+    #同一数据与参数拟合过的scaler和模型按数据指纹持久化，再次分析时只需预测标签
+    #warm_start为True时，若与上次拟合相比只有少量行变化，以上次的质心为初值重新拟合
+    #结果中保留标准化后的特征矩阵与PCA投影坐标，PCA图等下游直接复用，不再重复计算
+    #只新增cluster列，浅拷贝即可不影响传入的数据；特征直接取为新的ndarray
+    df_copy=df.copy(deep=False)
+    features=_features(df_copy)
+    algorithm=_resolve_algorithm(algorithm, len(features))
+    fingerprint=_data_fingerprint(features, n_clusters, algorithm)
+    row_hashes=_row_hashes(features) if warm_start else None
 
-    scaler=StandardScaler()
-    scaled=scaler.fit_transform(features)
+    cached=model_cache.get(fingerprint)
+    if cached is not None:
+        scaler, model, pca=cached
+        scaled=scaler.transform(features)
+        df_copy['cluster'] = model.predict(scaled)
+        if pca is None:
+            pca=_fit_projection(scaled)
+            model_cache.put(fingerprint, scaler, model, pca)
+    else:
+        from sklearn.preprocessing import StandardScaler
+        scaler=StandardScaler()
+        scaled=scaler.fit_transform(features)
+        init=_warm_start_centers(row_hashes, scaler, n_clusters, algorithm) if warm_start else None
+        model=_make_model(algorithm, n_clusters, init, batch_size)
+        df_copy['cluster'] = model.fit_predict(scaled)
+        pca=_fit_projection(scaled)
+        model_cache.put(fingerprint, scaler, model, pca)
 
-    model=KMeans(n_clusters=n_clusters, random_state=42)
-    df_copy['cluster'] = model.fit_predict(scaled)
+    if warm_start:
+        with _last_fits_lock:
+            _last_fits[(n_clusters, algorithm)] = (row_hashes, scaler, model)
 
     result = {
         'clustered_data': df_copy,  # 含聚类标签
         'cluster_centers': model.cluster_centers_,
-        'model': model
+        'model': model,
+        'scaler': scaler,
+        'fingerprint': fingerprint,  # 数据与聚类参数的指纹
+        'scaled_data': scaled,  # 标准化后的特征矩阵
+        'pca': pca,
+        'pca_coords': _project(pca, scaled)  # 前PCA_COMPONENTS个主成分坐标(float32)
     }
     return result
 
 
+def _sweep_task(scaled, k, algorithm, batch_size, sample):
+    """进程池中执行的单个k的拟合任务，返回 (模型, 惯性, 抽样轮廓系数)"""
+    model=_make_model(algorithm, k, batch_size=batch_size)
+    labels=model.fit_predict(scaled)
+    sample_labels=labels[sample]
+    if len(np.unique(sample_labels)) < 2:
+        silhouette=float('nan')  # 抽样中只有一个簇时轮廓系数无定义
+    else:
+        from sklearn.metrics import silhouette_score
+        silhouette=float(silhouette_score(scaled[sample], sample_labels))
+    return model, float(model.inertia_), silhouette
 
 
+_sweep_cache = OrderedDict()  # key: (数据指纹, 候选k, 抽样行数), value: k扫描结果
+_sweep_cache_lock = threading.Lock()
 
 
+@profiled()
+def sweep_k(df, k_values=SWEEP_K_VALUES, algorithm='auto', sample_size=SILHOUETTE_SAMPLE_SIZE,
+            max_workers=None, batch_size=MINIBATCH_BATCH_SIZE):
+    """
+    并行拟合一组候选聚类个数，比较惯性(inertia)与抽样轮廓系数(silhouette)
+    - 各k在进程池中并发拟合，标准化只做一次
+    - 轮廓系数在固定的抽样行上计算，各k之间可比，开销与总行数无关
+    - 结果按数据指纹缓存，数据不变时重复调用直接返回；各k的模型同时写入模型缓存，
+      之后以选出的k调用 analysis_function 不再重新拟合
+    :param df: 包括评分、评价人数和上映年份的DataFrame
+    :param k_values: 候选聚类个数
+    :param algorithm: 'kmeans' / 'minibatch' / 'auto'
+    :param sample_size: 计算轮廓系数的抽样行数
+    :param max_workers: 工作进程数，为1时在当前进程串行拟合
+    :return: dict
+        report: DataFrame，列为 k / inertia / silhouette
+        best_k: 轮廓系数最大的k
+        best: 以best_k聚类的分析结果，格式同 analysis_function
+    """
+    k_values=tuple(sorted(set(int(k) for k in k_values)))
+    if not k_values or k_values[0] < 2:
+        raise ValueError("k_values must contain cluster counts of at least 2")
+    features=_features(df)
+    if len(features) <= k_values[-1]:
+        raise ValueError("Not enough rows for the requested cluster counts")
+    algorithm=_resolve_algorithm(algorithm, len(features))
+    cache_key=(_data_fingerprint(features, k_values, algorithm), sample_size)
+    with _sweep_cache_lock:
+        if cache_key in _sweep_cache:
+            _sweep_cache.move_to_end(cache_key)
+            return _sweep_cache[cache_key]
 
+    from sklearn.preprocessing import StandardScaler
+    scaler=StandardScaler()
+    scaled=scaler.fit_transform(features)
+    rng=np.random.default_rng(42)
+    sample=np.sort(rng.choice(len(scaled), size=min(sample_size, len(scaled)), replace=False))
 
+    if max_workers == 1:
+        fits=[_sweep_task(scaled, k, algorithm, batch_size, sample) for k in k_values]
+    else:
+        executor=get_executor(max_workers)
+        futures=[executor.submit(run_collected, _sweep_task, scaled, k, algorithm, batch_size, sample) for k in k_values]
+        fits=[]
+        for future in futures:
+            try:
+                fits.append(collected_result(future))
+            except BrokenProcessPool:
+                reset_executor(executor)
+                raise
 
+    models={}
+    for k, (model, _, _) in zip(k_values, fits):
+        models[k]=model
+        model_cache.put(_data_fingerprint(features, k, algorithm), scaler, model)
+    report=pd.DataFrame({
+        'k': k_values,
+        'inertia': [inertia for _, inertia, _ in fits],
+        'silhouette': [silhouette for _, _, silhouette in fits]
+    })
+    scores=report['silhouette'].fillna(-np.inf)
+    best_k=int(report.loc[scores.idxmax(), 'k'])
+
+    best_model=models[best_k]
+    df_copy=df.copy(deep=False)
+    df_copy['cluster'] = best_model.predict(scaled)
+    pca=_fit_projection(scaled)
+    model_cache.put(_data_fingerprint(features, best_k, algorithm), scaler, best_model, pca)
+    result = {
+        'report': report,
+        'best_k': best_k,
+        'best': {
+            'clustered_data': df_copy,  # 含聚类标签
+            'cluster_centers': best_model.cluster_centers_,
+            'model': best_model,
+            'scaler': scaler,
+            'fingerprint': _data_fingerprint(features, best_k, algorithm),
+            'scaled_data': scaled,
+            'pca': pca,
+            'pca_coords': _project(pca, scaled)
+        }
+    }
+    with _sweep_cache_lock:
+        _sweep_cache[cache_key]=result
+        while len(_sweep_cache) > SWEEP_CACHE_MAX_ENTRIES:
+            _sweep_cache.popitem(last=False)
+    return result
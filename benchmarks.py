@@ -0,0 +1,654 @@
+"""
+性能基准测试
+
+用法:
+    python benchmarks.py clean_data2 --rows 100000 --repeat 3
+    python benchmarks.py chart_backends --rows 250
+    python benchmarks.py pipeline_memory --rows 1000000
+    python benchmarks.py analysis --rows 1000000
+    python benchmarks.py k_sweep --rows 100000
+    python benchmarks.py cold_import --repeat 5
+    python benchmarks.py suite --output report.json
+    python benchmarks.py suite --only clean_data1,analysis_function --max-rows 10000000 --output report.json
+    python benchmarks.py compare --baseline baseline.json --current report.json --tolerance 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from calendar import month_abbr
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from analysis import analysis_function
+from cleaning import clean_data2, _clean_data2_rowwise
+
+
+def make_weekend_data(rows, seed=0):
+    """
+    生成与 Box Office Mojo 周末票房表格式一致的合成数据
+    :param rows: 行数(周末数)
+    :param seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    months = np.array(month_abbr[1:])
+    month_idx = rng.integers(0, 12, rows)
+    day = rng.integers(1, 27, rows)
+    dates = [f'{months[m]} {d}-{d + 2}' for m, d in zip(month_idx, day)]
+    top10 = rng.integers(10_000, 50_000_000, rows)
+    overall = top10 + rng.integers(0, 10_000_000, rows)
+    df = pd.DataFrame({
+        'Dates': dates,
+        'Top_10_Gross': [f'${v:,}' for v in top10],
+        'Overall_Gross': [f'${v:,}' for v in overall],
+        'Releases': rng.integers(1, 60, rows).astype(str),
+    })
+    # 混入少量缺失值与无法解析的值
+    holes = rng.random(rows) < 0.01
+    df.loc[holes, 'Top_10_Gross'] = None
+    df.loc[rng.random(rows) < 0.005, 'Overall_Gross'] = '-'
+    return df
+
+
+def make_top250_data(rows, seed=0):
+    """
+    生成与豆瓣TOP250清洗后格式一致的合成数据
+    :param rows: 行数(电影数)
+    :param seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '电影名字': [f'电影{i}' for i in range(rows)],
+        '评分': np.round(rng.uniform(7.5, 9.8, rows), 1),
+        '评分人数': rng.integers(10_000, 3_000_000, rows),
+        '年份': rng.integers(1930, 2025, rows),
+    })
+
+
+def make_top250_catalog(rows, seed=0):
+    """
+    生成与豆瓣TOP250原始CSV格式一致的合成片单(清洗前，含链接、导演等多余列与少量脏数据)
+    :param rows: 行数(电影数)
+    :param seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(1_000_000, 40_000_000, rows)
+    df = pd.DataFrame({
+        '电影名字': [f'电影{i}/Movie{i}' for i in range(rows)],
+        '电影链接': [f'https://movie.douban.com/subject/{i}/' for i in ids],
+        '评分': np.round(rng.uniform(7.5, 9.8, rows), 1).astype(str),
+        '评分人数': rng.integers(10_000, 3_000_000, rows).astype(str),
+        '导演': '导演: 某某',
+        '主演': '主演: 某某 / 某某',
+        '年份': rng.integers(1930, 2025, rows).astype(str),
+        '国家': rng.choice(['美国', '中国大陆', '日本', '英国', '法国'], rows),
+        '类型': rng.choice(['剧情', '犯罪剧情', '剧情爱情', '动画奇幻'], rows),
+        '一句话评价': '合成数据',
+    })
+    # 混入少量无法解析或越界的值
+    df.loc[rng.random(rows) < 0.005, '评分'] = '暂无评分'
+    df.loc[rng.random(rows) < 0.005, '年份'] = '1800'
+    return df
+
+
+def make_country_series(countries, years, seed=0):
+    """
+    生成多个国家连续多年的周末票房表(Box Office Mojo 格式)，每年52个周末
+    :param countries: 国家个数
+    :param years: 年数
+    :param seed: 随机种子
+    :return: dict, key: 国家名, value: DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    weeks = 52 * years
+    start = date(2025 - years, 1, 3)
+    fridays = [start + timedelta(weeks=i) for i in range(weeks)]
+    dates = [f'{month_abbr[d.month]} {d.day}-{(d + timedelta(days=2)).day}' for d in fridays]
+    t = np.arange(weeks)
+    frames = {}
+    for i in range(countries):
+        # 长期趋势 + 年度季节性 + 噪声
+        level = rng.uniform(5e6, 5e7) * (1 + 0.02 * t / 52) * (1 + 0.3 * np.sin(2 * np.pi * t / 52 + rng.uniform(0, 6)))
+        top10 = np.maximum(level * rng.lognormal(0, 0.15, weeks), 1e4).astype(np.int64)
+        overall = top10 + (top10 * rng.uniform(0.05, 0.4, weeks)).astype(np.int64)
+        frames[f'国家{i}'] = pd.DataFrame({
+            'Dates': dates,
+            'Top_10_Gross': [f'${v:,}' for v in top10],
+            'Overall_Gross': [f'${v:,}' for v in overall],
+            'Releases': rng.integers(5, 60, weeks).astype(str),
+        })
+    return frames
+
+
+_COMMENT_WORDS = ['电影', '剧情', '演员', '导演', '故事', '画面', '音乐', '结局', '人物', '经典', '感动', '希望',
+                  '自由', '人生', '时代', '真实', '细节', '节奏', '配乐', '表演', '镜头', '震撼', '温暖', '遗憾']
+_COMMENT_FILLERS = ['的', '了', '是', '很', '也', '真的', '非常', '有点', '一部', '我们', '这个', '还是']
+
+
+def make_comment_corpus(rows, seed=0):
+    """
+    生成中文电影短评语料，评论由常见影评词、停用词与标点随机组成
+    :param rows: 评论条数
+    :param seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array(_COMMENT_WORDS + _COMMENT_FILLERS)
+    # 词频近似Zipf分布，少数词反复出现
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(3, 40, rows)
+    tokens = rng.choice(vocab, lengths.sum(), p=weights)
+    punctuation = rng.choice(['，', '。', '！', '', ''], rows)
+    comments = []
+    offset = 0
+    for length, mark in zip(lengths, punctuation):
+        comments.append(''.join(tokens[offset:offset + length]) + mark)
+        offset += length
+    df = pd.DataFrame({'comment': comments, '评分': rng.integers(1, 6, rows)})
+    df.loc[rng.random(rows) < 0.01, 'comment'] = '。。。'  # 清洗后为空的评论
+    return df
+
+
+def _best_time(func, arg, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_clean_data2(rows, repeat):
+    """对比逐行实现与向量化实现的 clean_data2"""
+    df = make_weekend_data(rows)
+    t_row, expected = _best_time(_clean_data2_rowwise, df, repeat)
+    t_vec, actual = _best_time(clean_data2, df, repeat)
+    pd.testing.assert_frame_equal(actual, expected)
+    print(f'clean_data2 rows={rows}: 逐行 {t_row:.4f}s, 向量化 {t_vec:.4f}s, 加速 {t_row / t_vec:.1f}x')
+
+
+def bench_chart_backends(rows, repeat):
+    """
+    对比三维散点图、平行坐标图、雷达图在各渲染后端下的冷/热渲染耗时
+    冷启动为进程内首次调用(plotly后端包含Kaleido子进程启动)，热为其后 repeat 次中的最好成绩
+    绕过图表缓存，直接调用渲染函数
+    """
+    from visualization import CHART_BACKENDS, _render_3d_scatter, _render_parallel_coords, _render_radar_chart
+
+    result = analysis_function(make_top250_data(rows))
+    charts = {
+        '3d_scatter': (_render_3d_scatter, {'df': result['clustered_data']}),
+        'parallel_coords': (_render_parallel_coords, {'df': result['clustered_data']}),
+        'radar_chart': (_render_radar_chart, {'cluster_centers': result['cluster_centers']}),
+    }
+    print(f'{"chart":<16}{"backend":<12}{"cold(s)":>10}{"warm(s)":>10}{"size(KB)":>10}')
+    for backend in CHART_BACKENDS:
+        for name, (render, inputs) in charts.items():
+            start = time.perf_counter()
+            data = render(backend=backend, **inputs)
+            cold = time.perf_counter() - start
+            warm = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                render(backend=backend, **inputs)
+                warm = min(warm, time.perf_counter() - start)
+            print(f'{name:<16}{backend:<12}{cold:>10.4f}{warm:>10.4f}{len(data) / 1024:>10.1f}')
+
+
+def bench_pipeline_memory(rows, repeat):
+    """
+    统计一次完整 加载 -> 清洗 -> 分析 -> 收集图表输入 流程的内存峰值
+    图表输入通过 copy=False 的导出读取，不渲染图片
+    """
+    from storage import DataManager
+    from visualization import CHARTS, TOP250_CHARTS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'top250.csv')
+        make_top250_data(rows).to_csv(path, index=False)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        manager = DataManager()
+        manager.load_data1(path)
+        manager.clean_data1()
+        manager.analyze_data()
+        for chart_type in TOP250_CHARTS:
+            collect, _ = CHARTS[chart_type]
+            collect(manager)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    data_bytes = manager.data_top250.memory_usage(index=True, deep=True).sum()
+    print(f'pipeline rows={rows}: {elapsed:.3f}s, 原始数据 {data_bytes / 2**20:.1f}MB, '
+          f'峰值 {peak / 2**20:.1f}MB, 结束时 {current / 2**20:.1f}MB')
+
+
+def bench_analysis(rows, repeat):
+    """
+    对比聚类分析的三种情况：首次拟合、数据未变(命中模型缓存)、少量行变化后以旧质心warm start
+    使用临时目录作为模型缓存目录，不影响已持久化的模型
+    """
+    import analysis
+
+    df = make_top250_data(rows)
+    changed = df.copy()
+    n_changed = max(1, rows // 100)
+    changed.loc[changed.index[:n_changed], '评分人数'] += 1  # 1%的行发生变化
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analysis.model_cache = analysis.ModelCache(directory=tmp)
+        analysis._last_fits.clear()
+        start = time.perf_counter()
+        analysis_function(df)
+        cold = time.perf_counter() - start
+        cached, _ = _best_time(analysis_function, df, repeat)
+        warm = float('inf')
+        for _ in range(repeat):
+            analysis.model_cache.clear()
+            for name in os.listdir(tmp):
+                os.remove(os.path.join(tmp, name))
+            analysis_function(df)
+            start = time.perf_counter()
+            analysis_function(changed)
+            warm = min(warm, time.perf_counter() - start)
+    algorithm = analysis._resolve_algorithm('auto', rows)
+    print(f'analysis rows={rows} ({algorithm}): 首次 {cold:.4f}s, 命中缓存 {cached:.4f}s, '
+          f'{n_changed}行变化后warm start {warm:.4f}s')
+
+
+def bench_k_sweep(rows, repeat):
+    """对比k扫描(k=2~10)串行与并行拟合的耗时，以及数据不变时重复调用(命中缓存)的耗时"""
+    import analysis
+
+    df = make_top250_data(rows)
+    timings = {}
+    for label, max_workers in (('串行', 1), ('并行', None)):
+        best = float('inf')
+        for _ in range(repeat):
+            analysis._sweep_cache.clear()
+            start = time.perf_counter()
+            result = analysis.sweep_k(df, max_workers=max_workers)
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+    start = time.perf_counter()
+    analysis.sweep_k(df)
+    cached = time.perf_counter() - start
+    print(result['report'].to_string(index=False))
+    print(f'k_sweep rows={rows}: 串行 {timings["串行"]:.3f}s, 并行 {timings["并行"]:.3f}s, '
+          f'命中缓存 {cached:.6f}s, best_k={result["best_k"]}')
+
+
+_COLD_IMPORT_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import storage
+elapsed = time.perf_counter() - start
+heavy = ('sklearn', 'statsmodels', 'matplotlib', 'seaborn', 'plotly', 'wordcloud')
+print(json.dumps({'seconds': elapsed, 'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'heavy': [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def bench_cold_import(rows, repeat):
+    """
+    在新的解释器中统计 import storage 的冷启动耗时与RSS峰值(Linux下 ru_maxrss 单位为KB)，
+    并按 -X importtime 的自身耗时汇总出耗时最多的顶层包；rows 不使用
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _COLD_IMPORT_SCRIPT],
+                              cwd=root, capture_output=True, text=True, check=True)
+        runs.append((json.loads(proc.stdout), proc.stderr))
+    best, importtime = min(runs, key=lambda run: run[0]['seconds'])
+    packages = {}
+    for line in importtime.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            package = parts[2].strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(parts[0].split(':')[1]) / 1e6
+    print(f'cold_import: {best["seconds"]:.3f}s (best of {repeat}), '
+          f'RSS峰值 {statistics.median(run[0]["maxrss_kb"] for run in runs) / 1024:.1f}MB, '
+          f'已加载的重量级库: {", ".join(best["heavy"]) or "无"}')
+    for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:8]:
+        print(f'  {name:<28}{seconds:>8.3f}s')
+
+
+# ================== 基准套件 ==================
+
+SUITE_SCALES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)  # 片单、票房、评论的数据规模(行数)
+SUITE_MAX_ROWS = 10 ** 6  # 默认只运行不超过该规模的档位，--max-rows 10000000 运行全部档位
+SUITE_SEED = 0  # 合成数据的随机种子，保证多次运行的输入一致
+REPORT_VERSION = 1
+
+
+class SuiteCase:
+    """
+    基准套件中的一项
+    - setup(scale) 生成输入，不计时
+    - run(inputs) 为被测调用
+    - reset() 在每次运行前清除进程内缓存，保证每次都完整计算
+    """
+
+    def __init__(self, name, scales, setup, run, reset=None):
+        self.name = name
+        self.scales = scales
+        self.setup = setup
+        self.run = run
+        self.reset = reset
+
+
+def _reset_analysis():
+    import analysis
+    analysis.model_cache.clear()
+    directory = analysis.model_cache.directory
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+    analysis._last_fits.clear()
+
+
+def _reset_forecast():
+    import predict
+    predict.forecast_cache.clear()
+    directory = predict.forecast_cache.directory
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def _analysis_inputs(scale):
+    _reset_analysis()
+    return analysis_function(make_top250_data(scale, SUITE_SEED))
+
+
+def _country_inputs(scale):
+    """scale 为周末数，折算为年数(至少1年)"""
+    years = max(1, scale // 52)
+    frames = make_country_series(1, years, SUITE_SEED)
+    return clean_data2(next(iter(frames.values())))
+
+
+def _prediction_chart_inputs(scale):
+    from predict import prediction_function
+    cleaned = _country_inputs(scale)
+    return {'cleaned_data': cleaned, 'predicted_data': prediction_function(cleaned, country='bench'),
+            'country_name': 'bench', 'historical_points': 10}
+
+
+def _wordcloud_inputs(scale):
+    from cleaning import clean_data3
+    from visualization import WORDCLOUD_FONT_PATH
+    cleaned = clean_data3(make_comment_corpus(scale, SUITE_SEED))
+    return {'source': cleaned['cleaned_comment'], 'width': 800, 'height': 600, 'background_color': 'white',
+            'max_words': 200, 'colormap': 'viridis', 'font_path': WORDCLOUD_FONT_PATH}
+
+
+def _render(chart_type):
+    """直接调用图表渲染函数(visual* 的实际工作)，绕过图表缓存"""
+    def run(inputs):
+        from visualization import _render_task
+        return _render_task(chart_type, inputs)
+    return run
+
+
+def _top250_chart_case(name, chart_type):
+    from visualization import TOP250_INPUTS
+    return SuiteCase(name, SUITE_SCALES[:3],
+                     lambda scale: TOP250_INPUTS[chart_type](_analysis_inputs(scale)),
+                     _render(chart_type))
+
+
+def suite_cases():
+    """全部基准项，key: 名称, value: SuiteCase"""
+    from cleaning import clean_data1, clean_data3
+    from predict import prediction_function, batch_prediction
+
+    cases = [
+        SuiteCase('clean_data1', SUITE_SCALES,
+                  lambda scale: make_top250_catalog(scale, SUITE_SEED), clean_data1),
+        SuiteCase('clean_data2', SUITE_SCALES,
+                  lambda scale: make_weekend_data(scale, SUITE_SEED), clean_data2),
+        SuiteCase('clean_data3', SUITE_SCALES[:4],
+                  lambda scale: make_comment_corpus(scale, SUITE_SEED), clean_data3),
+        SuiteCase('analysis_function', SUITE_SCALES,
+                  lambda scale: make_top250_data(scale, SUITE_SEED), analysis_function, reset=_reset_analysis),
+        # 周末数：2、5、20年
+        SuiteCase('prediction_function', (104, 260, 1040),
+                  _country_inputs, lambda df: prediction_function(df, country='bench'), reset=_reset_forecast),
+        # 国家数：每个国家5年的周末数据，多个国家并发拟合
+        SuiteCase('batch_prediction', (1, 4, 16),
+                  lambda scale: {name: clean_data2(df) for name, df in make_country_series(scale, 5, SUITE_SEED).items()},
+                  batch_prediction, reset=_reset_forecast),
+        _top250_chart_case('visual1_1', '3d_scatter'),
+        _top250_chart_case('visual1_2', 'parallel_coords'),
+        _top250_chart_case('visual1_3', 'radar_chart'),
+        _top250_chart_case('visual1_4', 'pca_plot'),
+        _top250_chart_case('visual1_5', 'box_plot'),
+        SuiteCase('visual2', (104, 1040), _prediction_chart_inputs, _render('prediction_comparison'),
+                  reset=_reset_forecast),
+        SuiteCase('visual3', SUITE_SCALES[:3], _wordcloud_inputs, _render('wordcloud')),
+    ]
+    return {case.name: case for case in cases}
+
+
+def _case_rows(inputs, scale):
+    """实际处理的行数，用于计算吞吐量"""
+    if isinstance(inputs, pd.DataFrame):
+        return len(inputs)
+    if isinstance(inputs, dict) and inputs and all(isinstance(v, pd.DataFrame) for v in inputs.values()):
+        return sum(len(v) for v in inputs.values())
+    return scale
+
+
+def measure(case, scale, repeat):
+    """
+    测量单个基准项在某一规模下的耗时与内存峰值
+    耗时为 repeat 次运行的最好成绩与中位数；内存峰值在另一次运行中用tracemalloc统计(开启后运行变慢，不计时)
+    """
+    inputs = case.setup(scale)
+    times = []
+    for _ in range(repeat):
+        if case.reset is not None:
+            case.reset()
+        start = time.perf_counter()
+        case.run(inputs)
+        times.append(time.perf_counter() - start)
+
+    if case.reset is not None:
+        case.reset()
+    tracemalloc.start()
+    try:
+        case.run(inputs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    rows = _case_rows(inputs, scale)
+    best = min(times)
+    return {
+        'benchmark': case.name,
+        'scale': scale,
+        'rows': rows,
+        'seconds': best,
+        'seconds_median': statistics.median(times),
+        'rows_per_second': rows / best if best > 0 else None,
+        'peak_bytes': peak,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment():
+    import sklearn
+    import statsmodels
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+        'statsmodels': statsmodels.__version__,
+        'commit': _git_commit(),
+    }
+
+
+def run_suite(only=None, scales=None, max_rows=SUITE_MAX_ROWS, repeat=3):
+    """
+    运行基准套件
+    :param only: 只运行的基准项名称列表，默认全部
+    :param scales: 覆盖各基准项的规模档位
+    :param max_rows: 跳过超过该规模的档位
+    :param repeat: 每个档位的计时次数
+    :return: 报告(dict)，可直接写为JSON
+    """
+    import analysis
+    import predict
+
+    cases = suite_cases()
+    unknown = set(only or ()) - set(cases)
+    if unknown:
+        raise ValueError(f"Unknown benchmark: {', '.join(sorted(unknown))}")
+    results = []
+    original_cache = analysis.model_cache
+    original_forecast_cache = predict.forecast_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        # 不影响已持久化的模型与拟合结果
+        analysis.model_cache = analysis.ModelCache(directory=os.path.join(tmp, 'model'))
+        predict.forecast_cache = predict.ForecastCache(directory=os.path.join(tmp, 'forecast'))
+        try:
+            for name, case in cases.items():
+                if only and name not in only:
+                    continue
+                for scale in scales or case.scales:
+                    if scale > max_rows:
+                        continue
+                    result = measure(case, scale, repeat)
+                    results.append(result)
+                    print(f'{name:<22}{scale:>10}{result["seconds"]:>12.4f}s'
+                          f'{result["peak_bytes"] / 2 ** 20:>10.1f}MB', flush=True)
+        finally:
+            analysis.model_cache = original_cache
+            predict.forecast_cache = original_forecast_cache
+    return {
+        'version': REPORT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seed': SUITE_SEED,
+        'repeat': repeat,
+        'environment': _environment(),
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current, tolerance=0.1, memory_tolerance=None):
+    """
+    比较两份报告中相同 (基准项, 规模) 的吞吐量与内存峰值
+    :param tolerance: 吞吐量下降超过该比例视为性能回退
+    :param memory_tolerance: 内存峰值增加超过该比例视为回退，None表示不检查内存
+    :return: (对比行列表, 是否存在回退)
+    """
+    base = {(r['benchmark'], r['scale']): r for r in baseline['results']}
+    rows = []
+    regressed = False
+    for result in current['results']:
+        old = base.get((result['benchmark'], result['scale']))
+        if old is None or not old['rows_per_second'] or not result['rows_per_second']:
+            continue
+        speed = result['rows_per_second'] / old['rows_per_second']
+        memory = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else None
+        status = 'ok'
+        if speed < 1 - tolerance:
+            status = 'SLOWER'
+        elif memory_tolerance is not None and memory is not None and memory > 1 + memory_tolerance:
+            status = 'MEMORY'
+        regressed = regressed or status != 'ok'
+        rows.append({'benchmark': result['benchmark'], 'scale': result['scale'], 'speedup': speed,
+                     'memory_ratio': memory, 'status': status})
+    return rows, regressed
+
+
+def _load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _parse_scales(text):
+    return [int(float(v)) for v in text.split(',')] if text else None
+
+
+BENCHMARKS = {
+    'clean_data2': bench_clean_data2,
+    'chart_backends': bench_chart_backends,
+    'pipeline_memory': bench_pipeline_memory,
+    'analysis': bench_analysis,
+    'k_sweep': bench_k_sweep,
+    'cold_import': bench_cold_import,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    parser.add_argument('name', choices=sorted(BENCHMARKS) + ['suite', 'compare'])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    # suite: 运行基准套件并写出JSON报告，指定 --baseline 时同时与基线比较
+    parser.add_argument('--only', help='只运行的基准项，逗号分隔')
+    parser.add_argument('--scales', help='覆盖规模档位，逗号分隔，如 1e3,1e5')
+    parser.add_argument('--max-rows', type=float, default=SUITE_MAX_ROWS)
+    parser.add_argument('--output', help='报告输出路径')
+    # compare: 比较两份报告，存在回退时退出码为1
+    parser.add_argument('--baseline', help='基线报告路径')
+    parser.add_argument('--current', help='当前报告路径(compare)')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='允许的吞吐量下降比例')
+    parser.add_argument('--memory-tolerance', type=float, help='允许的内存峰值增加比例，默认不检查')
+    args = parser.parse_args()
+    if args.name != 'compare':
+        from storage import enable_copy_on_write
+        enable_copy_on_write()  # 与应用入口一致，导出快照为惰性拷贝
+
+    if args.name in BENCHMARKS:
+        BENCHMARKS[args.name](args.rows, args.repeat)
+        return
+
+    if args.name == 'suite':
+        only = args.only.split(',') if args.only else None
+        current = run_suite(only, _parse_scales(args.scales), int(args.max_rows), args.repeat)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+        if args.baseline is None:
+            return
+    else:
+        if args.baseline is None or args.current is None:
+            parser.error('compare requires --baseline and --current')
+        current = _load_report(args.current)
+
+    rows, regressed = compare_reports(_load_report(args.baseline), current, args.tolerance, args.memory_tolerance)
+    print(f'{"benchmark":<22}{"scale":>10}{"speedup":>10}{"memory":>10}  status')
+    for row in rows:
+        memory = f'{row["memory_ratio"]:.2f}x' if row['memory_ratio'] is not None else '-'
+        print(f'{row["benchmark"]:<22}{row["scale"]:>10}{row["speedup"]:>9.2f}x{memory:>10}  {row["status"]}')
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
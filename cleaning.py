@@ -1,7 +1,11 @@
 import pandas as pd
 import re
 from calendar import month_abbr
+from collections import Counter
 
+from profiling import profiled
+
+@profiled()
 def clean_data1(data_top250: pd.DataFrame) -> pd.DataFrame:
     """
     对 data_top250 进行清洗：
@@ -12,17 +16,13 @@ def clean_data1(data_top250: pd.DataFrame) -> pd.DataFrame:
         评分人数：int
         年份：int
     """
-    df = data_top250.copy()
-
-
-    keep_cols = ['电影名字', '评分', '评分人数', '年份']
-    df = df[keep_cols]
-
-    # 类型转换
-    df['电影名字'] = df['电影名字'].astype(str)
-    df['评分'] = pd.to_numeric(df['评分'], errors='coerce')
-    df['评分人数'] = pd.to_numeric(df['评分人数'], errors='coerce', downcast='integer')
-    df['年份'] = pd.to_numeric(df['年份'], errors='coerce', downcast='integer')
+    # 只保留所需列并做类型转换，直接由转换结果构造新表，不先复制整张原始表
+    df = pd.DataFrame({
+        '电影名字': data_top250['电影名字'].astype(str),
+        '评分': pd.to_numeric(data_top250['评分'], errors='coerce'),
+        '评分人数': pd.to_numeric(data_top250['评分人数'], errors='coerce', downcast='integer'),
+        '年份': pd.to_numeric(data_top250['年份'], errors='coerce', downcast='integer'),
+    })
 
     # 删除缺失值
     df.dropna(inplace=True)
@@ -34,6 +34,7 @@ def clean_data1(data_top250: pd.DataFrame) -> pd.DataFrame:
     df.reset_index(drop=True, inplace=True)
 
     return df
+@profiled()
 def clean_data2(data_country: pd.DataFrame) -> pd.DataFrame:
     """
     清洗 data_country 数据，用于预测功能：
@@ -42,6 +43,60 @@ def clean_data2(data_country: pd.DataFrame) -> pd.DataFrame:
     - 将时间段按实际顺序编号为 Dates_number
     - 缺失值用线性插值填充
 
+    整列向量化处理，结果与逐行实现 _clean_data2_rowwise 一致
+    返回清洗后的 pandas.DataFrame
+    """
+    # 1. 保留所需列(只复制这四列)
+    df = data_country[['Dates', 'Top_10_Gross', 'Overall_Gross', 'Releases']].copy()
+
+    # 2. 清洗货币列
+    df['Top_10_Gross'] = _clean_money_column(df['Top_10_Gross'])
+    df['Overall_Gross'] = _clean_money_column(df['Overall_Gross'])
+
+    # 3. Releases 数值化
+    df['Releases'] = pd.to_numeric(df['Releases'], errors='coerce')
+
+    # 4. 提取起始月和日用于排序，无法识别的日期记为 (0, 0)
+    parts = df['Dates'].astype(str).str.extract(r'^([A-Za-z]+)\s+(\d+)')
+    month = parts[0].str[:3].map(_MONTH_NUMBERS)
+    valid = month.notna()
+    df['Month'] = month.where(valid, 0).astype('int64')
+    df['Day'] = parts[1].where(valid, '0').astype('int64')
+
+    # 5. 按时间排序并生成编号
+    df.sort_values(by=['Month', 'Day'], inplace=True)
+    df['Dates_number'] = range(1, len(df) + 1)
+    df.drop(columns=['Month', 'Day'], inplace=True)
+
+    # 6. 用线性插值填补缺失值
+    df['Top_10_Gross'] = df['Top_10_Gross'].interpolate(method='linear')
+    df['Overall_Gross'] = df['Overall_Gross'].interpolate(method='linear')
+    df['Releases'] = df['Releases'].interpolate(method='linear')
+
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+_MONTH_NUMBERS = {name: i for i, name in enumerate(month_abbr) if name}  # 月份缩写 -> 月份序号
+
+
+def _clean_money_column(series: pd.Series) -> pd.Series:
+    """移除美元符号和千位分隔符后整列转为float，无法解析的值记为NaN"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+    text = series.astype(str).str.replace(r'[$,]', '', regex=True).str.strip()
+    return pd.to_numeric(text, errors='coerce').astype(float)  # 全部可解析时 to_numeric 返回整数类型
+
+
+def _clean_data2_rowwise(data_country: pd.DataFrame) -> pd.DataFrame:
+    """
+    清洗 data_country 数据，用于预测功能：
+    - 仅保留 Dates, Top_10_Gross, Overall_Gross, Releases 三列
+    - 移除美元符号和千位分隔符，转为数值
+    - 将时间段按实际顺序编号为 Dates_number
+    - 缺失值用线性插值填充
+
+    逐行实现，仅作为 clean_data2 的正确性与性能对照
     返回清洗后的 pandas.DataFrame
     """
     df = data_country.copy()
@@ -93,28 +148,82 @@ def clean_data2(data_country: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def clean_data3(data_comments: pd.DataFrame) -> pd.DataFrame:
+STOP_WORDS = frozenset([
+    '的', '了', '是', '我', '也', '很', '不',
+    '在', '和', '就', '都', '而', '及', '与', '着', '或', '还', '又', '把', '被', '让', '给', '对',
+    '吧', '吗', '呢', '啊', '呀', '哦', '嘛',
+    '你', '他', '她', '它', '我们', '你们', '他们', '自己', '这', '那', '这个', '那个', '这部', '一个',
+    '有', '没有', '就是', '什么', '但', '但是', '因为', '所以', '如果', '可以', '还是', '一部',
+])  # 停用词表，按分词结果整词过滤，可拓展
+COMMENT_CHUNK_SIZE = 10000  # 分块处理评论的行数
+
+_PUNCTUATION = re.compile(r'[^\w\s]')  # 标点符号(非文字、非空白字符)
+_jieba = None
+
+
+def _cut(text):
+    """
+    中文分词：优先使用本地jieba词典分词
+    未安装jieba时退化为中文按字切分、字母数字按词切分
+    """
+    global _jieba
+    if _jieba is None:
+        try:
+            import jieba
+            jieba.setLogLevel(60)  # 关闭加载词典时的日志
+            _jieba = jieba
+        except ImportError:
+            _jieba = False
+    if _jieba:
+        return _jieba.lcut(text)
+    return re.findall(r'[\u4e00-\u9fff]|[^\W\u4e00-\u9fff]+', text)
+
+
+def segment_comment(text: str, stop_words=STOP_WORDS) -> list:
+    """对单条(已去除标点的)评论分词，并按停用词表过滤"""
+    return [token for token in _cut(text) if token.strip() and token not in stop_words]
+
+
+def iter_chunks(data, chunk_size=COMMENT_CHUNK_SIZE):
+    """按行分块遍历 Series/DataFrame"""
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+def term_frequencies(cleaned_comments: pd.Series, chunk_size=COMMENT_CHUNK_SIZE) -> Counter:
+    """
+    分块统计已分词评论(词之间以空格分隔)的词频，不拼接整个语料
+    :param cleaned_comments: clean_data3 输出的 cleaned_comment 列
+    :param chunk_size: 每块的行数
+    :return: Counter, key: 词, value: 出现次数
+    """
+    counts = Counter()
+    for chunk in iter_chunks(cleaned_comments, chunk_size):
+        tokens = chunk.astype(str).str.split().explode().dropna()
+        counts.update(tokens.value_counts().to_dict())
+    return counts
+
+
+@profiled()
+def clean_data3(data_comments: pd.DataFrame, stop_words=STOP_WORDS, chunk_size=COMMENT_CHUNK_SIZE) -> pd.DataFrame:
     """
     对 data_comments 进行清洗：
     - 去除标点符号
-    - 去除停用词（示例词）··
+    - 中文分词并按停用词表过滤，cleaned_comment 为空格分隔的词
     - 删除空或无意义评论
+    评论列为 comment，不存在时使用第一列(如爬取表格中的"字段1")
     """
-    df = data_comments.copy()
-
-    stop_words = set(['的', '了', '是', '我', '也', '很', '不'])  # 可拓展停用词列表
+    df = data_comments.copy(deep=False)  # 只新增列，浅拷贝即可不影响原始数据
+    comment_col = 'comment' if 'comment' in df.columns else df.columns[0]
 
-    def clean_comment(text):
-        if pd.isnull(text):
-            return ''
-        # 去除标点符号
-        text = re.sub(r'[^\w\s]', '', text)
-        # 去除停用词
-        cleaned = ''.join([char for char in text if char not in stop_words])
-        return cleaned.strip()
+    cleaned = []
+    for chunk in iter_chunks(df[comment_col], chunk_size):
+        # 去除标点符号：使用Python的re逐条替换，pyarrow字符串的向量化正则中 \w 只匹配ASCII字符，会删掉全部汉字
+        text = (_PUNCTUATION.sub('', t) for t in chunk.fillna('').astype(str))
+        # 分词并去除停用词
+        cleaned.extend(' '.join(segment_comment(t, stop_words)) for t in text)
 
-    df['cleaned_comment'] = df['comment'].apply(clean_comment)
-    df.dropna(subset=['cleaned_comment'], inplace=True)
+    df['cleaned_comment'] = cleaned
     df = df[df['cleaned_comment'].str.len() > 0]
 
     return df
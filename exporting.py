@@ -0,0 +1,188 @@
+import zlib
+from urllib.parse import quote
+
+EXPORT_BATCH_ROWS = 50000  # 流式导出每批的行数
+EXPORT_FORMATS = {  # 导出格式 -> (文件扩展名, MIME类型)
+    'csv': ('csv', 'text/csv'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+EXPORT_COMPRESSIONS = {  # 压缩方式 -> (文件扩展名, MIME类型)
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd'),
+}
+
+
+class _ChunkSink:
+    """只写的文件对象，供pyarrow写入；写入的字节由调用方分批取走"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        """取走已写入的字节"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _batches(df, batch_rows):
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start:start + batch_rows]
+
+
+def iter_csv(df, batch_rows=EXPORT_BATCH_ROWS, encoding='utf-8-sig'):
+    """逐批生成CSV字节，第一块为表头(utf-8-sig时带BOM，便于Excel识别中文)"""
+    yield df.iloc[:0].to_csv(index=False).encode(encoding)
+    body_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding  # BOM只写一次
+    for batch in _batches(df, batch_rows):
+        yield batch.to_csv(index=False, header=False).encode(body_encoding)
+
+
+def _arrow_tables(df, batch_rows):
+    """逐批转换为Arrow表，后续批次的列类型按第一批的schema转换"""
+    import pyarrow as pa
+    schema = None
+    for batch in _batches(df, batch_rows):
+        table = pa.Table.from_pandas(batch, preserve_index=False)
+        if schema is None:
+            schema = table.schema
+        else:
+            table = table.cast(schema)
+        yield table
+    if schema is None:
+        yield pa.Table.from_pandas(df, preserve_index=False)
+
+
+def iter_arrow(df, batch_rows=EXPORT_BATCH_ROWS):
+    """逐批生成Arrow IPC流格式的字节"""
+    import pyarrow as pa
+    sink = _ChunkSink()
+    writer = None
+    for table in _arrow_tables(df, batch_rows):
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_parquet(df, batch_rows=EXPORT_BATCH_ROWS):
+    """逐批生成Parquet字节，每批为一个row group"""
+    import pyarrow.parquet as pq
+    sink = _ChunkSink()
+    writer = None
+    for table in _arrow_tables(df, batch_rows):
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _zstd_compressor():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression requires the zstandard package") from None
+    return zstandard.ZstdCompressor().compressobj()
+
+
+def _compress(chunks, compression):
+    """流式压缩字节块"""
+    if compression == 'gzip':
+        compressor = zlib.compressobj(wbits=31)  # wbits=31: gzip格式
+    else:
+        compressor = _zstd_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_frame(df, fmt='csv', compression=None, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    将DataFrame按批序列化为字节流，内存占用与批大小相关，与总行数无关
+    :param df: 导出的DataFrame
+    :param fmt: 'csv' / 'parquet' / 'arrow'
+    :param compression: None / 'gzip' / 'zstd'
+    :param batch_rows: 每批的行数
+    :return: 字节块的生成器
+    """
+    check_export_options(fmt, compression)
+    if fmt == 'csv':
+        chunks = iter_csv(df, batch_rows)
+    elif fmt == 'parquet':
+        chunks = iter_parquet(df, batch_rows)
+    else:
+        chunks = iter_arrow(df, batch_rows)
+    if compression is not None:
+        chunks = _compress(chunks, compression)
+    return (chunk for chunk in chunks if chunk)
+
+
+def check_export_options(fmt, compression):
+    """检查导出格式与压缩方式，不支持时抛出ValueError"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Supported formats are {', '.join(EXPORT_FORMATS)}")
+    if compression is not None and compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}. "
+                         f"Supported compressions are {', '.join(EXPORT_COMPRESSIONS)}")
+    if compression == 'zstd':
+        _zstd_compressor()
+    if fmt != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError(f"{fmt} export requires pyarrow") from None
+
+
+def export_response(df, download_name, fmt='csv', compression=None, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    以分块传输的Flask响应流式导出DataFrame，序列化一批发送一批
+    df 在响应发送期间被持续读取，调用方不得再原地修改
+    :param download_name: 下载文件名(不含扩展名)
+    :return: flask.Response
+    """
+    from flask import Response
+
+    check_export_options(fmt, compression)
+    extension, mimetype = EXPORT_FORMATS[fmt]
+    if compression is not None:
+        suffix, mimetype = EXPORT_COMPRESSIONS[compression]
+        extension = f'{extension}.{suffix}'
+    filename = f'{download_name}.{extension}'
+    try:
+        filename.encode('ascii')
+        disposition = f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        disposition = f"attachment; filename*=UTF-8''{quote(filename)}"  # 中文文件名按RFC 5987编码
+    response = Response(stream_frame(df, fmt, compression, batch_rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = disposition
+    return response
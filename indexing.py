@@ -0,0 +1,225 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cleaning import STOP_WORDS, clean_data3, term_frequencies
+from pools import prune_files
+
+COMMENT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.comment_index')  # 词频索引持久化目录
+COMMENT_INDEX_MAX_ENTRIES = 32  # 进程内缓存的词频索引个数上限
+COMMENT_INDEX_MAX_FILES = 256  # 持久化的词频索引文件个数上限
+RATING_COLUMNS = ['rating', '评分', '星级']  # 评分列的候选列名
+
+
+def resolve_rating_col(columns, rating_col=None):
+    """评分列名：未指定时在 RATING_COLUMNS 中查找，不存在时为None(不做分评分统计)"""
+    if rating_col is None:
+        rating_col = next((col for col in RATING_COLUMNS if col in columns), None)
+    return rating_col
+
+
+def row_hashes(data_comments):
+    """按位置排列的逐行内容哈希(uint64)，不含行索引"""
+    return pd.util.hash_pandas_object(data_comments, index=False).to_numpy(dtype=np.uint64)
+
+
+def source_key(movie_name, rating_col, source):
+    """
+    词频索引的key，由电影名、评分列与数据来源共同决定
+    :param source: 评论数据的逐行哈希(ndarray)，或源文件内容哈希等字符串
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((movie_name, rating_col)).encode('utf-8'))
+    if isinstance(source, np.ndarray):
+        h.update(source.tobytes())
+    else:
+        h.update(str(source).encode('utf-8'))
+    return h.hexdigest()
+
+
+class TermIndex:
+    """
+    单个评论数据来源的词频索引
+    - 以key(电影名、评分列与数据内容的哈希)区分，不同会话、不同文件的数据各自建立索引，互不影响
+    - 按行位置计数，内容相同的评论(如多条“好看”)各计一次
+    - 同一电影的新数据只在已统计的行之后追加时，复制旧索引后只清洗、统计新增的行；行被修改或删除时从头重建
+    """
+
+    def __init__(self, movie_name, rating_col, key):
+        self.movie_name = movie_name
+        self.rating_col = rating_col
+        self.key = key
+        self.row_hashes = np.empty(0, dtype=np.uint64)  # 已吸收评论行按位置排列的内容哈希
+        self.totals = Counter()  # 全部评论的词频
+        self.by_rating = {}  # key: 评分, value: 该评分下评论的词频
+        self.n_comments = 0  # 清洗后有效的评论条数
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self):
+        """图表缓存使用的指纹，与key一致"""
+        return self.key
+
+    @property
+    def n_rows(self):
+        """已吸收的评论行数(含清洗后为空的行)"""
+        return len(self.row_hashes)
+
+    def extends(self, hashes):
+        """已吸收的行是否恰为 hashes 的前缀(新数据只在其后追加了行)"""
+        n = self.n_rows
+        return n <= len(hashes) and np.array_equal(self.row_hashes, hashes[:n])
+
+    def copy(self, key):
+        """复制统计结果作为另一数据来源的索引，不修改原索引"""
+        index = TermIndex(self.movie_name, self.rating_col, key)
+        with self._lock:
+            index.row_hashes = self.row_hashes.copy()
+            index.totals = Counter(self.totals)
+            index.by_rating = {rating: Counter(counts) for rating, counts in self.by_rating.items()}
+            index.n_comments = self.n_comments
+        return index
+
+    def absorb(self, data_comments, stop_words=STOP_WORDS, cleaned=None, hashes=None):
+        """
+        将评论行追加到索引末尾并累加词频，不做去重
+        :param data_comments: 原始评论数据，紧接在已吸收的行之后
+        :param stop_words: 停用词表
+        :param cleaned: 调用方已对 data_comments 做过 clean_data3 时传入，避免重复清洗
+        :param hashes: data_comments 的逐行哈希，调用方已计算时传入
+        :return: 吸收的评论行数
+        """
+        if hashes is None:
+            hashes = row_hashes(data_comments)
+        if cleaned is None:
+            cleaned = clean_data3(data_comments, stop_words)
+        with self._lock:
+            self.totals.update(term_frequencies(cleaned['cleaned_comment']))
+            if self.rating_col is not None:
+                for rating, group in cleaned.groupby(self.rating_col):
+                    self.by_rating.setdefault(rating, Counter()).update(term_frequencies(group['cleaned_comment']))
+            self.row_hashes = np.concatenate([self.row_hashes, hashes])
+            self.n_comments += len(cleaned)
+        return len(data_comments)
+
+    def frequencies(self, rating=None):
+        """
+        词频(可直接作为词云输入)
+        :param rating: 评分，为None时返回全部评论的词频
+        """
+        if rating is None:
+            return self.totals
+        return self.by_rating.get(rating, Counter())
+
+    def top_terms(self, n=20, rating=None):
+        """
+        出现次数最多的 n 个词
+        :return: [(词, 词频), ...]
+        """
+        return self.frequencies(rating).most_common(n)
+
+    def rating_breakdown(self, n=20):
+        """
+        各评分下出现次数最多的 n 个词
+        :return: dict, key: 评分, value: [(词, 词频), ...]
+        """
+        return {rating: counts.most_common(n) for rating, counts in sorted(self.by_rating.items())}
+
+    def to_frame(self, n=None):
+        """以DataFrame形式导出词频统计，按词频降序"""
+        return pd.DataFrame(self.totals.most_common(n), columns=['词', '词频'])
+
+    def save(self, directory=None):
+        """原子写入持久化文件，超过文件个数上限时删除最旧的索引文件"""
+        directory = directory or COMMENT_INDEX_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = _index_path(self.key, directory)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with self._lock, open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        prune_files(directory, '.pkl', COMMENT_INDEX_MAX_FILES)
+
+    @classmethod
+    def load(cls, key, directory=None):
+        """按key读取持久化的索引，不存在时返回None"""
+        try:
+            with open(_index_path(key, directory or COMMENT_INDEX_DIR), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+
+def _index_path(key, directory):
+    return os.path.join(directory, key + '.pkl')
+
+
+_indexes = OrderedDict()  # 进程内的词频索引，key: TermIndex.key，按LRU淘汰
+_indexes_lock = threading.Lock()
+
+
+def lookup_term_index(key, directory=None):
+    """按key获取词频索引：优先进程内缓存，其次磁盘，都不存在时返回None"""
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = TermIndex.load(key, directory)
+    if index is not None:
+        register_term_index(index)
+    return index
+
+
+def term_index_for(movie_name, data_comments, rating_col=None, stop_words=STOP_WORDS, directory=None):
+    """
+    获取与评论数据逐行对应的词频索引
+    - key命中(进程内或磁盘)时直接复用
+    - 进程内已有同一电影、同一评分列的索引，且其行恰为新数据的前缀时，复制后只吸收新增的行
+    - 否则从头建立
+    :param movie_name: 电影名
+    :param data_comments: 原始评论数据
+    :param rating_col: 评分列名，默认在 RATING_COLUMNS 中查找
+    :param stop_words: 停用词表
+    :param directory: 持久化目录，默认为 COMMENT_INDEX_DIR
+    :return: (TermIndex, 本次新清洗、统计的评论行数)
+    """
+    rating_col = resolve_rating_col(data_comments.columns, rating_col)
+    hashes = row_hashes(data_comments)
+    key = source_key(movie_name, rating_col, hashes)
+    index = lookup_term_index(key, directory)
+    if index is not None:
+        return index, 0
+
+    with _indexes_lock:
+        candidates = [i for i in _indexes.values() if i.movie_name == movie_name and i.rating_col == rating_col]
+    base = max((i for i in candidates if i.extends(hashes)), key=lambda i: i.n_rows, default=None)
+    index = TermIndex(movie_name, rating_col, key) if base is None else base.copy(key)
+    start = index.n_rows
+    absorbed = index.absorb(data_comments.iloc[start:], stop_words, hashes=hashes[start:])
+    index.save(directory)
+    register_term_index(index)
+    return index, absorbed
+
+
+def register_term_index(index):
+    """登记词频索引(如在其他进程中建立并保存的索引)，超过个数上限时淘汰最久未使用的索引"""
+    with _indexes_lock:
+        _indexes[index.key] = index
+        _indexes.move_to_end(index.key)
+        while len(_indexes) > COMMENT_INDEX_MAX_ENTRIES:
+            _indexes.popitem(last=False)
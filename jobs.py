@@ -0,0 +1,428 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from profiling import StageRecord, collect, metrics, summarize
+from storage import DataManager, Pipeline
+
+JOB_MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)  # 同时执行的后台作业数上限
+JOB_MAX_FINISHED = 256  # 保留的已结束作业个数上限
+JOB_RESULT_TTL = 10 * 60  # 已结束作业的保留时间(秒)，期间相同输入的作业直接复用结果
+
+_progress_queue = None  # 工作进程中：向主进程报告进度的队列
+_current_job = None  # 工作进程中：正在执行的作业id
+_pipeline = None  # 工作进程中：流水线作业共用的流水线，后续作业复用其记忆输出
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def report_progress(progress, message=''):
+    """
+    在作业工作进程中报告进度，不在作业中调用时忽略
+    :param progress: 进度，取值0~1
+    :param message: 当前阶段说明
+    """
+    if _progress_queue is not None and _current_job is not None:
+        _progress_queue.put(('progress', _current_job, float(progress), message))
+
+
+def _run_job(job_id, kind, params):
+    """作业进程池中执行的作业，返回 (工作进程中的DataManager, 可JSON序列化的结果摘要, 各阶段的性能记录)"""
+    global _current_job
+    _current_job = job_id
+    try:
+        with collect() as records:
+            manager, result = JOB_HANDLERS[kind](**params)
+        return manager, result, [record.to_dict() for record in records]
+    finally:
+        _current_job = None
+
+
+def _job_analyze(file_path, backend='plotly', stream=False):
+    """加载、清洗、聚类分析豆瓣TOP250数据并渲染全部图表，stream为True时分块读取清洗，不保留原始数据"""
+    manager = DataManager()
+    report_progress(0.1, 'load')
+    if stream:
+        manager.stream_data1(file_path)
+    else:
+        manager.load_data1(file_path)
+        report_progress(0.2, 'clean')
+        manager.clean_data1()
+    report_progress(0.4, 'analyze')
+    manager.analyze_data()
+    report_progress(0.6, 'render')
+    charts = manager.visual1(backend=backend, max_workers=1)
+    return manager, {chart_type: chart.etag for chart_type, chart in charts.items()}
+
+
+def _job_k_sweep(file_path, k_min=2, k_max=10, backend='plotly'):
+    """加载、清洗豆瓣TOP250数据，比较多个聚类个数，按最优k渲染全部图表"""
+    manager = DataManager()
+    report_progress(0.1, 'load')
+    manager.load_data1(file_path)
+    report_progress(0.2, 'clean')
+    manager.clean_data1()
+    report_progress(0.3, 'sweep')
+    # 作业本身已在进程池中运行，在当前进程串行拟合，避免每个作业再各自创建一组工作进程
+    report = manager.sweep_clusters(range(k_min, k_max + 1), max_workers=1)
+    report_progress(0.7, 'render')
+    charts = manager.visual1(backend=backend, max_workers=1)
+    return manager, {
+        'best_k': int(manager.analysis_data['model'].n_clusters),
+        'report': json.loads(report.to_json(orient='records')),  # 轮廓系数无定义(NaN)时为null
+        'charts': {chart_type: chart.etag for chart_type, chart in charts.items()}
+    }
+
+
+def _job_predict(country, file_path, auto_order=False):
+    """加载、清洗、预测特定国家数据并渲染预测对比图"""
+    manager = DataManager()
+    report_progress(0.1, 'load')
+    manager.load_data2(country, file_path)
+    report_progress(0.2, 'clean')
+    manager.clean_data2(country)
+    report_progress(0.3, 'predict')
+    manager.predict_data(country, auto_order=auto_order, max_workers=1)
+    report_progress(0.8, 'render')
+    chart = manager.visual2(country)
+    return manager, {'chart': 'prediction_comparison', 'etag': chart.etag,
+                     'predictions': manager.prediction_data[country]}
+
+
+def _job_predict_batch(files, timeout=None, auto_order=False):
+    """
+    加载、清洗并预测多个国家的数据，单个序列失败只记录错误
+    :param files: dict, key: 国家名, value: 数据文件路径
+    """
+    manager = DataManager()
+    report_progress(0.1, 'load')
+    for country, file_path in files.items():
+        manager.load_data2(country, file_path)
+        manager.clean_data2(country)
+    report_progress(0.3, 'predict')
+    # 作业本身已在进程池中运行，在当前进程串行拟合
+    errors = manager.predict_data_batch(list(files), max_workers=1, timeout=timeout, auto_order=auto_order)
+    return manager, {
+        'predictions': {country: manager.prediction_data[country] for country in files
+                        if country in manager.prediction_data},
+        'errors': errors
+    }
+
+
+def _job_comments(movie, file_path, stream=False):
+    """
+    加载电影评论，增量更新词频索引并生成词云
+    stream为True时分块读取、清洗并建立索引，不在内存中保留完整评论
+    """
+    manager = DataManager()
+    report_progress(0.1, 'load')
+    if stream:
+        manager.stream_data3(movie, file_path)
+        absorbed = None  # 流式读取按源文件整体建立索引，没有增量吸收的行数
+    else:
+        manager.load_data3(movie, file_path)
+        report_progress(0.3, 'index')
+        absorbed = manager.analyze_data3(movie)
+    report_progress(0.7, 'render')
+    success = manager.visual3(movie)
+    index = manager.comment_index[movie]
+    return manager, {
+        'success': success,
+        'new_comments': absorbed,
+        'top_terms': index.top_terms(20),
+        'rating_breakdown': index.rating_breakdown(10)
+    }
+
+
+def _job_pipeline(target, file_path=None, files=None, backend='plotly', auto_order=False):
+    """
+    通过带记忆的流水线运行豆瓣TOP250分析(target='top250')或多个国家的预测(target='country')
+    同一工作进程中此前运行过、输入与参数未变的阶段直接复用
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline()
+    manager = DataManager()
+    manager.pipeline = _pipeline
+    report_progress(0.1, 'pipeline')
+    # 作业本身已在进程池中运行，流水线阶段在当前进程串行运行
+    if target == 'top250':
+        charts = manager.run_top250_pipeline(file_path, backend=backend, max_workers=1)
+    elif target == 'country':
+        charts = manager.run_country_pipeline(files, auto_order=auto_order, max_workers=1)
+    else:
+        raise ValueError(f"Unknown pipeline: {target}")
+    manager.pipeline = _pipeline.without_memo()  # 记忆输出留在工作进程中，不随结果传回主进程
+    return manager, {
+        'charts': {name: chart.etag for name, chart in charts.items()},
+        'stages': manager.explain_pipeline()
+    }
+
+
+JOB_HANDLERS = {
+    'analyze': _job_analyze,
+    'k_sweep': _job_k_sweep,
+    'predict': _job_predict,
+    'predict_batch': _job_predict_batch,
+    'comments': _job_comments,
+    'pipeline': _job_pipeline,
+}
+
+
+def job_key(kind, params):
+    """
+    作业的去重key：作业类型、参数以及输入文件(file_path 与 files 中的各文件)的 mtime 与大小
+    输入文件变化后相同参数的作业视为新作业
+    """
+    h = hashlib.blake2b(kind.encode('utf-8'), digest_size=16)
+    for name, value in sorted(params.items()):
+        h.update(f'\0{name}={value!r}'.encode('utf-8'))
+    file_paths = [params.get('file_path')] + sorted((params.get('files') or {}).values())
+    for file_path in file_paths:
+        if file_path is None:
+            continue
+        try:
+            stat = os.stat(file_path)
+            h.update(f'\0{stat.st_mtime_ns}:{stat.st_size}'.encode('ascii'))
+        except OSError:
+            pass  # 文件不存在时作业执行失败，错误在作业状态中返回
+    return h.hexdigest()
+
+
+class Job:
+    """
+    后台作业
+    status: queued(排队) -> running(执行中) -> done(完成) / failed(失败)
+    """
+
+    def __init__(self, kind, params, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result = None  # 结果摘要
+        self.error = None
+        self.stages = []  # 工作进程中各阶段的性能记录
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.workspaces = []  # 作业完成后需合并结果的会话工作区
+        self._manager = None  # 工作进程返回的DataManager，保留到作业过期，供相同作业的后续提交合并
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def wait(self, timeout=None):
+        """等待作业结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+            'stages': summarize(self.stages),
+        }
+
+
+class JobQueue:
+    """
+    基于进程池的后台作业队列
+    - 提交作业立即返回作业id，作业在进程内队列中排队，同时执行的作业数不超过 max_workers
+    - 工作进程通过 report_progress 报告进度
+    - 相同输入的作业在排队、执行中或结束后 result_ttl 秒内提交时直接复用
+    - 作业完成后其结果合并到提交该作业的会话工作区
+    """
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, max_finished=JOB_MAX_FINISHED, result_ttl=JOB_RESULT_TTL):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.result_ttl = result_ttl
+        self._jobs = OrderedDict()  # key: 作业id, value: Job
+        self._by_key = {}  # key: 去重key, value: 作业id
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()  # 等待执行的作业
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = None
+        self._events = None  # 进度与完成事件，工作进程与主进程共用
+        self._started = False
+
+    def _start(self):
+        """首次提交作业时创建进度队列、调度线程与事件线程"""
+        if self._started:
+            return
+        self._events = multiprocessing.Queue()
+        threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True).start()
+        threading.Thread(target=self._handle_events, name='job-events', daemon=True).start()
+        self._started = True
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 initargs=(self._events,))
+        return self._executor
+
+    def _reset_executor(self):
+        """进程池损坏(工作进程崩溃)后丢弃，下次使用时重建"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def submit(self, kind, params, workspace=None):
+        """
+        提交作业
+        :param kind: 作业类型，见 JOB_HANDLERS
+        :param params: 作业参数
+        :param workspace: 作业完成后合并结果的会话工作区
+        :return: Job
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {kind}")
+        key = job_key(kind, params)
+        merge_now = False
+        with self._lock:
+            self._start()
+            self._expire()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is None or job.status == 'failed':
+                job = Job(kind, params, key)
+                self._jobs[job.id] = job
+                self._by_key[key] = job.id
+                self._pending.put(job)
+            if workspace is not None:
+                if job.status == 'done':
+                    merge_now = True
+                elif workspace not in job.workspaces:
+                    workspace.pin()  # 合并结果前工作区不被回收
+                    job.workspaces.append(workspace)
+        if merge_now:
+            self._merge(job, [workspace])
+        return job
+
+    def get(self, job_id):
+        """按作业id查询作业，不存在或已过期时返回None"""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def _dispatch(self):
+        """调度线程：有空闲执行槽时将排队的作业提交到进程池"""
+        while True:
+            job = self._pending.get()
+            self._slots.acquire()
+            with self._lock:
+                job.status = 'running'
+                try:
+                    future = self._get_executor().submit(_run_job, job.id, job.kind, job.params)
+                except Exception as e:
+                    self._reset_executor()
+                    self._slots.release()
+                    self._finish(job, f'{type(e).__name__}: {e}')
+                    continue
+            future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    def _on_done(self, job, future):
+        """作业结束(进程池回调线程)：释放执行槽，交给事件线程合并结果"""
+        self._slots.release()
+        try:
+            manager, result, stages = future.result()
+            error = None
+            job.stages = [StageRecord.from_dict(record) for record in stages]
+            for record in job.stages:
+                metrics.observe_stage(record)  # 工作进程中的阶段也计入主进程的指标
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._reset_executor()
+            manager, result, error = None, None, f'{type(e).__name__}: {e}'
+        except Exception as e:
+            manager, result, error = None, None, f'{type(e).__name__}: {e}'
+        job._manager = manager
+        job.result = result
+        job.error = error
+        self._events.put(('finished', job.id, None, None))
+
+    def _handle_events(self):
+        """事件线程：更新作业进度；作业完成时先合并结果再标记为完成"""
+        while True:
+            try:
+                event, job_id, progress, message = self._events.get()
+            except (EOFError, OSError):
+                return  # 解释器退出时队列已关闭
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.finished:
+                    continue
+                if event == 'progress':
+                    job.progress = progress
+                    job.message = message
+                    continue
+            # 合并期间新提交的相同作业会追加工作区，直到没有待合并的工作区才标记完成
+            while True:
+                with self._lock:
+                    if job.error is not None or not job.workspaces:
+                        self._finish(job)
+                        break
+                    workspaces, job.workspaces = job.workspaces, []
+                try:
+                    self._merge(job, workspaces)
+                except Exception as e:
+                    job.error = f'merge failed: {type(e).__name__}: {e}'  # 作业标记为失败，事件线程继续运行
+                finally:
+                    for workspace in workspaces:
+                        workspace.unpin()
+
+    def _merge(self, job, workspaces):
+        for workspace in workspaces:
+            with workspace.write() as manager:
+                manager.merge(job._manager)
+
+    def _finish(self, job, error=None):
+        if error is not None:
+            job.error = error
+        if job.error is None:
+            job.status = 'done'
+            job.progress = 1.0
+            job.message = ''
+        else:
+            job.status = 'failed'
+            job._manager = None
+        for workspace in job.workspaces:
+            workspace.unpin()  # 失败的作业不再合并结果
+        job.workspaces = []
+        job.finished_at = time.time()
+        job._done.set()
+
+    def _expire(self):
+        """删除过期的已结束作业，并保证已结束作业个数不超过上限"""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        excess = len(finished) - self.max_finished
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.result_ttl:
+                excess -= 1
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) == job.id:
+                    del self._by_key[job.key]
+
+
+job_queue = JobQueue()  # 进程内共享的后台作业队列
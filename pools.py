@@ -0,0 +1,46 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_executors = {}  # key: 工作进程数, value: 进程池；不同工作进程数的调用方各用各的进程池，互不关闭
+_executors_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """获取进程内共享的进程池，每种工作进程数各一个，解析、聚类、预测与渲染共用"""
+    max_workers = max_workers or os.cpu_count() or 1
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = _executors[max_workers] = ProcessPoolExecutor(max_workers=max_workers)
+        return executor
+
+
+def reset_executor(executor):
+    """进程池损坏(工作进程崩溃)后丢弃，下次使用时重建，其他进程池不受影响"""
+    with _executors_lock:
+        for workers, current in list(_executors.items()):
+            if current is executor:
+                del _executors[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def prune_files(directory, suffix, max_files):
+    """
+    目录中指定后缀的文件超过个数上限时删除最旧(按修改时间)的文件
+    :param directory: 缓存目录，不存在时忽略
+    :param suffix: 文件后缀，如 '.pkl'
+    :param max_files: 文件个数上限
+    """
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(suffix)]
+    except OSError:
+        return
+    if len(names) <= max_files:
+        return
+    paths = sorted((os.path.join(directory, n) for n in names), key=os.path.getmtime)
+    for path in paths[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # 可能已被其他进程删除
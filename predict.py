@@ -1,40 +1,401 @@
-import pandas as pd
+import hashlib
+import itertools
+import math
+import os
+import pickle
+import signal
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
 import numpy as np
-import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
-from datetime import datetime
-import statsmodels.api as sm
 
+from pools import get_executor, prune_files, reset_executor
+from profiling import collected_result, profiled, run_collected, stage
+
+METRICS = ['Top_10_Gross', 'Overall_Gross', 'Releases']  # 前十票房、总票房、发行数量
+FORECAST_STEPS = 10  # 预测未来10个时间点
+FORECAST_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.forecast_cache')  # 拟合结果持久化目录
+FORECAST_CACHE_MAX_ENTRIES = 256  # 内存中缓存的拟合结果个数上限
+FORECAST_CACHE_MAX_FILES = 256  # 持久化的拟合结果文件个数上限
+FORECAST_REFIT_EVERY = 26  # 追加的观测累计达到该数目时，以旧参数为初值重新估计
+ORDER_GRID = {'p': range(0, 6), 'd': range(0, 3), 'q': range(0, 3)}  # 自动定阶的默认搜索范围
+ORDER_CACHE_MAX_ENTRIES = 1024  # 缓存的自动定阶结果个数上限
+ORDER_PRUNE_MAXITER = 10  # 初筛阶段每个候选的最大迭代次数
+ORDER_PRUNE_MARGIN = 10.0  # 初筛阶段信息准则比最优候选高出该值即淘汰
+ORDER_MAX_FINALISTS = 6  # 进入完整拟合阶段的候选个数上限
+
+
+def _series_fingerprint(values):
+    """序列数据指纹"""
+    arr = np.ascontiguousarray(values, dtype=float)
+    return hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+
+
+def _sarimax(values, order):
+    """创建SARIMAX模型，statsmodels在首次拟合时才导入"""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX(values, order=order)
+
+
+def _fit_model(values, order):
+    """拟合SARIMAX模型"""
+    with stage('predict.fit', rows=len(values)):
+        arima = _sarimax(values, order)
+        return arima.fit()
+
+
+class ForecastCache:
+    """
+    SARIMAX拟合结果缓存，key: (国家, 指标, order)
+    - 序列指纹与缓存一致：直接复用拟合结果
+    - 新序列只是在缓存序列末尾追加了观测：在原结果上 append 新观测，沿用已估计的参数，
+      追加累计达到 refit_every 个观测时以旧参数为初值(warm start)重新估计
+    - 其余情况视为未命中，需要重新拟合
+    内存中按LRU保留 max_entries 个，同时持久化到磁盘，进程重启或其他工作进程中同样命中
+    """
+
+    def __init__(self, directory=FORECAST_CACHE_DIR, max_entries=FORECAST_CACHE_MAX_ENTRIES,
+                 refit_every=FORECAST_REFIT_EVERY, max_files=FORECAST_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.refit_every = refit_every
+        self.max_files = max_files
+        self._entries = OrderedDict()  # key -> (指纹, 观测数, 拟合结果, 上次估计后追加的观测数)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.appends = 0
+        self.misses = 0
+
+    def get(self, key, values):
+        """
+        获取与 values 对应的拟合结果，无法复用时返回None
+        :param key: (国家, 指标, order)
+        :param values: 完整的观测序列
+        """
+        values = np.asarray(values, dtype=float)
+        fingerprint = _series_fingerprint(values)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        with self._lock:
+            if entry is not None and entry[0] == fingerprint:
+                self._remember(key, entry)
+                self.hits += 1
+                return entry[2]
+
+        if entry is not None:
+            old_fingerprint, n_old, results, appended = entry
+            if len(values) > n_old and _series_fingerprint(values[:n_old]) == old_fingerprint:
+                new_obs = values[n_old:]
+                appended += len(new_obs)
+                if self.refit_every is not None and appended >= self.refit_every:
+                    results = results.append(new_obs, refit=True, fit_kwargs={'start_params': results.params})
+                    appended = 0
+                else:
+                    results = results.append(new_obs, refit=False)
+                with self._lock:
+                    self.appends += 1
+                self._insert(key, (fingerprint, len(values), results, appended))
+                return results
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, values, results):
+        """
+        存入完整拟合的结果
+        :param key: (国家, 指标, order)
+        :param values: 拟合所用的观测序列
+        :param results: SARIMAX拟合结果
+        """
+        values = np.asarray(values, dtype=float)
+        self._insert(key, (_series_fingerprint(values), len(values), results, 0))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _path(self, key):
+        name = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + '.pkl')
+
+    def _load(self, key):
+        """读取持久化的缓存项，不存在、损坏或由不兼容的statsmodels版本写入时返回None"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.load(f)
+            if not isinstance(entry, tuple) or len(entry) != 4:
+                raise ValueError('outdated forecast file')
+        except Exception:
+            return None
+        return entry
+
+    def _insert(self, key, entry):
+        """缓存并原子写入持久化文件，写入失败时只保留内存缓存"""
+        with self._lock:
+            self._remember(key, entry)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        prune_files(self.directory, '.pkl', self.max_files)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+forecast_cache = ForecastCache()  # 进程内共享、持久化到磁盘的拟合结果缓存
+
+
+def _forecast(results, steps):
+    """根据拟合结果预测未来 steps 个时间点"""
+    return results.get_forecast(steps=steps).predicted_mean.tolist()
+
+
+def _cached_forecast(key, values, steps=FORECAST_STEPS):
+    """优先复用缓存的拟合结果进行预测，未命中时完整拟合并写入缓存"""
+    results = forecast_cache.get(key, values)
+    if results is None:
+        results = _fit_model(values, key[2])
+        forecast_cache.put(key, values, results)
+    return _forecast(results, steps)
+
+
+@profiled()
+def prediction_function(df,d=1,p=5,q=0,country=None,auto_order=False,order_grid=None,criterion='aic',max_workers=None):
+    #依次预测前十票房、总票房、发行数量
+    #country用于区分缓存的拟合结果，序列未变化时直接复用，新增周末数据时增量更新
+    #auto_order为True时忽略p,d,q，按criterion在order_grid中为每个指标自动定阶，max_workers为定阶使用的进程数
+    predictions = {}
+    for metric in METRICS:
+        values = df[metric].tolist()
+        order = select_order(values, order_grid, criterion, max_workers) if auto_order else (p, d, q)  #默认p=5,d=1,q=0
+        predictions[metric] = _cached_forecast((country, metric, order), values)
+    return predictions
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError('SARIMAX fit timed out')
+
+
+@contextmanager
+def _time_limit(timeout):
+    """
+    通过 SIGALRM 限制工作进程中任务的执行时间
+    超时只中断当前任务，工作进程可继续复用；不支持SIGALRM的平台上不限制
+    """
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _fit_task(values, order, timeout):
+    """进程池中执行的单个拟合任务，返回拟合结果"""
+    with _time_limit(timeout):
+        return _fit_model(values, order)
+
+
+def _score_order(values, order, criterion, maxiter=None):
+    """拟合单个候选阶数并返回信息准则，拟合失败时返回inf；超时(TimeoutError)时中止整个搜索"""
+    fit_kwargs = {'disp': False}
+    if maxiter is not None:
+        fit_kwargs['maxiter'] = maxiter
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = _sarimax(values, order).fit(**fit_kwargs)
+        score = float(getattr(results, criterion))
+    except TimeoutError:
+        raise  # _time_limit 的定时器只触发一次，吞掉后剩余候选与最终拟合将不再受时限约束
+    except Exception:
+        return math.inf
+    return score if math.isfinite(score) else math.inf
+
+
+def _score_orders(values, orders, criterion, maxiter, max_workers):
+    """并行(max_workers为1时串行)计算各候选阶数的信息准则"""
+    if max_workers == 1:
+        return [_score_order(values, order, criterion, maxiter) for order in orders]
+    executor = get_executor(max_workers)
+    futures = [executor.submit(run_collected, _score_order, values, order, criterion, maxiter) for order in orders]
+    scores = []
+    for future in futures:
+        try:
+            scores.append(collected_result(future))
+        except BrokenProcessPool:
+            reset_executor(executor)
+            raise
+    return scores
+
+
+def _order_candidates(order_grid):
+    grid = ORDER_GRID if order_grid is None else order_grid
+    return tuple(itertools.product(grid['p'], grid['d'], grid['q']))
+
+
+_order_cache = OrderedDict()  # key: (序列指纹, 候选阶数, 信息准则), value: 选出的阶数，按LRU淘汰
+_order_cache_lock = threading.Lock()
+
+
+def _remember_order(key, order):
+    with _order_cache_lock:
+        _order_cache[key] = order
+        _order_cache.move_to_end(key)
+        while len(_order_cache) > ORDER_CACHE_MAX_ENTRIES:
+            _order_cache.popitem(last=False)
+
+
+def select_order(values, order_grid=None, criterion='aic', max_workers=None,
+                 prune_maxiter=ORDER_PRUNE_MAXITER, prune_margin=ORDER_PRUNE_MARGIN):
+    """
+    按AIC/BIC在 (p,d,q) 网格中自动选择阶数
+    - 初筛：所有候选以少量迭代并行拟合，信息准则明显更差的候选直接淘汰
+    - 精选：剩余候选完整拟合，取信息准则最小者
+    选出的阶数按序列指纹缓存，数据不变时不再搜索
+    :param values: 观测序列
+    :param order_grid: dict, key: 'p'/'d'/'q', value: 可选取值，默认为 ORDER_GRID
+    :param criterion: 'aic' 或 'bic'
+    :param max_workers: 工作进程数，为1时在当前进程串行搜索
+    :param prune_maxiter: 初筛阶段的最大迭代次数
+    :param prune_margin: 初筛阶段的淘汰阈值
+    :return: (p, d, q)
+    """
+    if criterion not in ('aic', 'bic'):
+        raise ValueError("criterion must be 'aic' or 'bic'")
+    candidates = _order_candidates(order_grid)
+    if not candidates:
+        raise ValueError("order_grid contains no candidate orders")
+    values = np.asarray(values, dtype=float)
+    cache_key = (_series_fingerprint(values), candidates, criterion)
+    with _order_cache_lock:
+        if cache_key in _order_cache:
+            _order_cache.move_to_end(cache_key)
+            return _order_cache[cache_key]
+
+    if len(candidates) > 1:
+        scores = _score_orders(values, candidates, criterion, prune_maxiter, max_workers)
+        best = min(scores)
+        ranked = sorted((score, order) for score, order in zip(scores, candidates)
+                        if score <= best + prune_margin)
+        candidates = tuple(order for _, order in ranked[:ORDER_MAX_FINALISTS]) or candidates[:1]
+    scores = _score_orders(values, candidates, criterion, None, max_workers)
+    best_score, best_order = min(zip(scores, candidates))
+    if not math.isfinite(best_score):
+        raise ValueError("No candidate order could be fitted")
+
+    _remember_order(cache_key, best_order)
+    return best_order
+
+
+def _cached_order(values, order_grid, criterion):
+    """查询已缓存的自动定阶结果，未缓存时返回None"""
+    key = (_series_fingerprint(values), _order_candidates(order_grid), criterion)
+    with _order_cache_lock:
+        return _order_cache.get(key)
+
+
+def _store_order(values, order_grid, criterion, order):
+    """记录在其他进程中选出的阶数"""
+    key = (_series_fingerprint(values), _order_candidates(order_grid), criterion)
+    _remember_order(key, order)
 
-def prediction_function(df,d=1,p=5,q=0):
-    #前十票房
-    Top_10_Gross_list=df['Top_10_Gross'].tolist()
-    arima=sm.tsa.SARIMAX(Top_10_Gross_list, order=(p,d,q)) #p=5,d=1,q=0
-    Top_10_Gross_model_results=arima.fit()
 
-    forecast_Top_10_Gross = Top_10_Gross_model_results.get_forecast(steps=10) #预测未来10个时间点
-    Top_10_Gross_predictions = forecast_Top_10_Gross.predicted_mean.tolist()
+def _auto_fit_task(values, order_grid, criterion, timeout):
+    """进程池中执行的自动定阶+拟合任务，返回 (阶数, 拟合结果)"""
+    with _time_limit(timeout):
+        order = select_order(values, order_grid, criterion, max_workers=1)
+        return order, _fit_model(values, order)
 
-    #总票房
-    Overall_Gross_list = df['Overall_Gross'].tolist()
-    arima = sm.tsa.SARIMAX(Overall_Gross_list, order=(p, d, q))  # p=5,d=1,q=0
-    Overall_Gross_model_results = arima.fit()
 
-    forecast_Overall_Gross = Overall_Gross_model_results.get_forecast(steps=10)  # 预测未来10个时间点
-    Overall_Gross_predictions = forecast_Overall_Gross.predicted_mean.tolist()
+def _error_message(e):
+    return f'{type(e).__name__}: {e}'
 
-    #发行数量
-    Releases_list = df['Releases'].tolist()
-    arima = sm.tsa.SARIMAX(Releases_list, order=(p, d, q))  # p=5,d=1,q=0
-    Releases_model_result = arima.fit()
 
-    forecast_Releases = Releases_model_result.get_forecast(steps=10)  # 预测未来10个时间点
-    Releases_predictions = forecast_Releases.predicted_mean.tolist()
+def _frames_rows(args, kwargs, result):
+    frames = args[0] if args else kwargs['frames']
+    return sum(len(df) for df in frames.values())
 
-    return {
-        'Top_10_Gross': Top_10_Gross_predictions,
-        'Overall_Gross': Overall_Gross_predictions,
-        'Releases': Releases_predictions
-    }
 
+@profiled(rows=_frames_rows)
+def batch_prediction(frames, metrics=METRICS, d=1, p=5, q=0, steps=FORECAST_STEPS,
+                     max_workers=None, timeout=None, auto_order=False, order_grid=None, criterion='aic'):
+    """
+    批量预测多个国家的多个指标
+    可复用缓存的序列直接预测，其余 (国家, 指标) 在进程池中并发拟合
+    单个序列拟合失败或超时只记录错误，不影响其他序列
+    :param frames: dict, key: 国家名, value: 清洗后的国家数据
+    :param metrics: 需要预测的指标列表
+    :param steps: 预测的时间点个数
+    :param max_workers: 工作进程数，默认等于CPU核数，为1时在当前进程串行拟合
+    :param timeout: 单次拟合(自动定阶时为定阶+拟合)的超时时间(秒)，None表示不限制
+    :param auto_order: 为True时忽略p,d,q，每个序列在工作进程中自动定阶
+    :return: (results, errors)
+        results: {国家: {指标: 预测值列表}}
+        errors: {国家: {指标: 错误信息}}
+    """
+    results = {}
+    errors = {}
+    pending = {}  # key: (国家, 指标), value: (观测序列, 阶数，自动定阶且未缓存时为None)
+    for country, df in frames.items():
+        for metric in metrics:
+            values = df[metric].tolist()
+            try:
+                order = _cached_order(values, order_grid, criterion) if auto_order else (p, d, q)
+                cached = forecast_cache.get((country, metric, order), values) if order is not None else None
+                if cached is not None:
+                    results.setdefault(country, {})[metric] = _forecast(cached, steps)
+                else:
+                    pending[(country, metric)] = (values, order)
+            except Exception as e:
+                errors.setdefault(country, {})[metric] = _error_message(e)
 
+    if pending:
+        serial = max_workers == 1  # 为1时在当前进程串行拟合，超时同样由 _time_limit 控制
+        executor = None if serial else get_executor(max_workers)
+        tasks = {}
+        for key, (values, order) in pending.items():
+            if order is None:
+                task = (_auto_fit_task, values, order_grid, criterion, timeout)
+            else:
+                task = (_fit_task, values, order, timeout)
+            tasks[key] = task if serial else executor.submit(run_collected, *task)
+        broken = False
+        for (country, metric), task in tasks.items():
+            values, order = pending[(country, metric)]
+            try:
+                outcome = task[0](*task[1:]) if serial else collected_result(task)
+                if order is None:
+                    order, model_results = outcome
+                    _store_order(values, order_grid, criterion, order)
+                else:
+                    model_results = outcome
+                forecast_cache.put((country, metric, order), values, model_results)
+                results.setdefault(country, {})[metric] = _forecast(model_results, steps)
+            except Exception as e:
+                broken = broken or isinstance(e, BrokenProcessPool)
+                errors.setdefault(country, {})[metric] = _error_message(e)
+        if broken:
+            reset_executor(executor)
+    return results, errors
@@ -0,0 +1,358 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_TRACEMALLOC = os.environ.get('PROFILE_TRACEMALLOC') == '1'  # 用tracemalloc统计各阶段的内存峰值增量(开销较大)
+PROFILE_QUERY_FLAG = 'profile'  # ?profile=1(cProfile) 或 ?profile=pyinstrument 采集单个请求的调用剖析
+PROFILE_TOP_FUNCTIONS = 40  # cProfile报告中列出的函数个数
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # 请求耗时直方图的分桶(秒)
+METRICS_PREFIX = 'platform'  # 指标名前缀
+
+_records = contextvars.ContextVar('profiling_records', default=None)  # 当前请求(或作业)收集的阶段记录
+_frames = threading.local()  # 当前线程中嵌套的阶段，用于在嵌套阶段间传递内存峰值
+
+
+class StageRecord:
+    """单个阶段一次执行的耗时与资源占用"""
+    __slots__ = ('stage', 'wall', 'cpu', 'memory', 'rows')
+
+    def __init__(self, stage, wall, cpu, memory, rows):
+        self.stage = stage
+        self.wall = wall  # 墙钟时间(秒)
+        self.cpu = cpu  # 当前线程的CPU时间(秒)
+        self.memory = memory  # 内存峰值增量(字节)
+        self.rows = rows  # 处理的行数，未知时为None
+
+    def to_dict(self):
+        return {'stage': self.stage, 'wall': self.wall, 'cpu': self.cpu, 'memory': self.memory, 'rows': self.rows}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['stage'], d['wall'], d['cpu'], d['memory'], d['rows'])
+
+
+def _max_rss():
+    """进程的常驻内存峰值(字节)，不支持时返回0"""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # Linux以KB为单位
+
+
+class _Frame:
+    __slots__ = ('start_memory', 'child_peak')
+
+    def __init__(self, start_memory):
+        self.start_memory = start_memory
+        self.child_peak = 0  # 嵌套阶段观测到的内存峰值(绝对值)
+
+
+def _enter_memory():
+    stack = getattr(_frames, 'stack', None)
+    if stack is None:
+        stack = _frames.stack = []
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)  # reset_peak 会清除外层阶段已观测到的峰值
+        tracemalloc.reset_peak()
+        frame = _Frame(current)
+    else:
+        frame = _Frame(_max_rss())
+    stack.append(frame)
+    return frame
+
+
+def _exit_memory(frame):
+    stack = _frames.stack
+    stack.pop()
+    if tracemalloc.is_tracing():
+        peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        return max(0, peak - frame.start_memory)
+    return max(0, _max_rss() - frame.start_memory)
+
+
+def count_rows(value):
+    """DataFrame、Series、ndarray 的行数，其他对象返回None"""
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    记录一个阶段的墙钟时间、CPU时间、内存峰值增量与行数
+    未设置 PROFILE_TRACEMALLOC 时内存为进程常驻内存峰值的增量，只在阶段推高了峰值时非零
+    :param name: 阶段名，如 'cleaning.clean_data2'
+    :param rows: 处理的行数；也可在 with 块中设置 yield 出的 dict 的 'rows'
+    """
+    info = {'rows': rows}
+    frame = _enter_memory()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield info
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        memory = _exit_memory(frame)
+        record_stage(StageRecord(name, wall, cpu, memory, info['rows']))
+
+
+def profiled(name=None, rows=None):
+    """
+    阶段装饰器，默认阶段名为 模块名.函数名
+    :param rows: 计算行数的函数 rows(args, kwargs, result)，默认取第一个位置参数(通常为DataFrame)的行数
+    """
+    def decorator(func):
+        stage_name = name or f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name) as info:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    info['rows'] = rows(args, kwargs, result)
+                elif args:
+                    info['rows'] = count_rows(args[0])
+                return result
+        return wrapper
+    return decorator
+
+
+def record_stage(record):
+    """将阶段记录计入全局指标，并加入当前请求(或作业)的记录"""
+    metrics.observe_stage(record)
+    records = _records.get()
+    if records is not None:
+        records.append(record)
+
+
+@contextmanager
+def collect():
+    """
+    收集 with 块内(当前线程及复制了上下文的任务中)执行的阶段记录
+    在线程池中执行的阶段只计入全局指标；进程池中的阶段需以 run_collected 提交、collected_result 取结果才会计入主进程
+    :return: 阶段记录列表，with 块结束后完整
+    """
+    records = []
+    token = _records.set(records)
+    try:
+        yield records
+    finally:
+        _records.reset(token)
+
+
+def run_collected(func, *args, **kwargs):
+    """
+    在进程池的工作进程中执行 func 并收集其中的阶段记录，返回 (结果, [阶段记录dict])
+    主进程用 collected_result 取结果，同时将阶段记录计入主进程
+    """
+    with collect() as records:
+        result = func(*args, **kwargs)
+    return result, [record.to_dict() for record in records]
+
+
+def collected_result(future, timeout=None):
+    """
+    取 run_collected 任务的结果，工作进程中的阶段记录计入主进程的全局指标与当前请求(或作业)的记录
+    :param future: 以 executor.submit(run_collected, func, ...) 提交得到的Future
+    """
+    result, records = future.result(timeout)
+    for record in records:
+        record_stage(StageRecord.from_dict(record))
+    return result
+
+
+def summarize(records):
+    """按阶段名汇总记录，返回 OrderedDict，key: 阶段名, value: {'calls', 'wall', 'cpu', 'memory', 'rows'}"""
+    summary = OrderedDict()
+    for record in records:
+        item = summary.setdefault(record.stage, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'memory': 0, 'rows': 0})
+        item['calls'] += 1
+        item['wall'] += record.wall
+        item['cpu'] += record.cpu
+        item['memory'] = max(item['memory'], record.memory)
+        item['rows'] += record.rows or 0
+    return summary
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    进程内的性能指标：各阶段的调用次数、累计耗时、CPU时间、行数与内存峰值增量，以及各接口的请求耗时直方图
+    render() 输出Prometheus文本格式
+    """
+
+    def __init__(self, buckets=REQUEST_BUCKETS, prefix=METRICS_PREFIX):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._stages = {}  # key: 阶段名, value: [次数, 墙钟时间, CPU时间, 行数, 最大内存峰值增量]
+        self._requests = {}  # key: (接口, 方法, 状态码), value: [次数, 累计耗时, 各分桶计数...]
+        self._lock = threading.Lock()
+
+    def observe_stage(self, record):
+        with self._lock:
+            entry = self._stages.get(record.stage)
+            if entry is None:
+                entry = self._stages[record.stage] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += record.wall
+            entry[2] += record.cpu
+            entry[3] += record.rows or 0
+            entry[4] = max(entry[4], record.memory)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        key = (endpoint, method, status)
+        with self._lock:
+            entry = self._requests.get(key)
+            if entry is None:
+                entry = self._requests[key] = [0, 0.0] + [0] * len(self.buckets)
+            entry[0] += 1
+            entry[1] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[2 + i] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+
+    def render(self):
+        """Prometheus文本格式(text/plain; version=0.0.4)"""
+        p = self.prefix
+        with self._lock:
+            stages = sorted(self._stages.items())
+            requests = sorted(self._requests.items())
+        lines = []
+        stage_metrics = [
+            ('stage_calls_total', 'counter', 'Number of stage executions', 0),
+            ('stage_seconds_total', 'counter', 'Wall time spent in the stage', 1),
+            ('stage_cpu_seconds_total', 'counter', 'CPU time spent in the stage', 2),
+            ('stage_rows_total', 'counter', 'Rows processed by the stage', 3),
+            ('stage_peak_memory_delta_bytes', 'gauge', 'Largest peak memory increase of a single execution', 4),
+        ]
+        for name, kind, help_text, i in stage_metrics:
+            lines.append(f'# HELP {p}_{name} {help_text}')
+            lines.append(f'# TYPE {p}_{name} {kind}')
+            for stage_name, entry in stages:
+                lines.append(f'{p}_{name}{{stage="{_escape_label(stage_name)}"}} {entry[i]}')
+
+        lines.append(f'# HELP {p}_request_duration_seconds Request duration')
+        lines.append(f'# TYPE {p}_request_duration_seconds histogram')
+        for (endpoint, method, status), entry in requests:
+            labels = f'endpoint="{_escape_label(endpoint)}",method="{method}",status="{status}"'
+            for bound, count in zip(self.buckets, entry[2:]):
+                lines.append(f'{p}_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{p}_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry[0]}')
+            lines.append(f'{p}_request_duration_seconds_sum{{{labels}}} {entry[1]}')
+            lines.append(f'{p}_request_duration_seconds_count{{{labels}}} {entry[0]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()  # 进程内共享的性能指标
+
+
+def server_timing(records, total):
+    """
+    生成 Server-Timing 响应头，每个阶段一项(同名阶段合并)，最后为请求总耗时
+    :param records: 当前请求的阶段记录
+    :param total: 请求总耗时(秒)
+    """
+    items = []
+    for name, item in summarize(records).items():
+        token = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+        items.append(f'{token};dur={item["wall"] * 1000:.1f};desc="{item["calls"]}x cpu={item["cpu"] * 1000:.1f}ms"')
+    items.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(items)
+
+
+def _profile_response(profiler, kind):
+    """将单个请求的调用剖析结果作为响应返回"""
+    from flask import Response
+
+    if kind == 'pyinstrument':
+        return Response(profiler.output_html(), mimetype='text/html')
+    import io
+    import pstats
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    return Response(out.getvalue(), mimetype='text/plain')
+
+
+def init_app(app, metrics_path='/metrics'):
+    """
+    为Flask应用注册性能统计：
+    - 每个请求的各阶段耗时写入 Server-Timing 响应头，请求耗时计入 metrics
+    - metrics_path 以Prometheus文本格式输出指标
+    - ?profile=1 用cProfile、?profile=pyinstrument 用pyinstrument剖析该请求，响应替换为剖析报告；
+      只在 app.config['PROFILE_CAPTURE'] 为真(默认为调试模式)时生效
+    """
+    from flask import Response, g, request
+
+    app.config.setdefault('PROFILE_CAPTURE', app.debug)
+    if PROFILE_TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    @app.before_request
+    def _start_profiling():
+        g.profiling_start = time.perf_counter()
+        g.profiling_records = []
+        _records.set(g.profiling_records)
+        g.profiler = None
+        flag = request.args.get(PROFILE_QUERY_FLAG)
+        if flag and app.config['PROFILE_CAPTURE']:
+            if flag == 'pyinstrument':
+                from pyinstrument import Profiler
+                profiler = Profiler()
+                profiler.start()
+            else:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+            g.profiler = ('pyinstrument' if flag == 'pyinstrument' else 'cprofile', profiler)
+
+    @app.after_request
+    def _finish_profiling(response):
+        if 'profiling_start' not in g:
+            return response
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            kind, profiler = profiler
+            if kind == 'pyinstrument':
+                profiler.stop()
+            else:
+                profiler.disable()
+            response = _profile_response(profiler, kind)
+        total = time.perf_counter() - g.profiling_start
+        response.headers['Server-Timing'] = server_timing(g.profiling_records, total)
+        metrics.observe_request(request.url_rule.rule if request.url_rule else 'unmatched', request.method,
+                                response.status_code, total)
+        return response
+
+    @app.teardown_request
+    def _reset_profiling(exc):
+        _records.set(None)
+
+    @app.route(metrics_path, endpoint='metrics')
+    def _metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,683 @@
+import hashlib
+import importlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import pandas as pd
 from cleaning import clean_data1, clean_data2, clean_data3
-from analysis import analysis_function
-from predict import prediction_function
-from visualization import visual3
+from analysis import analysis_function, sweep_k, SWEEP_K_VALUES
+from predict import prediction_function, batch_prediction
+from visualization import (visual2, visual3, render_dashboard, render_analysis_chart, render_prediction_chart,
+                           TOP250_CHARTS)
+from indexing import (TermIndex, lookup_term_index, register_term_index, resolve_rating_col, source_key,
+                      term_index_for)
+from pools import get_executor, prune_files, reset_executor
+from profiling import collected_result, count_rows, profiled, run_collected
+
+DATASET_CACHE_MAX_ENTRIES = 32  # 缓存的数据集个数上限
+DATASET_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 缓存的数据集内存上限(字节)
+SIDECAR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sidecar')  # 列式缓存文件目录
+SIDECAR_MAX_FILES = 256  # 列式缓存文件个数上限
+STREAM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.stream')  # 流式清洗结果目录
+STREAM_CHUNK_ROWS = 50000  # 流式加载每块的行数
+PIPELINE_MEMO_MAX_ENTRIES = 64  # 流水线记忆输出的阶段个数上限
+# DataManager中按国家名、电影名或图表类型存放的属性，merge时按key更新，其余结果对象整体替换
+MERGE_BY_KEY = ('data_country', 'data_comments', 'cleaned_data_country', 'cleaned_data_comments', 'prediction_data',
+                'comment_index', 'visuals_top250_1', 'visuals_top250_2', 'visuals_top250_3', 'visuals_top250_4',
+                'visuals_top250_5', 'visuals_country', 'visuals_comments')
+ENABLE_COPY_ON_WRITE = True  # 应用入口调用 enable_copy_on_write 时是否启用copy-on-write(导出快照不再立即复制数据)
+
+# 分析、预测、可视化在首次使用时才导入的重型库，warm_up 可预先导入
+HEAVY_MODULES = (
+    'sklearn.preprocessing', 'sklearn.cluster', 'sklearn.decomposition', 'sklearn.metrics',  # 聚类分析
+    'statsmodels.tsa.statespace.sarimax',  # 票房预测
+    'matplotlib.figure', 'matplotlib.collections', 'matplotlib.backends.backend_agg', 'seaborn',  # 静态图表
+    'plotly.express', 'plotly.graph_objects', 'wordcloud',  # 交互图表、词云
+)
+
+# 数据集类型的识别依据：包含全部列名即为该类型
+SCHEMA_COLUMNS = {
+    'top250': {'电影名字', '评分', '评分人数', '年份'},  # 豆瓣TOP250数据 -> load_data1
+    'country': {'Dates', 'Top_10_Gross', 'Overall_Gross', 'Releases'},  # 特定国家周末票房数据 -> load_data2
+}
+COMMENT_COLUMNS = ['comment', '字段1']  # 电影评论数据的评论列名 -> load_data3
+COUNTRY_NAMES = {  # Box Office Mojo 文件名中的国家形容词 -> 国家名
+    'Chinese': '中国',
+    'British': '英国',
+    'French': '法国',
+    'German': '德国',
+    'Japanese': '日本',
+}
+
+
+def _file_digest(file_path, chunk_size=1 << 20):
+    """分块计算文件内容哈希"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _parse_file(file_path):
+    """按扩展名解析csv/xls/xlsx文件"""
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    return pd.read_excel(file_path)
+
+
+def _feather():
+    """按需导入pyarrow.feather，未安装时返回None(不生成列式缓存)"""
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+    return feather
+
+
+def _sidecar_path(digest):
+    return os.path.join(SIDECAR_DIR, digest + '.feather')
+
+
+def _normalize_dtypes(df):
+    """
+    统一列类型以便写入Arrow(只在写入列式缓存时调用，返回新的DataFrame，不修改df)：
+    - object列中混有字符串与其他类型时，非空值统一转为字符串
+    - 列名统一转为字符串
+    """
+    df = df.rename(columns=str) if not all(isinstance(col, str) for col in df.columns) else df.copy(deep=False)
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object:
+            continue
+        kinds = set(type(v) for v in series.dropna())
+        if len(kinds) > 1 and str in kinds:
+            df[col] = series.where(series.isna(), series.astype(str))
+    return df
+
+
+def _write_sidecar(digest, df):
+    """
+    将解析结果统一列类型后转存为未压缩的Feather文件(读取时不需要解压)
+    :return: 写入成功时返回统一列类型后的DataFrame(与之后从列式缓存读出的数据一致)，
+             未安装pyarrow或写入失败时原样返回 df
+    """
+    feather = _feather()
+    if feather is None:
+        return df
+    normalized = _normalize_dtypes(df)
+    path = _sidecar_path(digest)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(SIDECAR_DIR, exist_ok=True)
+        feather.write_feather(normalized.reset_index(drop=True), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return df
+    prune_files(SIDECAR_DIR, '.feather', SIDECAR_MAX_FILES)
+    return normalized
+
+
+def _read_sidecar(digest):
+    """
+    读取Feather列式缓存，不存在或损坏时返回None
+    转换为DataFrame时各列完整拷贝到内存，memory_map只省去读取文件时的缓冲拷贝；
+    保持numpy列类型，冷、热加载得到的列类型一致
+    """
+    feather = _feather()
+    path = _sidecar_path(digest)
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        return feather.read_table(path, memory_map=True).to_pandas()
+    except Exception:
+        return None
+
+
+@profiled('storage.read_file', rows=lambda args, kwargs, result: count_rows(result))
+def _load_file(file_path, digest):
+    """
+    加载数据文件：优先读取同内容的列式缓存，否则解析原文件并转存列式缓存
+    :param file_path: 数据文件路径
+    :param digest: 文件内容哈希
+    """
+    df = _read_sidecar(digest)
+    if df is None:
+        df = _write_sidecar(digest, _parse_file(file_path))
+    return df
+
+
+def _parse_task(file_path):
+    """解析进程池中执行的文件解析任务，返回 (内容哈希, DataFrame)"""
+    digest = _file_digest(file_path)
+    return digest, _load_file(file_path, digest)
+
+
+def warm_up(modules=HEAVY_MODULES):
+    """
+    预先导入重型库。在fork工作进程前的主进程中调用(如 gunicorn --preload)，
+    工作进程继承已导入的模块，首个分析、预测、可视化请求不再等待导入
+    :param modules: 需导入的模块名
+    :return: dict, key: 模块名, value: 导入耗时(秒)，未安装的模块为None
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            timings[name] = None  # 未安装时在首次使用时报错，不影响其他功能
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def detect_schema(df):
+    """
+    按列名识别数据集类型
+    :return: 'top250' / 'country' / 'comments'
+    """
+    columns = set(map(str, df.columns))
+    for kind, required in SCHEMA_COLUMNS.items():
+        if required <= columns:
+            return kind
+    if any(col in columns for col in COMMENT_COLUMNS) or len(columns) == 1:
+        return 'comments'
+    raise ValueError(f"Unrecognized data schema with columns: {', '.join(sorted(columns))}")
+
+
+def infer_dataset_name(kind, file_name):
+    """
+    根据文件名推断国家名或电影名
+    - 'Chinese Box Office Weekends For 2024 - Box Office Mojo.xlsx' -> '中国'
+    - 'country_data_中国.csv' -> '中国'
+    - '肖申克的救赎影评.xlsx'、'霸王别姬 短评.xlsx'、'comments_霸王别姬.csv' -> 电影名
+    豆瓣TOP250数据没有名称，返回None
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0].strip()
+    if kind == 'country':
+        first = stem.split()[0] if stem.split() else stem
+        if first in COUNTRY_NAMES:
+            return COUNTRY_NAMES[first]
+        return re.sub(r'^country_data_', '', stem)
+    if kind == 'comments':
+        return re.sub(r'^comments_|\s*(影评|短评|评论)$', '', stem) or stem
+    return None
+
+
+def iter_file_chunks(file_path, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    分块读取csv/xlsx文件，每次只在内存中保留 chunk_rows 行
+    xls格式无法流式读取，整表读入后再分块
+    :param file_path: 数据文件路径
+    :param chunk_rows: 每块的行数
+    """
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunk_rows)
+    elif file_path.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [f'Unnamed: {i}' if name is None else str(name) for i, name in enumerate(header)]
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunk_rows:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(file_path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+class ChunkedParquetWriter:
+    """
+    逐块追加DataFrame的Parquet写入器，写完后原子替换目标文件
+    后续块的列类型按第一块的schema转换
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Streaming ingestion requires pyarrow") from None
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self._tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        self._writer = None
+        self.rows = 0
+
+    def write(self, df):
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = self._pq.ParquetWriter(self._tmp_path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is None:
+            return False
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        return True
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def read_parquet_frame(path):
+    """
+    读取完整的Parquet文件为DataFrame，结果完全载入内存
+    memory_map只省去读取文件时的缓冲拷贝，转换后的DataFrame不与文件共享内存；需要限制内存时用 iter_parquet_chunks
+    """
+    import pyarrow.parquet as pq
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+
+def iter_parquet_chunks(path, chunk_rows=STREAM_CHUNK_ROWS):
+    """分块读取Parquet文件，每次只在内存中保留 chunk_rows 行"""
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def _clean_comment_chunks(file_path, store_path, chunk_rows, rating_col):
+    """
+    分块读取并清洗电影评论，清洗结果追加到Parquet列式存储，逐块返回写入的内容
+    只保存评论列、评分列与 cleaned_comment，并统一为字符串，避免按块推断出不同的schema
+    """
+    writer = ChunkedParquetWriter(store_path)
+    try:
+        for chunk in iter_file_chunks(file_path, chunk_rows):
+            cleaned = clean_data3(chunk)
+            comment_col = 'comment' if 'comment' in chunk.columns else chunk.columns[0]
+            rating = resolve_rating_col(chunk.columns, rating_col)
+            columns = [c for c in (comment_col, rating) if c is not None] + ['cleaned_comment']
+            stored = cleaned[columns].astype(str)
+            writer.write(stored)
+            yield stored
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+
+def _stream_path(kind, digest):
+    """流式清洗结果路径，按源文件内容哈希命名"""
+    return os.path.join(STREAM_DIR, f'{kind}_{digest}.parquet')
+
+
+class DatasetCache:
+    """
+    进程级的已加载数据集缓存
+    - 以文件路径为key，命中需 mtime、大小、内容哈希一致
+    - mtime/大小变化时重新计算内容哈希，内容未变则继续复用
+    - 按LRU淘汰，总内存不超过 max_bytes
+    缓存返回的DataFrame为共享对象，调用方不得原地修改
+    """
+
+    def __init__(self, max_entries=DATASET_CACHE_MAX_ENTRIES, max_bytes=DATASET_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key: 文件路径, value: (mtime_ns, size, digest, df, nbytes)
+        self._paths_by_digest = {}  # key: 内容哈希, value: 文件路径，内容相同的不同文件共用一份数据
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path, reader=_load_file):
+        """
+        获取文件对应的DataFrame，未命中时调用 reader 解析并写入缓存
+        :param file_path: 数据文件路径
+        :param reader: 解析函数，接收文件路径与内容哈希，返回DataFrame
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[3]
+
+        digest = _file_digest(path)
+        with self._lock:
+            same_path = self._paths_by_digest.get(digest)
+            if same_path is not None:
+                # 内容未变(仅mtime变化，或同一内容的另一文件)：复用已解析的数据
+                df, nbytes = self._entries[same_path][3:]
+                self._remove(same_path)
+                self._remove(path)
+                self._insert(path, stat, digest, df, nbytes)
+                self.hits += 1
+                return df
+
+        df = reader(path, digest)
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self.misses += 1
+            self._remove(path)
+            if nbytes <= self.max_bytes:
+                self._insert(path, stat, digest, df, nbytes)
+        return df
+
+    def prefetch(self, file_paths, max_workers=None):
+        """
+        在解析进程池中并行解析尚未缓存的文件并写入缓存，随后的 get 直接命中
+        单个文件解析失败时跳过，错误在之后 get 该文件时重新抛出
+        :param file_paths: 数据文件路径列表
+        :param max_workers: 解析进程数，默认等于CPU核数，为1时不预解析
+        """
+        missing = []
+        for path in dict.fromkeys(os.path.abspath(p) for p in file_paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            with self._lock:
+                entry = self._entries.get(path)
+            if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                missing.append(path)
+        if len(missing) < 2 or max_workers == 1:
+            return
+
+        executor = get_executor(max_workers)
+        futures = {path: executor.submit(run_collected, _parse_task, path) for path in missing}
+        for path, future in futures.items():
+            try:
+                _, df = collected_result(future)
+            except BrokenProcessPool:
+                reset_executor(executor)
+                raise
+            except Exception:
+                continue
+            self.get(path, reader=lambda _path, _digest, df=df: df)
+
+    def digest(self, file_path):
+        """文件内容哈希，mtime与大小未变时直接使用缓存中记录的哈希"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                return entry[2]
+        return _file_digest(path)
+
+    def invalidate(self, file_path=None):
+        """
+        使缓存失效
+        :param file_path: 文件路径，为None时清空全部缓存
+        """
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+                self._paths_by_digest.clear()
+                self._total_bytes = 0
+            else:
+                self._remove(os.path.abspath(file_path))
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= entry[4]
+            if self._paths_by_digest.get(entry[2]) == path:
+                del self._paths_by_digest[entry[2]]
+
+    def _insert(self, path, stat, digest, df, nbytes):
+        self._entries[path] = (stat.st_mtime_ns, stat.st_size, digest, df, nbytes)
+        self._paths_by_digest[digest] = path
+        self._total_bytes += nbytes
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            path = next(iter(self._entries))
+            self._remove(path)
+
+
+dataset_cache = DatasetCache()  # 进程内共享的数据集缓存
+
+
+def copy_on_write_enabled():
+    """pandas>=3 始终启用copy-on-write(选项已弃用，不再读取)；更早的版本以 mode.copy_on_write 选项为准"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return getattr(pd.options.mode, 'copy_on_write', False) is True
+
+
+def enable_copy_on_write():
+    """
+    启用pandas的copy-on-write，由应用入口调用，导入本模块不修改pandas的全局设置
+    pandas>=3 已始终启用，不设置已弃用的选项；不支持该选项的旧版本pandas保持深拷贝快照
+    """
+    if ENABLE_COPY_ON_WRITE and not copy_on_write_enabled() and hasattr(pd.options.mode, 'copy_on_write'):
+        pd.set_option('mode.copy_on_write', True)
+
+
+class PipelineStage:
+    """流水线中的一个阶段"""
+    __slots__ = ('name', 'func', 'deps', 'params', 'executor', 'file_path')
+
+    def __init__(self, name, func, deps, params, executor, file_path=None):
+        self.name = name
+        self.func = func  # 以上游阶段的输出(按deps顺序)为位置参数、params为关键字参数调用
+        self.deps = tuple(deps)
+        self.params = params
+        self.executor = executor  # 'thread' 或 'process'(func及其参数、输出需可pickle)
+        self.file_path = file_path  # 源阶段读取的数据文件
+
+
+def _stage_key(stage, dep_keys):
+    h = hashlib.blake2b(stage.name.encode('utf-8'), digest_size=16)
+    h.update(f'{getattr(stage.func, "__module__", "")}.{getattr(stage.func, "__qualname__", "")}'.encode('utf-8'))
+    h.update(repr(sorted(stage.params.items())).encode('utf-8'))
+    for key in dep_keys:
+        h.update(key.encode('ascii'))
+    return h.hexdigest()
+
+
+class Pipeline:
+    """
+    带记忆的流水线DAG(加载 -> 清洗 -> 分析/预测 -> 可视化)
+    - 源阶段的key为输入文件的内容哈希，其余阶段的key由阶段名、函数、参数与上游阶段的key哈希得到
+    - key与上次运行相同的阶段直接复用上次的输出；输入变化时只有其下游阶段重新运行
+    - 上游均已完成、互不依赖的阶段并发执行：executor='process'的阶段在进程池中运行，其余在线程池中运行
+    - explain() 说明最近一次运行中各阶段是复用还是重新运行
+    - 记忆输出按LRU淘汰，最多保留 max_entries 个阶段
+    重复定义同名阶段会替换其定义，已记忆的输出在key不变时继续有效
+    """
+
+    def __init__(self, max_entries=PIPELINE_MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._stages = OrderedDict()  # key: 阶段名, value: PipelineStage
+        self._memo = OrderedDict()  # key: 阶段名, value: (阶段key, 输出)，按LRU淘汰
+        self._report = []  # 最近一次运行的各阶段情况
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def source(self, name, file_path):
+        """定义源阶段：通过进程级数据集缓存读取数据文件"""
+        self._stages[name] = PipelineStage(name, dataset_cache.get, (), {}, 'thread', file_path)
+
+    def stage(self, name, func, deps=(), executor='thread', **params):
+        """
+        定义计算阶段
+        :param name: 阶段名
+        :param func: 阶段函数
+        :param deps: 上游阶段名，其输出按顺序作为 func 的位置参数
+        :param executor: 'thread' 或 'process'
+        :param params: func 的关键字参数，参与阶段key的计算
+        """
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Unknown upstream stage: {', '.join(missing)}")
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self._stages[name] = PipelineStage(name, func, deps, params, executor)
+
+    def _levels(self, targets):
+        """目标阶段及其全部上游，按依赖深度分层"""
+        depth = {}
+
+        def visit(name):
+            if name not in depth:
+                stage = self._stages[name]
+                depth[name] = 1 + max((visit(dep) for dep in stage.deps), default=-1)
+            return depth[name]
+
+        for name in targets:
+            if name not in self._stages:
+                raise ValueError(f"Unknown stage: {name}")
+            visit(name)
+        levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name in self._stages:
+            if name in depth:
+                levels[depth[name]].append(name)
+        return levels
+
+    def run(self, targets=None, max_workers=None):
+        """
+        运行目标阶段(默认全部阶段)及其上游
+        :param targets: 目标阶段名列表
+        :param max_workers: 每层的并发数，默认等于CPU核数，为1时在当前线程串行运行
+        :return: dict, key: 阶段名, value: 输出
+        """
+        with self._lock:
+            targets = list(self._stages) if targets is None else list(targets)
+            keys = {}
+            outputs = {}
+            report = []
+            for level in self._levels(targets):
+                pending = []
+                for name in level:
+                    stage = self._stages[name]
+                    if stage.file_path is not None:
+                        keys[name] = dataset_cache.digest(stage.file_path)
+                    else:
+                        keys[name] = _stage_key(stage, [keys[dep] for dep in stage.deps])
+                    memo = self._memo.get(name)
+                    if memo is not None and memo[0] == keys[name]:
+                        self._memo.move_to_end(name)
+                        outputs[name] = memo[1]
+                        report.append({'stage': name, 'status': 'hit', 'seconds': 0.0, 'key': keys[name]})
+                    else:
+                        pending.append(stage)
+                for name, output, seconds in self._run_level(pending, outputs, max_workers):
+                    outputs[name] = output
+                    self._memo[name] = (keys[name], output)
+                    self._memo.move_to_end(name)
+                    while len(self._memo) > self.max_entries:
+                        self._memo.popitem(last=False)
+                    report.append({'stage': name, 'status': 'run', 'seconds': seconds, 'key': keys[name]})
+            self._report = report
+            return {name: outputs[name] for name in targets}
+
+    def _run_level(self, stages, outputs, max_workers):
+        """并发运行同一层中需要重新计算的阶段，返回 [(阶段名, 输出, 耗时)]"""
+        calls = []
+        for stage in stages:
+            args = (stage.file_path,) if stage.file_path is not None else tuple(outputs[dep] for dep in stage.deps)
+            calls.append((stage, args))
+        if max_workers == 1 or (len(calls) <= 1 and all(stage.executor == 'thread' for stage, _ in calls)):
+            return [(stage.name,) + _timed_call(stage.func, args, stage.params) for stage, args in calls]
+
+        futures = []
+        processes = None
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as threads:
+            for stage, args in calls:
+                if stage.executor == 'process':
+                    processes = processes or get_executor(max_workers)
+                    future = processes.submit(run_collected, _timed_call, stage.func, args, stage.params)
+                else:
+                    future = threads.submit(_timed_call, stage.func, args, stage.params)
+                futures.append((stage.name, stage.executor, future))
+            results = []
+            for name, executor, future in futures:
+                try:
+                    # 进程池中的阶段记录随结果传回，计入主进程
+                    output, seconds = collected_result(future) if executor == 'process' else future.result()
+                    results.append((name, output, seconds))
+                except BrokenProcessPool:
+                    reset_executor(processes)
+                    raise
+        return results
+
+    def explain(self):
+        """
+        最近一次运行中各阶段的情况
+        :return: list, 每项为 {'stage': 阶段名, 'status': 'hit'(复用)/'run'(重新运行), 'seconds': 耗时, 'key': 阶段key}
+        """
+        return list(self._report)
+
+    def without_memo(self):
+        """只保留最近一次运行情况的新流水线，不含阶段定义与记忆输出，用于将作业结果传回主进程"""
+        pipeline = Pipeline(self.max_entries)
+        pipeline._report = self.explain()
+        return pipeline
+
+    def invalidate(self, name=None):
+        """丢弃指定阶段(默认全部)的记忆输出"""
+        with self._lock:
+            if name is None:
+                self._memo.clear()
+            else:
+                self._memo.pop(name, None)
+
+
+def _timed_call(func, args, params):
+    start = time.perf_counter()
+    output = func(*args, **params)
+    return output, time.perf_counter() - start
+
+
+def _snapshot(df):
+    """
+    DataFrame快照：启用copy-on-write时为惰性拷贝(修改时才复制)，否则为深拷贝
+    """
+    if copy_on_write_enabled():
+        return df.copy(deep=False)
+    return df.copy()
+
+
+def _export_frame(df, copy):
+    """导出DataFrame：copy=True返回快照，copy=False返回内部对象本身，调用方不得修改"""
+    if df is None or not copy:
+        return df
+    return _snapshot(df)
+
 
 class DataManager:
     def __init__(self):
@@ -15,7 +690,10 @@ class DataManager:
         self.cleaned_data_comments = {}  # 清洗后的电影评论数据
 
         self.analysis_data = None  # 豆瓣TOP250数据分析结果
-        self.predict_data = {}  # 特定国家数据预测结果
+        self.cluster_sweep = None  # 聚类个数扫描的对比表(各k的inertia与silhouette)
+        self.prediction_data = {}  # 特定国家数据预测结果(与predict_data方法区分命名)
+        self.comment_index = {}  # 电影评论词频索引，key: 电影名, value: TermIndex
+        self.pipeline = Pipeline()  # 带记忆的 加载 -> 清洗 -> 分析/预测 -> 可视化 流水线
 
         # 扩展豆瓣TOP250可视化存储, key: 图类型, value: 图表对象或参数
         self.visuals_top250_1 = {}  # 三维散点图
@@ -34,46 +712,161 @@ class DataManager:
                 return True
         return False
 
+    def _read_file(self, file_path):
+        """读取数据文件，命中进程级缓存时跳过解析"""
+        return dataset_cache.get(file_path)
+
     def load_data1(self, file_path):
         """
         加载豆瓣TOP250数据
         :param file_path: 数据文件路径
+        :return: 是否载入了新数据，同一数据集已加载时返回False
         """
         if not self._check_file_format(file_path):
             raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
-        if file_path.endswith('.csv'):
-            self.data_top250 = pd.read_csv(file_path)
-        elif file_path.endswith(('.xls', '.xlsx')):
-            self.data_top250 = pd.read_excel(file_path)
-        self.cleaned_data_top250 = self.data_top250.copy()  # 初始化清洗后数据为原始数据副本
+        data = self._read_file(file_path)
+        if data is self.data_top250:
+            return False  # 数据未变，保留已有的清洗与分析结果
+        self.data_top250 = data
+        self.cleaned_data_top250 = _snapshot(self.data_top250)  # 初始化清洗后数据为原始数据快照
+        return True
 
     def load_data2(self, country_name, file_path):
         """
         加载特定国家数据
         :param country_name: 国家名
         :param file_path: 数据文件路径
+        :return: 是否载入了新数据，同一数据集已加载时返回False
         """
         if not self._check_file_format(file_path):
             raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
-        if file_path.endswith('.csv'):
-            self.data_country[country_name] = pd.read_csv(file_path)
-        elif file_path.endswith(('.xls', '.xlsx')):
-            self.data_country[country_name] = pd.read_excel(file_path)
-        self.cleaned_data_country[country_name] = self.data_country[country_name].copy()  # 初始化清洗后数据为原始数据副本
+        data = self._read_file(file_path)
+        if data is self.data_country.get(country_name):
+            return False  # 数据未变，保留已有的清洗与预测结果
+        self.data_country[country_name] = data
+        self.cleaned_data_country[country_name] = _snapshot(self.data_country[country_name])  # 初始化清洗后数据为原始数据快照
+        return True
 
     def load_data3(self, movie_name, file_path):
         """
         加载电影评论数据
         :param movie_name: 电影名
         :param file_path: 数据文件路径
+        :return: 是否载入了新数据，同一数据集已加载时返回False
+        """
+        if not self._check_file_format(file_path):
+            raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
+        data = self._read_file(file_path)
+        if data is self.data_comments.get(movie_name):
+            return False  # 数据未变，保留已有的清洗结果
+        self.data_comments[movie_name] = data
+        self.cleaned_data_comments[movie_name] = _snapshot(self.data_comments[movie_name])  # 初始化清洗后数据为原始数据快照
+        return True
+
+    def load_data(self, file_path, name=None, file_name=None):
+        """
+        按列名识别数据集类型，分派到 load_data1 / load_data2 / load_data3
+        :param file_path: 数据文件路径
+        :param name: 国家名或电影名，默认根据 file_name 推断
+        :param file_name: 原始文件名(上传文件保存在临时路径时传入)，默认为 file_path
+        :return: dict, 数据集类型(kind)、名称(name)、行列数(shape)、列名(columns)
+        """
+        if not self._check_file_format(file_path):
+            raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
+        df = self._read_file(file_path)
+        kind = detect_schema(df)
+        if name is None:
+            name = infer_dataset_name(kind, file_name or file_path)
+        if kind == 'top250':
+            self.load_data1(file_path)
+        elif kind == 'country':
+            self.load_data2(name, file_path)
+        else:
+            self.load_data3(name, file_path)
+        return {'kind': kind, 'name': name, 'shape': list(df.shape), 'columns': [str(col) for col in df.columns]}
+
+    def load_files(self, files, max_workers=None):
+        """
+        批量加载多个数据文件：先在进程池中并行解析，再逐个按数据集类型分派
+        单个文件失败不影响其他文件
+        :param files: 数据文件路径列表，或 dict, key: 文件路径, value: 原始文件名(用于推断国家名/电影名)
+        :param max_workers: 解析进程数，默认等于CPU核数
+        :return: dict, key: 文件路径, value: load_data 的返回值，失败时为 {'error': 错误信息}
+        """
+        if not isinstance(files, dict):
+            files = {file_path: None for file_path in files}
+        dataset_cache.prefetch([path for path in files if self._check_file_format(path)], max_workers)
+        results = {}
+        for file_path, file_name in files.items():
+            try:
+                results[file_path] = self.load_data(file_path, file_name=file_name)
+            except Exception as e:
+                results[file_path] = {'error': f'{type(e).__name__}: {e}'}
+        return results
+
+    def stream_data1(self, file_path, chunk_rows=STREAM_CHUNK_ROWS):
+        """
+        流式加载并清洗豆瓣TOP250数据：分块读取，每块执行 clean_data1 后追加到Parquet列式存储
+        不保留原始数据；聚类分析需要完整数据，清洗结果最终完整载入内存，峰值内存取决于清洗后的数据量
+        :param file_path: 数据文件路径
+        :param chunk_rows: 每块的行数
+        :return: 清洗结果的Parquet文件路径
+        """
+        if not self._check_file_format(file_path):
+            raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
+        store_path = _stream_path('top250', _file_digest(file_path))
+        if not os.path.exists(store_path):
+            writer = ChunkedParquetWriter(store_path)
+            try:
+                for chunk in iter_file_chunks(file_path, chunk_rows):
+                    cleaned = clean_data1(chunk)
+                    # 各块统一整数类型，避免按块推断出不同的schema
+                    writer.write(cleaned.astype({'评分人数': 'int64', '年份': 'int64'}))
+            except BaseException:
+                writer.abort()
+                raise
+            if not writer.close():
+                raise ValueError("The data file contains no rows.")
+        self.data_top250 = None
+        self.cleaned_data_top250 = read_parquet_frame(store_path)
+        return store_path
+
+    def stream_data3(self, movie_name, file_path, chunk_rows=STREAM_CHUNK_ROWS, rating_col=None):
+        """
+        流式加载并清洗电影评论数据：分块读取，每块执行 clean_data3，
+        清洗结果追加到Parquet列式存储，并吸收到该电影的词频索引(运行中的聚合)
+        同一文件已有清洗结果时不再读取和清洗源文件：索引仍在时直接复用，否则从列式存储重建
+        不在内存中保留原始或清洗后的完整数据，峰值内存取决于块大小
+        :param movie_name: 电影名
+        :param file_path: 数据文件路径
+        :param chunk_rows: 每块的行数
+        :param rating_col: 评分列名，用于分评分的词频统计
+        :return: 清洗结果的Parquet文件路径
         """
         if not self._check_file_format(file_path):
             raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
-        if file_path.endswith('.csv'):
-            self.data_comments[movie_name] = pd.read_csv(file_path)
-        elif file_path.endswith(('.xls', '.xlsx')):
-            self.data_comments[movie_name] = pd.read_excel(file_path)
-        self.cleaned_data_comments[movie_name] = self.data_comments[movie_name].copy()  # 初始化清洗后数据为原始数据副本
+        digest = _file_digest(file_path)
+        store_path = _stream_path('comments', digest)
+        # 流式读取时没有完整数据可供逐行哈希，索引按源文件内容哈希区分
+        key = source_key(movie_name, rating_col, f'stream:{digest}')
+        index = lookup_term_index(key)
+        if index is None or not os.path.exists(store_path):
+            if os.path.exists(store_path):
+                chunks = iter_parquet_chunks(store_path, chunk_rows)  # 已有清洗结果，直接重建索引，不再重复分词
+            else:
+                chunks = _clean_comment_chunks(file_path, store_path, chunk_rows, rating_col)
+            index = None
+            for stored in chunks:
+                if index is None:
+                    index = TermIndex(movie_name, resolve_rating_col(stored.columns, rating_col), key)
+                index.absorb(stored.drop(columns='cleaned_comment'), cleaned=stored)
+            index = index or TermIndex(movie_name, rating_col, key)
+            index.save()
+            register_term_index(index)
+        self.comment_index[movie_name] = index
+        self.data_comments.pop(movie_name, None)
+        self.cleaned_data_comments.pop(movie_name, None)
+        return store_path
 
     def clean_data1(self):
         """
@@ -104,57 +897,248 @@ class DataManager:
         else:
             raise ValueError(f"No data loaded for {movie_name}. Please load data first.")
 
-    def analyze_data(self):
+    def analyze_data(self, n_clusters=4, algorithm='auto'):
         """
         分析豆瓣TOP250数据
+        :param n_clusters: 聚类个数
+        :param algorithm: 'kmeans' / 'minibatch' / 'auto'(数据量大时使用MiniBatchKMeans)
         """
         if self.cleaned_data_top250 is not None:
-            self.analysis_data = analysis_function(self.cleaned_data_top250)
+            self.analysis_data = analysis_function(self.cleaned_data_top250, n_clusters=n_clusters,
+                                                   algorithm=algorithm)
         else:
             raise ValueError("No cleaned TOP250 data available. Please clean data first.")
 
-    def predict_data(self, country_name):
+    def sweep_clusters(self, k_values=SWEEP_K_VALUES, algorithm='auto', max_workers=None):
+        """
+        并行比较多个聚类个数，以轮廓系数最大的k的聚类结果作为分析结果
+        :param k_values: 候选聚类个数
+        :param algorithm: 'kmeans' / 'minibatch' / 'auto'
+        :param max_workers: 工作进程数，为1时在当前进程串行拟合
+        :return: DataFrame，各k的 inertia 与 silhouette
+        """
+        if self.cleaned_data_top250 is None:
+            raise ValueError("No cleaned TOP250 data available. Please clean data first.")
+        sweep = sweep_k(self.cleaned_data_top250, k_values, algorithm=algorithm, max_workers=max_workers)
+        self.analysis_data = sweep['best']
+        self.cluster_sweep = sweep['report']
+        return sweep['report']
+
+    def predict_data(self, country_name, auto_order=False, max_workers=None):
         """
         预测特定国家数据
         :param country_name: 国家名
+        :param auto_order: 是否按AIC自动选择ARIMA阶数
+        :param max_workers: 自动定阶使用的进程数，为1时在当前进程串行搜索
         """
         if country_name in self.cleaned_data_country:
-            self.predict_data[country_name] = prediction_function(self.cleaned_data_country[country_name])
+            self.prediction_data[country_name] = prediction_function(self.cleaned_data_country[country_name],
+                                                                     country=country_name, auto_order=auto_order,
+                                                                     max_workers=max_workers)
         else:
             raise ValueError(f"No cleaned data available for {country_name}. Please clean data first.")
 
+    def predict_data_batch(self, country_names=None, max_workers=None, timeout=None, auto_order=False):
+        """
+        并发预测多个国家数据，单个序列失败不影响其他国家和指标
+        :param country_names: 国家名列表，默认为全部已清洗的国家
+        :param max_workers: 工作进程数，默认等于CPU核数，为1时在当前进程串行拟合
+        :param timeout: 单次拟合的超时时间(秒)
+        :param auto_order: 是否按AIC自动选择ARIMA阶数
+        :return: 预测失败的序列，{国家: {指标: 错误信息}}
+        """
+        if country_names is None:
+            country_names = list(self.cleaned_data_country)
+        missing = [name for name in country_names if name not in self.cleaned_data_country]
+        if missing:
+            raise ValueError(f"No cleaned data available for {', '.join(missing)}. Please clean data first.")
+        frames = {name: self.cleaned_data_country[name] for name in country_names}
+        results, errors = batch_prediction(frames, max_workers=max_workers, timeout=timeout, auto_order=auto_order)
+        self.prediction_data.update(results)
+        return errors
 
-    def export_data_top250(self):
-        """导出豆瓣TOP250数据"""
-        return self.data_top250.copy() if self.data_top250 is not None else None
 
-    def export_data_country(self, country_name):
-        """导出特定国家数据"""
-        return self.data_country.get(country_name).copy() if country_name in self.data_country else None
+    def analyze_data3(self, movie_name, rating_col=None):
+        """
+        获取与已加载评论数据逐行对应的持久化词频索引
+        同一数据已建立过索引时直接复用；只在末尾追加了评论时只清洗、统计新增的行
+        :param movie_name: 电影名
+        :param rating_col: 评分列名，用于分评分的词频统计
+        :return: 本次新清洗、统计的评论行数
+        """
+        if movie_name not in self.data_comments:
+            raise ValueError(f"No data loaded for {movie_name}. Please load data first.")
+        index, absorbed = term_index_for(movie_name, self.data_comments[movie_name], rating_col=rating_col)
+        self.comment_index[movie_name] = index
+        return absorbed
 
-    def export_data_comments(self, movie_name):
-        """导出电影评论数据"""
-        return self.data_comments.get(movie_name).copy() if movie_name in self.data_comments else None
+    def visual1(self, backend='plotly', max_workers=None):
+        """
+        并行生成豆瓣TOP250分析看板的全部图表并存储
+        :param backend: 三维散点图、平行坐标图、雷达图的渲染后端
+        :param max_workers: 渲染进程数，默认等于CPU核数，为1时在当前进程串行渲染
+        :return: dict, key: 图表类型, value: ChartArtifact
+        """
+        if self.analysis_data is None:
+            raise ValueError("No analysis result available. Please analyze data first.")
+        return render_dashboard(self, backend=backend, max_workers=max_workers)
 
-    def export_cleaned_data_top250(self):
-        """导出清洗后的豆瓣TOP250数据"""
-        return self.cleaned_data_top250.copy() if self.cleaned_data_top250 is not None else None
+    def visual2(self, country_name, historical_points=10):
+        """
+        生成特定国家的票房预测对比图并存储
+        :param country_name: 国家名
+        :param historical_points: 图中保留的历史数据点数
+        :return: ChartArtifact
+        """
+        return visual2(self, country_name, historical_points=historical_points)
 
-    def export_cleaned_data_country(self, country_name):
-        """导出清洗后的特定国家数据"""
-        return self.cleaned_data_country.get(country_name).copy() if country_name in self.cleaned_data_country else None
+    def visual3(self, movie_name, **params):
+        """
+        生成电影评论词云，已建立词频索引时直接使用索引中的词频
+        :param movie_name: 电影名
+        :param params: 词云参数，见 visualization.visual3
+        """
+        return visual3(self, movie_name, **params)
 
-    def export_cleaned_data_comments(self, movie_name):
-        """导出清洗后的电影评论数据"""
-        return self.cleaned_data_comments.get(movie_name).copy() if movie_name in self.cleaned_data_comments else None
+    def run_top250_pipeline(self, file_path, n_clusters=4, algorithm='auto', backend='plotly', max_workers=None):
+        """
+        通过流水线加载、清洗、聚类分析豆瓣TOP250数据并渲染全部图表
+        与上次运行相比输入文件与参数未变的阶段直接复用，五个图表并行渲染
+        :param file_path: 数据文件路径
+        :param n_clusters: 聚类个数
+        :param algorithm: 'kmeans' / 'minibatch' / 'auto'
+        :param backend: 三维散点图、平行坐标图、雷达图的渲染后端
+        :param max_workers: 并发数，为1时在当前线程串行运行
+        :return: dict, key: 图表类型, value: ChartArtifact
+        """
+        if not self._check_file_format(file_path):
+            raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
+        pipeline = self.pipeline
+        pipeline.source('top250/load', file_path)
+        pipeline.stage('top250/clean', clean_data1, deps=['top250/load'])
+        pipeline.stage('top250/analyze', analysis_function, deps=['top250/clean'],
+                       n_clusters=n_clusters, algorithm=algorithm)
+        for chart_type in TOP250_CHARTS:
+            params = {'backend': backend} if chart_type in ('3d_scatter', 'parallel_coords', 'radar_chart') else {}
+            pipeline.stage(f'top250/{chart_type}', render_analysis_chart, deps=['top250/analyze'],
+                           executor='process', chart_type=chart_type, **params)
+        targets = ['top250/load', 'top250/clean', 'top250/analyze'] + [f'top250/{c}' for c in TOP250_CHARTS]
+        outputs = pipeline.run(targets, max_workers=max_workers)
 
-    def export_analysis_result_top250(self):
-        """导出豆瓣TOP250数据分析结果"""
-        return self.analysis_data.copy() if self.analysis_data is not None else None
+        self.data_top250 = outputs['top250/load']
+        self.cleaned_data_top250 = outputs['top250/clean']
+        self.analysis_data = outputs['top250/analyze']
+        store = [self.store_visual1_1, self.store_visual1_2, self.store_visual1_3, self.store_visual1_4,
+                 self.store_visual1_5]
+        charts = {chart_type: outputs[f'top250/{chart_type}'] for chart_type in TOP250_CHARTS}
+        for store_visual, (chart_type, chart) in zip(store, charts.items()):
+            store_visual(chart_type, chart)
+        return charts
 
-    def export_prediction_result_country(self, country_name):
-        """导出特定国家数据预测结果"""
-        return self.predict_data.get(country_name).copy() if country_name in self.predict_data else None
+    def run_country_pipeline(self, files, auto_order=False, historical_points=10, max_workers=None):
+        """
+        通过流水线加载、清洗、预测多个国家的数据并渲染预测对比图，各国家的分支并行运行
+        只有输入文件或参数变化的国家重新计算
+        :param files: dict, key: 国家名, value: 数据文件路径
+        :param auto_order: 是否按AIC自动选择ARIMA阶数
+        :param historical_points: 图中保留的历史数据点数
+        :param max_workers: 并发数，为1时在当前线程串行运行
+        :return: dict, key: 国家名, value: 预测对比图 ChartArtifact
+        """
+        for file_path in files.values():
+            if not self._check_file_format(file_path):
+                raise ValueError("Unsupported file format. Supported formats are csv, xls, xlsx")
+        pipeline = self.pipeline
+        targets = []
+        for country_name, file_path in files.items():
+            prefix = f'country/{country_name}'
+            pipeline.source(f'{prefix}/load', file_path)
+            pipeline.stage(f'{prefix}/clean', clean_data2, deps=[f'{prefix}/load'])
+            # 各国家的预测已在进程池中并行，阶数搜索不再另开进程
+            pipeline.stage(f'{prefix}/predict', prediction_function, deps=[f'{prefix}/clean'], executor='process',
+                           country=country_name, auto_order=auto_order, max_workers=1)
+            pipeline.stage(f'{prefix}/chart', render_prediction_chart, deps=[f'{prefix}/clean', f'{prefix}/predict'],
+                           executor='process', country_name=country_name, historical_points=historical_points)
+            targets += [f'{prefix}/load', f'{prefix}/clean', f'{prefix}/predict', f'{prefix}/chart']
+        outputs = pipeline.run(targets, max_workers=max_workers)
+
+        charts = {}
+        for country_name in files:
+            prefix = f'country/{country_name}'
+            self.data_country[country_name] = outputs[f'{prefix}/load']
+            self.cleaned_data_country[country_name] = outputs[f'{prefix}/clean']
+            self.prediction_data[country_name] = outputs[f'{prefix}/predict']
+            charts[country_name] = outputs[f'{prefix}/chart']
+        if charts:
+            self.store_visual2('prediction_comparison', charts[country_name])  # 与 visual2 一致，保存最后一个国家的图表
+        return charts
+
+    def explain_pipeline(self):
+        """
+        最近一次流水线运行中各阶段是复用(hit)还是重新运行(run)及其耗时
+        :return: list of dict
+        """
+        return self.pipeline.explain()
+
+    def merge(self, other):
+        """
+        合并另一个DataManager(如后台作业在工作进程中得到的结果)的数据、结果与图表
+        MERGE_BY_KEY 中的属性按key更新，其余属性(如 analysis_data)在other中不为None时整体替换，
+        不修改可能被缓存共享的结果对象
+        :param other: DataManager实例
+        """
+        for name, value in vars(other).items():
+            if name == 'pipeline':
+                if value.explain():
+                    self.pipeline = value  # 流水线作业的运行情况，记忆输出保留在工作进程中
+                continue
+            if name in MERGE_BY_KEY:
+                getattr(self, name).update(value)
+            elif value is not None:
+                setattr(self, name, value)
+        for index in other.comment_index.values():
+            register_term_index(index)  # 词频索引已在工作进程中保存，替换进程内缓存的旧索引
+
+    def export_data_top250(self, copy=True):
+        """导出豆瓣TOP250数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.data_top250, copy)
+
+    def export_data_country(self, country_name, copy=True):
+        """导出特定国家数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.data_country.get(country_name), copy)
+
+    def export_data_comments(self, movie_name, copy=True):
+        """导出电影评论数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.data_comments.get(movie_name), copy)
+
+    def export_cleaned_data_top250(self, copy=True):
+        """导出清洗后的豆瓣TOP250数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.cleaned_data_top250, copy)
+
+    def export_cleaned_data_country(self, country_name, copy=True):
+        """导出清洗后的特定国家数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.cleaned_data_country.get(country_name), copy)
+
+    def export_cleaned_data_comments(self, movie_name, copy=True):
+        """导出清洗后的电影评论数据，copy=False时返回只读的内部对象"""
+        return _export_frame(self.cleaned_data_comments.get(movie_name), copy)
+
+    def export_analysis_result_top250(self, copy=True):
+        """导出豆瓣TOP250数据分析结果(浅拷贝的字典)，copy=False时返回只读的内部对象"""
+        if self.analysis_data is None or not copy:
+            return self.analysis_data
+        return self.analysis_data.copy()
+
+    def export_analysis_result_comments(self, movie_name, top_n=None):
+        """导出电影评论词频统计"""
+        return self.comment_index[movie_name].to_frame(top_n) if movie_name in self.comment_index else None
+
+    def export_prediction_result_country(self, country_name, copy=True):
+        """导出特定国家数据预测结果，copy=False时返回只读的内部对象"""
+        result = self.prediction_data.get(country_name)
+        if result is None or not copy:
+            return result
+        return result.copy()
 
         # 新增可视化存储和获取方法
 
@@ -226,3 +1210,18 @@ class DataManager:
         :param vis_type: 图表类型
         """
         return self.visuals_comments.get(vis_type)
+
+    def get_visual(self, vis_type):
+        """
+        在所有可视化存储中按图表类型查找图表
+        :param vis_type: 图表类型
+        :return: ChartArtifact，不存在时返回None
+        """
+        stores = [self.visuals_top250_1, self.visuals_top250_2, self.visuals_top250_3,
+                  self.visuals_top250_4, self.visuals_top250_5, self.visuals_country, self.visuals_comments]
+        for store in stores:
+            if vis_type in store:
+                visual = store[vis_type]
+                # 词云存储为带参数的字典，图表在data字段中
+                return visual['data'] if isinstance(visual, dict) else visual
+        return None
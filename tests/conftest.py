@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOP250_FILE = os.path.join(ROOT, '豆瓣电影TOP250.csv')
+CHINESE_WEEKENDS_FILE = os.path.join(ROOT, 'Chinese Box Office Weekends For 2024 - Box Office Mojo.xlsx')
+COMMENTS_FILE = os.path.join(ROOT, '霸王别姬 短评.xlsx')
+
+
+@pytest.fixture
+def isolated_caches(tmp_path, monkeypatch):
+    """进程级缓存与缓存目录改为测试专用的临时对象，测试之间互不影响，也不写入仓库目录"""
+    import analysis
+    import indexing
+    import predict
+    import storage
+    import visualization
+
+    monkeypatch.setattr(storage, 'SIDECAR_DIR', str(tmp_path / 'sidecar'))
+    monkeypatch.setattr(storage, 'STREAM_DIR', str(tmp_path / 'stream'))
+    monkeypatch.setattr(storage, 'dataset_cache', storage.DatasetCache())
+    monkeypatch.setattr(analysis, 'model_cache', analysis.ModelCache(directory=str(tmp_path / 'model')))
+    monkeypatch.setattr(analysis, '_last_fits', {})
+    monkeypatch.setattr(visualization, 'chart_cache', visualization.ChartCache(directory=str(tmp_path / 'chart')))
+    monkeypatch.setattr(predict, 'forecast_cache', predict.ForecastCache(directory=str(tmp_path / 'forecast')))
+    monkeypatch.setattr(indexing, 'COMMENT_INDEX_DIR', str(tmp_path / 'comment_index'))
+    monkeypatch.setattr(indexing, '_indexes', indexing.OrderedDict())
+    return tmp_path
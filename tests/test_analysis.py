@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from analysis import analysis_function
+
+
+def test_analysis_does_not_modify_the_input_frame(isolated_caches):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        '电影名': [f'电影{i}' for i in range(40)],
+        '评分': rng.uniform(8, 9.7, 40),
+        '评分人数': rng.uniform(1e4, 2e6, 40),  # 浮点列：to_numpy 可能返回视图，取对数不能写回原数据
+        '年份': rng.integers(1950, 2020, 40).astype(float),
+    })
+    before = df.copy()
+
+    result = analysis_function(df, n_clusters=3)
+
+    pd.testing.assert_frame_equal(df, before)
+    assert 'cluster' in result['clustered_data'].columns
+    assert 'cluster' not in df.columns
@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cleaning import _clean_data2_rowwise, clean_data2, clean_data3
+from conftest import ROOT
+
+
+def test_clean_data3_keeps_chinese_text_and_drops_punctuation():
+    data = pd.DataFrame({'comment': ['好看！', '剧情，精彩', '……', None]})
+
+    cleaned = clean_data3(data)
+
+    assert cleaned.index.tolist() == [0, 1]
+    assert cleaned['cleaned_comment'].tolist() == ['好看', '剧情 精彩']
+
+
+@pytest.mark.parametrize('country', ['British', 'Chinese', 'French', 'German', 'Japanese'])
+def test_clean_data2_matches_the_rowwise_version(country):
+    data = pd.read_excel(os.path.join(ROOT, f'{country} Box Office Weekends For 2024 - Box Office Mojo.xlsx'))
+
+    pd.testing.assert_frame_equal(clean_data2(data), _clean_data2_rowwise(data))
@@ -0,0 +1,75 @@
+import pandas as pd
+
+import indexing
+from indexing import term_index_for
+
+
+def _comments(texts, ratings=None):
+    data = {'comment': texts}
+    if ratings is not None:
+        data['rating'] = ratings
+    return pd.DataFrame(data)
+
+
+def test_identical_comments_are_each_counted(isolated_caches):
+    index, absorbed = term_index_for('电影', _comments(['好看', '好看', '剧情精彩']))
+
+    assert absorbed == 3
+    assert index.n_comments == 3
+    assert index.totals['好看'] == 2
+
+
+def test_same_data_reuses_index_without_recounting(isolated_caches):
+    data = _comments(['好看', '剧情精彩'])
+    first, _ = term_index_for('电影', data)
+
+    second, absorbed = term_index_for('电影', data.copy())
+
+    assert absorbed == 0
+    assert second is first
+    assert second.totals['好看'] == 1
+
+
+def test_appended_rows_are_absorbed_without_touching_the_old_index(isolated_caches):
+    old, _ = term_index_for('电影', _comments(['好看', '剧情精彩']))
+
+    new, absorbed = term_index_for('电影', _comments(['好看', '剧情精彩', '好看']))
+
+    assert absorbed == 1
+    assert new.totals['好看'] == 2
+    assert old.totals['好看'] == 1
+    assert new.key != old.key
+
+
+def test_changed_or_removed_rows_rebuild_the_index(isolated_caches):
+    term_index_for('电影', _comments(['好看', '剧情精彩', '配乐动人']))
+
+    index, absorbed = term_index_for('电影', _comments(['好看', '演技出色']))
+
+    assert absorbed == 2
+    assert index.n_comments == 2
+    assert '剧情' not in index.totals
+    assert '配乐' not in index.totals
+    assert index.totals['演技'] == 1
+
+
+def test_sources_with_the_same_movie_name_are_isolated(isolated_caches):
+    first, _ = term_index_for('电影', _comments(['好看'], ratings=[5]))
+    second, _ = term_index_for('电影', _comments(['难看'], ratings=[1]))
+
+    assert first.key != second.key
+    assert '难看' not in first.totals
+    assert '好看' not in second.totals
+    assert list(second.by_rating) == [1]
+
+
+def test_index_is_reloaded_from_disk_by_key(isolated_caches):
+    data = _comments(['好看', '好看'])
+    index, _ = term_index_for('电影', data)
+    indexing._indexes.clear()
+
+    reloaded, absorbed = term_index_for('电影', data)
+
+    assert absorbed == 0
+    assert reloaded is not index
+    assert reloaded.totals == index.totals
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from conftest import CHINESE_WEEKENDS_FILE, COMMENTS_FILE, TOP250_FILE
+import storage
+from jobs import JobQueue, _job_comments, _job_k_sweep
+from storage import DataManager
+from workspace import Workspace
+
+
+def _wait(queue, job_id, timeout=60):
+    """轮询作业状态直到结束"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job.finished:
+            return job
+        time.sleep(0.1)
+    pytest.fail(f'job {job_id} did not finish within {timeout}s')
+
+
+def test_analyze_job_merges_into_new_workspace(isolated_caches):
+    queue = JobQueue(max_workers=1)
+    workspace = Workspace('w' * 24)
+    job = queue.submit('analyze', {'file_path': TOP250_FILE, 'backend': 'matplotlib'}, workspace=workspace)
+
+    job = _wait(queue, job.id)
+
+    assert job.status == 'done', job.error
+    assert not workspace.pinned  # 结果合并后不再阻止回收
+    with workspace.read() as manager:
+        assert manager.analysis_data is not None
+        assert 'cluster' in manager.analysis_data['clustered_data'].columns
+        assert manager.get_visual1_1('3d_scatter') is not None
+
+
+def test_merge_replaces_result_objects_instead_of_updating_them():
+    target = DataManager()
+    old_result = {'model': 'old', 'stale': True}
+    target.analysis_data = old_result
+    target.prediction_data['日本'] = {'Releases': [1.0]}
+
+    source = DataManager()
+    source.analysis_data = {'model': 'new'}
+    source.prediction_data['中国'] = {'Releases': [2.0]}
+    target.merge(source)
+
+    assert target.analysis_data == {'model': 'new'}
+    assert old_result == {'model': 'old', 'stale': True}  # 可能被缓存共享的旧结果未被修改
+    assert set(target.prediction_data) == {'日本', '中国'}
+
+
+def test_failed_merge_marks_job_failed_and_keeps_queue_alive(isolated_caches, monkeypatch):
+    queue = JobQueue(max_workers=1)
+    workspace = Workspace('f' * 24)
+    with monkeypatch.context() as m:
+        m.setattr(DataManager, 'merge', lambda self, other: 1 / 0)
+        job = _wait(queue, queue.submit('analyze', {'file_path': TOP250_FILE, 'backend': 'matplotlib'},
+                                        workspace=workspace).id)
+    assert job.status == 'failed'
+    assert 'ZeroDivisionError' in job.error
+    assert not workspace.pinned
+
+    second = _wait(queue, queue.submit('analyze', {'file_path': TOP250_FILE, 'backend': 'json'},
+                                       workspace=workspace).id)
+    assert second.status == 'done', second.error
+
+
+def test_k_sweep_job_fits_serially_inside_the_job_worker(isolated_caches, monkeypatch):
+    calls = []
+    sweep_k = storage.sweep_k
+
+    def recording_sweep_k(*args, **kwargs):
+        calls.append(kwargs.get('max_workers'))
+        return sweep_k(*args, **kwargs)
+
+    monkeypatch.setattr(storage, 'sweep_k', recording_sweep_k)
+    manager, result = _job_k_sweep(TOP250_FILE, k_min=2, k_max=3, backend='json')
+
+    assert calls == [1]
+    assert result['best_k'] in (2, 3)
+
+
+def test_streaming_comments_job_matches_the_in_memory_job(isolated_caches):
+    _, loaded = _job_comments('霸王别姬', COMMENTS_FILE)
+    manager, streamed = _job_comments('霸王别姬', COMMENTS_FILE, stream=True)
+
+    assert streamed['success']
+    assert streamed['top_terms'] == loaded['top_terms']
+    assert streamed['rating_breakdown'] == loaded['rating_breakdown']
+    assert '霸王别姬' not in manager.data_comments  # 不保留完整评论
+
+
+def test_predict_batch_job_merges_predictions_without_holding_the_workspace(isolated_caches):
+    queue = JobQueue(max_workers=1)
+    workspace = Workspace('b' * 24)
+    job = queue.submit('predict_batch', {'files': {'中国': CHINESE_WEEKENDS_FILE}}, workspace=workspace)
+
+    with workspace.write():
+        pass  # 拟合在作业进程中进行，提交后工作区不被占用
+    job = _wait(queue, job.id)
+
+    assert job.status == 'done', job.error
+    assert job.result['errors'] == {}
+    with workspace.read() as manager:
+        assert manager.prediction_data['中国'] == job.result['predictions']['中国']
+
+
+def test_pipeline_job_reports_stages_to_the_workspace(isolated_caches):
+    queue = JobQueue(max_workers=1)
+    workspace = Workspace('p' * 24)
+    params = {'target': 'top250', 'file_path': TOP250_FILE, 'backend': 'json'}
+
+    job = _wait(queue, queue.submit('pipeline', params, workspace=workspace).id)
+
+    assert job.status == 'done', job.error
+    assert {row['stage'] for row in job.result['stages']} >= {'top250/load', 'top250/analyze'}
+    with workspace.read() as manager:
+        assert manager.analysis_data is not None
+        assert manager.explain_pipeline() == job.result['stages']
+        assert not manager.pipeline._memo  # 记忆输出不随结果传回主进程
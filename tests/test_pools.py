@@ -0,0 +1,37 @@
+import os
+
+import pools
+
+
+def test_executors_of_different_sizes_do_not_cancel_each_other(monkeypatch):
+    monkeypatch.setattr(pools, '_executors', {})
+    small = pools.get_executor(1)
+    try:
+        future = small.submit(pow, 2, 10)
+        large = pools.get_executor(2)
+
+        assert future.result(timeout=60) == 1024
+        assert pools.get_executor(1) is small
+        assert large is not small
+    finally:
+        for executor in pools._executors.values():
+            executor.shutdown()
+
+
+def test_storage_and_rendering_share_one_pool_family():
+    import storage
+    import visualization
+
+    assert storage.get_executor is visualization.get_executor is pools.get_executor
+
+
+def test_prune_files_keeps_the_newest_files_with_the_suffix(tmp_path):
+    for i, name in enumerate(['a.pkl', 'b.pkl', 'c.pkl', 'other.txt']):
+        path = tmp_path / name
+        path.write_bytes(b'x')
+        os.utime(path, (i, i))
+
+    pools.prune_files(str(tmp_path), '.pkl', 2)
+
+    assert sorted(os.listdir(tmp_path)) == ['b.pkl', 'c.pkl', 'other.txt']
+    pools.prune_files(str(tmp_path / 'missing'), '.pkl', 2)  # 目录不存在时忽略
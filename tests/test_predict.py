@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+import pytest
+
+import predict
+
+
+class _SlowModel:
+    def fit(self, **kwargs):
+        time.sleep(0.3)
+        raise RuntimeError('not reached within the time limit')
+
+
+def test_auto_order_search_respects_timeout(monkeypatch):
+    monkeypatch.setattr(predict, '_sarimax', lambda values, order: _SlowModel())
+    monkeypatch.setattr(predict, '_order_cache', predict.OrderedDict())
+    values = np.arange(30, dtype=float)
+    grid = {'p': [0, 1], 'd': [0, 1], 'q': [0, 1]}
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        predict._auto_fit_task(values, grid, 'aic', timeout=0.1)
+    assert time.monotonic() - start < 1.0  # 第一个候选超时后立即中止，不再拟合其余7个候选
+
+
+def test_failed_candidate_scores_inf(monkeypatch):
+    class _Broken:
+        def fit(self, **kwargs):
+            raise np.linalg.LinAlgError('singular')
+
+    monkeypatch.setattr(predict, '_sarimax', lambda values, order: _Broken())
+    assert predict._score_order(np.arange(10.0), (1, 0, 0), 'aic') == float('inf')
+
+
+def test_forecast_cache_is_shared_through_disk(tmp_path):
+    values = np.sin(np.arange(60) / 4) * 10 + np.arange(60)
+    key = ('中国', 'Releases', (1, 1, 0))
+    writer = predict.ForecastCache(directory=str(tmp_path))
+    results = predict._fit_model(values, key[2])
+    writer.put(key, values, results)
+
+    reader = predict.ForecastCache(directory=str(tmp_path))  # 另一个进程中的缓存
+    cached = reader.get(key, values)
+
+    assert cached is not None and reader.hits == 1
+    np.testing.assert_allclose(cached.params, results.params)
+    appended = reader.get(key, np.append(values, values[-1] + 1))
+    assert appended is not None and reader.appends == 1
+
+
+def test_order_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(predict, '_order_cache', predict.OrderedDict())
+    monkeypatch.setattr(predict, 'ORDER_CACHE_MAX_ENTRIES', 2)
+    for i in range(3):
+        predict._store_order(np.arange(10, dtype=float) + i, None, 'aic', (i, 0, 0))
+
+    assert len(predict._order_cache) == 2
+    assert predict._cached_order(np.arange(10, dtype=float), None, 'aic') is None
+    assert predict._cached_order(np.arange(10, dtype=float) + 2, None, 'aic') == (2, 0, 0)
@@ -0,0 +1,33 @@
+from conftest import CHINESE_WEEKENDS_FILE, TOP250_FILE
+from predict import batch_prediction
+from profiling import collect, metrics
+from storage import DataManager
+
+
+def test_render_records_from_pool_workers_reach_the_caller(isolated_caches):
+    manager = DataManager()
+    manager.load_data1(TOP250_FILE)
+    manager.clean_data1()
+    manager.analyze_data()
+
+    with collect() as records:
+        manager.visual1(backend='json', max_workers=2)
+
+    stages = {record.stage for record in records}
+    assert {'visualization.render.pca_plot', 'visualization.render.box_plot'} <= stages
+
+
+def test_prediction_records_from_pool_workers_reach_the_caller(isolated_caches):
+    manager = DataManager()
+    manager.load_data2('中国', CHINESE_WEEKENDS_FILE)
+    manager.clean_data2('中国')
+    cleaned = manager.cleaned_data_country['中国']
+    metrics.clear()
+
+    with collect() as records:
+        results, errors = batch_prediction({'中国': cleaned, '中国2': cleaned}, metrics=['Releases'], max_workers=2)
+
+    assert not errors
+    fits = [record for record in records if record.stage == 'predict.fit']
+    assert len(fits) == 2
+    assert 'stage="predict.fit"} 2' in metrics.render()  # 同时计入主进程的全局指标
@@ -0,0 +1,136 @@
+import os
+
+import pandas as pd
+
+import storage
+
+
+def _double(df, factor=2):
+    return df * factor
+
+
+def _total(df):
+    return int(df.to_numpy().sum())
+
+
+def _csv(tmp_path, values):
+    path = tmp_path / 'values.csv'
+    pd.DataFrame({'value': values}).to_csv(path, index=False)
+    return str(path)
+
+
+def _statuses(pipeline):
+    return {row['stage']: row['status'] for row in pipeline.explain()}
+
+
+def test_pipeline_reuses_stages_whose_keys_did_not_change(isolated_caches):
+    pipeline = storage.Pipeline()
+    pipeline.source('load', _csv(isolated_caches, [1, 2, 3]))
+    pipeline.stage('double', _double, deps=['load'], factor=2)
+    pipeline.stage('total', _total, deps=['double'])
+
+    assert pipeline.run(max_workers=1)['total'] == 12
+    assert pipeline.run(max_workers=1)['total'] == 12
+    assert set(_statuses(pipeline).values()) == {'hit'}
+
+    pipeline.stage('double', _double, deps=['load'], factor=3)
+    assert pipeline.run(max_workers=1)['total'] == 18
+    assert _statuses(pipeline) == {'load': 'hit', 'double': 'run', 'total': 'run'}
+
+
+def test_pipeline_reruns_downstream_when_the_source_file_changes(isolated_caches):
+    pipeline = storage.Pipeline()
+    path = _csv(isolated_caches, [1, 2, 3])
+    pipeline.source('load', path)
+    pipeline.stage('total', _total, deps=['load'])
+    pipeline.run(max_workers=1)
+
+    _csv(isolated_caches, [1, 2, 3, 4])
+    assert pipeline.run(max_workers=1)['total'] == 10
+    assert _statuses(pipeline) == {'load': 'run', 'total': 'run'}
+
+
+def test_pipeline_memo_is_bounded(isolated_caches):
+    pipeline = storage.Pipeline(max_entries=2)
+    pipeline.source('load', _csv(isolated_caches, [1, 2, 3]))
+    pipeline.stage('double', _double, deps=['load'])
+    pipeline.stage('total', _total, deps=['double'])
+    pipeline.run(max_workers=1)
+
+    assert list(pipeline._memo) == ['double', 'total']  # 最久未使用的源阶段输出被淘汰
+    assert pipeline.run(max_workers=1)['total'] == 12
+    assert len(pipeline._memo) == 2
+
+
+def _refuse_to_clean(*args, **kwargs):
+    raise AssertionError('clean_data3 should not run when the cleaned store exists')
+
+
+def test_stream_comments_reuses_the_cleaned_store(isolated_caches, monkeypatch):
+    import indexing
+
+    path = isolated_caches / 'comments.csv'
+    pd.DataFrame({'comment': ['好看', '好看', '剧情精彩'], 'rating': [5, 5, 4]}).to_csv(path, index=False)
+    manager = storage.DataManager()
+    store_path = manager.stream_data3('电影', str(path), chunk_rows=2)
+    first = manager.comment_index['电影']
+    assert first.totals['好看'] == 2
+
+    monkeypatch.setattr(storage, 'clean_data3', _refuse_to_clean)
+    assert manager.stream_data3('电影', str(path)) == store_path
+    assert manager.comment_index['电影'] is first
+
+    # 索引丢失时从列式存储重建，同样不再清洗
+    indexing._indexes.clear()
+    for name in os.listdir(indexing.COMMENT_INDEX_DIR):
+        os.remove(os.path.join(indexing.COMMENT_INDEX_DIR, name))
+    manager.stream_data3('电影', str(path))
+    rebuilt = manager.comment_index['电影']
+    assert rebuilt is not first
+    assert rebuilt.totals == first.totals
+    assert rebuilt.by_rating == first.by_rating
+
+
+def test_dataset_cache_keys_on_content_not_just_mtime(isolated_caches):
+    cache = storage.dataset_cache
+    path = _csv(isolated_caches, [1, 2, 3])
+    first = cache.get(path)
+
+    assert cache.get(path) is first
+    os.utime(path, ns=(1, 1))  # 只有mtime变化：按内容哈希继续复用
+    assert cache.get(path) is first
+    copy = isolated_caches / 'copy.csv'
+    copy.write_bytes(open(path, 'rb').read())
+    assert cache.get(str(copy)) is first  # 内容相同的另一文件共用一份数据
+
+    _csv(isolated_caches, [1, 2, 3, 4])
+    changed = cache.get(path)
+    assert changed is not first
+    assert changed['value'].tolist() == [1, 2, 3, 4]
+
+
+def _mixed_xlsx(tmp_path):
+    path = tmp_path / 'mixed.xlsx'
+    pd.DataFrame({'字段1': ['好看', 5, None]}).to_excel(path, index=False)
+    return str(path)
+
+
+def test_raw_dtypes_are_kept_when_no_sidecar_is_written(isolated_caches, monkeypatch):
+    monkeypatch.setattr(storage, '_feather', lambda: None)
+
+    df = storage.dataset_cache.get(_mixed_xlsx(isolated_caches))
+
+    assert df['字段1'].tolist()[:2] == ['好看', 5]
+    assert not os.path.exists(storage.SIDECAR_DIR)
+
+
+def test_sidecar_load_matches_the_first_parse(isolated_caches):
+    path = _mixed_xlsx(isolated_caches)
+    first = storage.dataset_cache.get(path)
+
+    digest = storage._file_digest(path)
+    assert os.path.exists(storage._sidecar_path(digest))
+    reread = storage._load_file(path, digest)  # 从列式缓存读出
+
+    assert first['字段1'].tolist()[:2] == ['好看', '5']
+    pd.testing.assert_frame_equal(reread, first, check_dtype=False)
@@ -0,0 +1,26 @@
+from workspace import WorkspaceStore
+
+
+def test_unknown_workspace_ids_are_replaced_with_issued_ones():
+    store = WorkspaceStore()
+    forged = 'a' * 24
+
+    workspace = store.get(forged)
+
+    assert workspace.id != forged
+    assert store.get(workspace.id) is workspace
+    assert store.get('bad id') is not workspace
+    assert len(store) == 2
+
+
+def test_pinned_workspaces_are_not_evicted():
+    store = WorkspaceStore(max_entries=1, idle_timeout=0)
+    pinned = store.get()
+    pinned.pin()
+
+    other = store.get()
+
+    assert store.get(pinned.id) is pinned
+    pinned.unpin()
+    store.get(other.id)
+    assert store.get(pinned.id) is not pinned  # 解除固定后按LRU淘汰
@@ -1,18 +1,195 @@
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import base64
-import io
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
-from sklearn.decomposition import PCA
+import pandas as pd
+
+from cleaning import term_frequencies
+from indexing import TermIndex
+from pools import get_executor, prune_files, reset_executor
+from profiling import collected_result, count_rows, run_collected, stage
+
+CHART_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.chart_cache')  # 图表磁盘缓存目录
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 图表内存缓存上限(字节)
+CHART_CACHE_MAX_FILES = 1024  # 图表磁盘缓存文件个数上限
+WORDCLOUD_FONT_PATH = os.environ.get('WORDCLOUD_FONT_PATH')  # 词云使用的中文字体文件，未设置时使用WordCloud默认字体
+CHART_BACKENDS = ('plotly', 'matplotlib', 'json')  # 三维散点图、平行坐标图、雷达图可选的渲染后端
+PCA_PLOT_MAX_POINTS = 20000  # PCA降维图最多绘制的点数，超过时等间隔抽样
+
+
+def _update_fingerprint(h, value):
+    """将渲染输入逐项写入哈希，DataFrame/ndarray按内容哈希，词频索引使用其自身的指纹"""
+    if isinstance(value, TermIndex):
+        h.update(value.fingerprint.encode('ascii'))
+    elif isinstance(value, pd.DataFrame):
+        h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(repr((value.name, str(value.dtype))).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.shape, str(value.dtype))).encode('utf-8'))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(repr(k).encode('utf-8'))
+            _update_fingerprint(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(f'{type(value).__name__}:{len(value)}'.encode('utf-8'))
+        for item in value:
+            _update_fingerprint(h, item)
+    else:
+        h.update(repr(value).encode('utf-8'))
+
+
+class ChartArtifact:
+    """
+    图表产物：保存原始字节，不预先做base64编码
+    - open(): 以内存缓冲区形式读取，供 send_file 直接发送
+    - to_base64()/to_data_uri(): 仅在需要内嵌data URI时按需编码
+    """
+    __slots__ = ('data', 'mimetype', 'etag')
+
+    def __init__(self, data, mimetype='image/png', etag=None):
+        self.data = data  # bytes
+        self.mimetype = mimetype
+        self.etag = etag
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'ChartArtifact(mimetype={self.mimetype!r}, size={len(self.data)}, etag={self.etag!r})'
+
+    def view(self):
+        """返回只读的memoryview，不复制数据"""
+        return memoryview(self.data)
+
+    def open(self):
+        """返回指向原始字节的BytesIO(与bytes共享内存，不复制)"""
+        return BytesIO(self.data)
+
+    def to_base64(self):
+        return base64.b64encode(self.data).decode('ascii')
+
+    def to_data_uri(self):
+        return f'data:{self.mimetype};base64,{self.to_base64()}'
+
+
+def chart_fingerprint(chart_type, inputs):
+    """
+    计算图表缓存key(同时用作HTTP ETag)
+    :param chart_type: 图表类型
+    :param inputs: 渲染函数的全部输入(数据与渲染参数)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(chart_type.encode('utf-8'))
+    _update_fingerprint(h, inputs)
+    return h.hexdigest()
+
+
+class ChartCache:
+    """
+    渲染后的图表字节缓存(PNG或Plotly JSON)
+    - 内存层：按LRU淘汰，总大小不超过 max_bytes
+    - 磁盘层：CHART_CACHE_DIR 下以key命名的文件，进程重启后仍可复用
+    """
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_BYTES, max_files=CHART_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._memory = OrderedDict()  # key -> 图表字节
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.chart')
+
+    def get(self, key):
+        """获取缓存的图表字节，未命中时返回None"""
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                return png
+        try:
+            with open(self._path(key), 'rb') as f:
+                png = f.read()
+        except OSError:
+            return None
+        self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        """写入内存层与磁盘层，磁盘写入失败时只保留内存层"""
+        self._remember(key, png)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        prune_files(self.directory, '.chart', self.max_files)
+
+    def _remember(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = png
+            self._memory_bytes += len(png)
+            while self._memory_bytes > self.max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+
+chart_cache = ChartCache()  # 进程内共享的图表缓存
+
+
+def _analysis_result(data_manager):
+    result = data_manager.export_analysis_result_top250(copy=False)
+    if result is None:
+        raise ValueError("No analysis result available. Please analyze data first.")
+    return result
+
+
+def _figure_to_png(fig, **savefig_kwargs):
+    """用Agg画布将matplotlib Figure渲染为PNG字节，不经过pyplot全局状态"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FigureCanvasAgg(fig)
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def _export_plotly(fig, backend):
+    """plotly后端经Kaleido导出PNG；json后端导出Plotly JSON，由浏览器端渲染"""
+    if backend == 'json':
+        return fig.to_json().encode('utf-8')
+    return fig.to_image(format="png")
 
-def visual1_1(data_manager):
-    """生成三维散点图"""
-    df = data_manager.export_analysis_result_top250()['clustered_data']
 
+def _check_backend(backend):
+    if backend not in CHART_BACKENDS:
+        raise ValueError(f"Unsupported chart backend: {backend}. Supported backends are {', '.join(CHART_BACKENDS)}")
+
+
+def _render_3d_scatter(df, backend='plotly'):
+    if backend == 'matplotlib':
+        return _mpl_3d_scatter(df)
+    import plotly.express as px
     fig = px.scatter_3d(
         df,
         x='评分',
@@ -24,18 +201,27 @@ def visual1_1(data_manager):
         opacity=0.7,
         color_continuous_scale=px.colors.sequential.Viridis
     )
-
-    # 转换为base64存储
-    img_bytes = fig.to_image(format="png")
-    img_str = base64.b64encode(img_bytes).decode('utf-8')
-    data_manager.store_visual1_1('3d_scatter', img_str)
-    return img_str
-
-
-def visual1_2(data_manager):
-    """生成平行坐标图"""
-    df = data_manager.export_analysis_result_top250()['clustered_data']
-
+    return _export_plotly(fig, backend)
+
+
+def _mpl_3d_scatter(df):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 8))
+    ax = fig.add_subplot(projection='3d')
+    scatter = ax.scatter(df['评分'], df['评分人数'], df['年份'],
+                         c=df['cluster'], cmap='viridis', alpha=0.7)
+    ax.set_xlabel('评分')
+    ax.set_ylabel('评分人数')
+    ax.set_zlabel('年份')
+    ax.set_title('豆瓣TOP250三维聚类分布')
+    fig.colorbar(scatter, ax=ax, label='cluster', shrink=0.6)
+    return _figure_to_png(fig, dpi=100, bbox_inches='tight')
+
+
+def _render_parallel_coords(df, backend='plotly'):
+    if backend == 'matplotlib':
+        return _mpl_parallel_coords(df)
+    import plotly.express as px
     fig = px.parallel_coordinates(
         df,
         color='cluster',
@@ -43,17 +229,46 @@ def visual1_2(data_manager):
         title='豆瓣TOP250平行坐标图',
         color_continuous_scale=px.colors.sequential.Viridis
     )
-
-    img_bytes = fig.to_image(format="png")
-    img_str = base64.b64encode(img_bytes).decode('utf-8')
-    data_manager.store_visual1_2('parallel_coords', img_str)
-    return img_str
-
-
-def visual1_3(data_manager):
-    """生成雷达图"""
-    cluster_centers = data_manager.export_analysis_result_top250()['cluster_centers']
-
+    return _export_plotly(fig, backend)
+
+
+def _mpl_parallel_coords(df):
+    dimensions = ['评分', '评分人数', '年份']
+    values = df[dimensions].to_numpy(dtype=float)
+    low = values.min(axis=0)
+    high = values.max(axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    normalized = (values - low) / span  # 各坐标轴独立缩放到[0, 1]
+
+    x = np.arange(len(dimensions))
+    segments = np.stack([np.broadcast_to(x, normalized.shape), normalized], axis=-1)
+
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    lines = LineCollection(segments, cmap='viridis', alpha=0.5, linewidths=1)
+    lines.set_array(df['cluster'].to_numpy(dtype=float))
+    ax.add_collection(lines)
+    fig.colorbar(lines, ax=ax, label='cluster')
+
+    ax.set_xlim(x[0], x[-1])
+    ax.set_ylim(0, 1)
+    ax.set_xticks(x)
+    ax.set_xticklabels(dimensions)
+    ax.set_yticks([])
+    for i in x:
+        ax.axvline(i, color='black', linewidth=1)
+        ax.text(i, -0.04, f'{low[i]:g}', ha='center', va='top', fontsize=8)
+        ax.text(i, 1.02, f'{high[i]:g}', ha='center', va='bottom', fontsize=8)
+    ax.set_title('豆瓣TOP250平行坐标图', pad=20)
+    return _figure_to_png(fig, dpi=100, bbox_inches='tight')
+
+
+def _render_radar_chart(cluster_centers, backend='plotly'):
+    if backend == 'matplotlib':
+        return _mpl_radar_chart(cluster_centers)
+    import plotly.graph_objects as go
     features = ['评分', '评分人数', '年份']
     fig = go.Figure()
 
@@ -69,79 +284,64 @@ def visual1_3(data_manager):
         polar=dict(radialaxis=dict(visible=True)),
         title='聚类中心雷达图'
     )
+    return _export_plotly(fig, backend)
 
-    img_bytes = fig.to_image(format="png")
-    img_str = base64.b64encode(img_bytes).decode('utf-8')
-    data_manager.store_visual1_3('radar_chart', img_str)
-    return img_str
-
-
-def visual1_4(data_manager):
-    """生成PCA降维图"""
-    result = data_manager.export_analysis_result_top250()
-    scaled_data = result['model']._fit_X
 
-    pca = PCA(n_components=2)
-    pca_result = pca.fit_transform(scaled_data)
+def _mpl_radar_chart(cluster_centers):
+    features = ['评分', '评分人数', '年份']
+    angles = np.linspace(0, 2 * np.pi, len(features), endpoint=False)
+    closed_angles = np.append(angles, angles[0])
 
-    plt.figure(figsize=(10, 6))
-    scatter = plt.scatter(
-        pca_result[:, 0],
-        pca_result[:, 1],
-        c=result['clustered_data']['cluster'],
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(7, 7))
+    ax = fig.add_subplot(projection='polar')
+    for i in range(cluster_centers.shape[0]):
+        r = np.append(cluster_centers[i], cluster_centers[i][0])
+        ax.plot(closed_angles, r, linewidth=1.5, label=f'Cluster {i}')
+        ax.fill(closed_angles, r, alpha=0.25)
+    ax.set_xticks(angles)
+    ax.set_xticklabels(features)
+    ax.set_title('聚类中心雷达图', pad=20)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.25, 1.1))
+    return _figure_to_png(fig, dpi=100, bbox_inches='tight')
+
+
+def _render_pca_plot(coords, clusters, explained_variance):
+    # 坐标与解释方差由 analysis_function 预先计算，渲染时不做矩阵运算
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    scatter = ax.scatter(
+        coords[:, 0],
+        coords[:, 1],
+        c=clusters,
         cmap='viridis',
         alpha=0.6
     )
-    plt.colorbar(scatter)
-    plt.title('PCA降维可视化 (解释方差: {:.2f})'.format(pca.explained_variance_ratio_.sum()))
-
-    # 保存为base64
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    plt.close()
-    img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    data_manager.store_visual1_4('pca_plot', img_str)
-    return img_str
-
+    fig.colorbar(scatter, ax=ax)
+    ax.set_title('PCA降维可视化 (解释方差: {:.2f})'.format(explained_variance))
+    return _figure_to_png(fig, dpi=100, bbox_inches='tight')
 
-def visual1_5(data_manager):
-    """生成箱线图"""
-    df = data_manager.export_analysis_result_top250()['clustered_data']
 
-    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+def _render_box_plot(df):
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(15, 5))
+    axes = fig.subplots(1, 3)
 
     for i, col in enumerate(['评分', '评分人数', '年份']):
         sns.boxplot(x='cluster', y=col, data=df, ax=axes[i])
         axes[i].set_title(f'各簇的{col}分布')
 
-    plt.tight_layout()
-
-    # 保存为base64
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    plt.close()
-    img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    data_manager.store_visual1_5('box_plot', img_str)
-    return img_str
-def visual2(data_manager, country_name, historical_points=10):
-    """
-    生成特定国家电影票房历史数据与预测数据的对比折线图
-    使用同色系颜色区分历史/预测数据，并用实线/虚线加强区分
-
-    参数:
-        data_manager: DataManager实例
-        country_name: 国家名称(如"中国")
-        historical_points: 显示的历史数据点数(默认10)
-    """
-    # 获取数据
-    cleaned_data = data_manager.export_cleaned_data_country(country_name)
-    predicted_data = data_manager.export_prediction_result_country(country_name)
+    fig.tight_layout()
+    return _figure_to_png(fig, dpi=100, bbox_inches='tight')
 
-    if cleaned_data is None or predicted_data is None:
-        raise ValueError(f"找不到国家 {country_name} 的数据")
 
+def _render_prediction_comparison(cleaned_data, predicted_data, country_name, historical_points):
     # 创建画布
-    plt.figure(figsize=(14, 7))
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(14, 7))
+    ax = fig.add_subplot()
 
     # 时间轴处理
     if 'Year' in cleaned_data.columns:
@@ -163,54 +363,360 @@ def visual2(data_manager, country_name, historical_points=10):
 
     # 绘制三条指标线
     for metric in ['Top_10_Gross', 'Overall_Gross', 'Releases']:
+        # 批量预测中失败的指标不绘制
+        if metric not in predicted_data:
+            continue
         # 获取对应颜色
         hist_color, pred_color = color_palette[metric]
 
         # 历史数据 (深色实线)
         hist_values = cleaned_data[metric].iloc[-historical_points:].values
-        plt.plot(historical_time, hist_values,
+        ax.plot(historical_time, hist_values,
                  color=hist_color, linestyle='-', linewidth=2.5,
                  marker='o', markersize=6, markerfacecolor=hist_color,
                  label=f'{metric} (历史)')
 
         # 预测数据 (浅色虚线)
         pred_values = predicted_data[metric][:10]  # 取前10个预测点
-        plt.plot(predicted_time, pred_values,
+        ax.plot(predicted_time, pred_values,
                  color=pred_color, linestyle='--', linewidth=2,
                  marker='o', markersize=6, markerfacecolor=pred_color,
                  label=f'{metric} (预测)')
 
         # 连接线 (半透明)
-        plt.plot([historical_time[-1], predicted_time[0]],
+        ax.plot([historical_time[-1], predicted_time[0]],
                  [hist_values[-1], pred_values[0]],
                  color=pred_color, linestyle='--', alpha=0.5)
 
     # 图表装饰
-    plt.title(f'{country_name}电影市场趋势预测', fontsize=16, pad=20)
-    plt.xlabel('年份' if 'Year' in cleaned_data.columns else '时间周期', fontsize=12)
-    plt.ylabel('数值', fontsize=12)
+    ax.set_title(f'{country_name}电影市场趋势预测', fontsize=16, pad=20)
+    ax.set_xlabel('年份' if 'Year' in cleaned_data.columns else '时间周期', fontsize=12)
+    ax.set_ylabel('数值', fontsize=12)
 
     # 优化图例
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
 
     # 网格和边框
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.gca().spines['top'].set_visible(False)
-    plt.gca().spines['right'].set_visible(False)
+    ax.grid(True, linestyle='--', alpha=0.3)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
 
     # 保存图像
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=120, bbox_inches='tight')
-    img_buffer.seek(0)
-    img_str = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-
-    # 存储并清理
-    data_manager.store_visual2('prediction_comparison', img_str)
-    plt.close()
+    return _figure_to_png(fig, dpi=120, bbox_inches='tight')
+
+
+def _render_wordcloud(source, width, height, background_color, max_words, colormap, font_path):
+    # 词频索引直接提供词频；清洗后的评论则分块统计词频，不拼接整个语料
+    frequencies = source.frequencies() if isinstance(source, TermIndex) else term_frequencies(source)
+    if not frequencies:
+        raise ValueError("No terms available for word cloud")
+
+    # 生成词云
+    from wordcloud import WordCloud
+    wc = WordCloud(
+        width=width,
+        height=height,
+        background_color=background_color,
+        max_words=max_words,
+        colormap=colormap,
+        font_path=font_path
+    ).generate_from_frequencies(frequencies)
+
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.imshow(wc, interpolation='bilinear')
+    ax.axis('off')
+
+    # 保存到内存缓冲区
+    return _figure_to_png(fig, bbox_inches='tight', pad_inches=0, dpi=100)
+
+
+# TOP250图表的渲染输入只依赖分析结果(analysis_function的返回值)
+def _inputs_3d_scatter(result, backend='plotly'):
+    _check_backend(backend)
+    return {'df': result['clustered_data'], 'backend': backend}
+
+
+def _inputs_parallel_coords(result, backend='plotly'):
+    _check_backend(backend)
+    return {'df': result['clustered_data'], 'backend': backend}
+
+
+def _inputs_radar_chart(result, backend='plotly'):
+    _check_backend(backend)
+    return {'cluster_centers': result['cluster_centers'], 'backend': backend}
+
+
+def _inputs_pca_plot(result):
+    coords = result['pca_coords'][:, :2]
+    clusters = result['clustered_data']['cluster'].to_numpy()
+    if len(coords) > PCA_PLOT_MAX_POINTS:
+        # 大数据量时等间隔抽样，渲染输入与指纹计算的开销不随总行数增长
+        rows = np.linspace(0, len(coords) - 1, PCA_PLOT_MAX_POINTS).astype(int)
+        coords, clusters = coords[rows], clusters[rows]
+    return {'coords': coords, 'clusters': clusters,
+            'explained_variance': float(result['pca'].explained_variance_ratio_[:2].sum())}
+
+
+def _inputs_box_plot(result):
+    return {'df': result['clustered_data']}
+
+
+def _from_analysis(collect):
+    """将基于分析结果的输入函数包装为从DataManager收集输入"""
+    def collect_from_manager(data_manager, **params):
+        return collect(_analysis_result(data_manager), **params)
+    return collect_from_manager
+
+
+def _inputs_prediction_comparison(data_manager, country_name, historical_points=10):
+    cleaned_data = data_manager.export_cleaned_data_country(country_name, copy=False)
+    predicted_data = data_manager.export_prediction_result_country(country_name, copy=False)
+    if cleaned_data is None or predicted_data is None:
+        raise ValueError(f"找不到国家 {country_name} 的数据")
+    return {
+        'cleaned_data': cleaned_data,
+        'predicted_data': predicted_data,
+        'country_name': country_name,
+        'historical_points': historical_points
+    }
+
+
+def _inputs_wordcloud(data_manager, movie_name, width=800, height=600,
+                      background_color='white', max_words=200, colormap='viridis',
+                      font_path=WORDCLOUD_FONT_PATH):
+    if movie_name in data_manager.comment_index:
+        source = data_manager.comment_index[movie_name]
+    elif movie_name in data_manager.cleaned_data_comments:
+        source = data_manager.cleaned_data_comments[movie_name]['cleaned_comment']
+    else:
+        raise ValueError(f"No cleaned comment data available for {movie_name}")
+    return {
+        'source': source,
+        'width': width,
+        'height': height,
+        'background_color': background_color,
+        'max_words': max_words,
+        'colormap': colormap,
+        'font_path': font_path
+    }
+
+
+# 图表类型 -> (从分析结果收集渲染输入的函数)
+TOP250_INPUTS = {
+    '3d_scatter': _inputs_3d_scatter,
+    'parallel_coords': _inputs_parallel_coords,
+    'radar_chart': _inputs_radar_chart,
+    'pca_plot': _inputs_pca_plot,
+    'box_plot': _inputs_box_plot,
+}
+
+# 图表类型 -> (从DataManager收集渲染输入的函数, 渲染函数)
+CHARTS = {
+    '3d_scatter': (_from_analysis(_inputs_3d_scatter), _render_3d_scatter),
+    'parallel_coords': (_from_analysis(_inputs_parallel_coords), _render_parallel_coords),
+    'radar_chart': (_from_analysis(_inputs_radar_chart), _render_radar_chart),
+    'pca_plot': (_from_analysis(_inputs_pca_plot), _render_pca_plot),
+    'box_plot': (_from_analysis(_inputs_box_plot), _render_box_plot),
+    'prediction_comparison': (_inputs_prediction_comparison, _render_prediction_comparison),
+    'wordcloud': (_inputs_wordcloud, _render_wordcloud),
+}
+
+
+def _chart_spec(chart_type):
+    if chart_type not in CHARTS:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+    return CHARTS[chart_type]
+
+
+def _chart_mimetype(inputs):
+    return 'application/json' if inputs.get('backend') == 'json' else 'image/png'
+
+
+def chart_etag(data_manager, chart_type, **params):
+    """
+    只根据输入数据与渲染参数计算图表ETag，不渲染
+    :param data_manager: DataManager实例
+    :param chart_type: 图表类型，见 CHARTS
+    :param params: 渲染参数(如 country_name, movie_name)
+    """
+    collect, _ = _chart_spec(chart_type)
+    return chart_fingerprint(chart_type, collect(data_manager, **params))
+
+
+def render_chart(data_manager, chart_type, **params):
+    """
+    获取图表，输入数据与渲染参数不变时直接复用缓存
+    :param data_manager: DataManager实例
+    :param chart_type: 图表类型，见 CHARTS
+    :param params: 渲染参数(如 country_name, movie_name, backend)
+    :return: ChartArtifact，etag为缓存key；json后端的mimetype为application/json
+    """
+    collect, _ = _chart_spec(chart_type)
+    return _render_inputs(chart_type, collect(data_manager, **params))
+
+
+def _render_inputs(chart_type, inputs):
+    """按渲染输入获取图表，命中图表缓存时不渲染"""
+    key = chart_fingerprint(chart_type, inputs)
+    data = chart_cache.get(key)
+    if data is None:
+        data = _render_task(chart_type, inputs)
+        chart_cache.put(key, data)
+    return ChartArtifact(data, _chart_mimetype(inputs), key)
+
+
+def render_analysis_chart(result, chart_type, **params):
+    """
+    直接根据分析结果获取TOP250图表，不需要DataManager(供流水线在工作进程中调用)
+    :param result: analysis_function 的返回值
+    :param chart_type: TOP250_CHARTS 中的图表类型
+    :param params: 渲染参数(如 backend)
+    :return: ChartArtifact
+    """
+    if chart_type not in TOP250_INPUTS:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+    return _render_inputs(chart_type, TOP250_INPUTS[chart_type](result, **params))
+
+
+def render_prediction_chart(cleaned_data, predicted_data, country_name, historical_points=10):
+    """
+    直接根据清洗后的数据与预测结果获取预测对比图，不需要DataManager
+    :return: ChartArtifact
+    """
+    return _render_inputs('prediction_comparison', {
+        'cleaned_data': cleaned_data,
+        'predicted_data': predicted_data,
+        'country_name': country_name,
+        'historical_points': historical_points
+    })
+
+
+TOP250_CHARTS = ['3d_scatter', 'parallel_coords', 'radar_chart', 'pca_plot', 'box_plot']  # 豆瓣TOP250分析看板的全部图表
+
+def _render_task(chart_type, inputs):
+    """单个图表渲染任务(也在渲染进程池中执行)，按图表类型记录渲染耗时"""
+    _, render = CHARTS[chart_type]
+    with stage(f'visualization.render.{chart_type}', rows=count_rows(inputs.get('df'))):
+        return render(**inputs)
+
+
+def render_dashboard(data_manager, backend='plotly', max_workers=None):
+    """
+    并行渲染同一分析结果的全部TOP250图表(visual1_1 ~ visual1_5)并存储到DataManager
+    已缓存的图表直接复用，其余图表在渲染进程池中并发渲染
+    :param data_manager: DataManager实例
+    :param backend: 三维散点图、平行坐标图、雷达图的渲染后端
+    :param max_workers: 渲染进程数，默认等于CPU核数，为1时在当前进程串行渲染
+    :return: dict, key: 图表类型, value: ChartArtifact
+    """
+    store = {
+        '3d_scatter': data_manager.store_visual1_1,
+        'parallel_coords': data_manager.store_visual1_2,
+        'radar_chart': data_manager.store_visual1_3,
+        'pca_plot': data_manager.store_visual1_4,
+        'box_plot': data_manager.store_visual1_5,
+    }
+    charts = {}
+    pending = {}  # key: 图表类型, value: (缓存key, 渲染输入)
+    for chart_type in TOP250_CHARTS:
+        collect, _ = CHARTS[chart_type]
+        params = {'backend': backend} if chart_type in ('3d_scatter', 'parallel_coords', 'radar_chart') else {}
+        inputs = collect(data_manager, **params)
+        key = chart_fingerprint(chart_type, inputs)
+        data = chart_cache.get(key)
+        if data is None:
+            pending[chart_type] = (key, inputs)
+        else:
+            charts[chart_type] = ChartArtifact(data, _chart_mimetype(inputs), key)
+
+    if pending and max_workers == 1:
+        for chart_type, (key, inputs) in pending.items():
+            data = _render_task(chart_type, inputs)
+            chart_cache.put(key, data)
+            charts[chart_type] = ChartArtifact(data, _chart_mimetype(inputs), key)
+    elif pending:
+        executor = get_executor(max_workers)
+        futures = {chart_type: executor.submit(run_collected, _render_task, chart_type, inputs)
+                   for chart_type, (_, inputs) in pending.items()}
+        try:
+            for chart_type, future in futures.items():
+                key, inputs = pending[chart_type]
+                data = collected_result(future)
+                chart_cache.put(key, data)
+                charts[chart_type] = ChartArtifact(data, _chart_mimetype(inputs), key)
+        except BrokenProcessPool:
+            reset_executor(executor)
+            raise
+
+    for chart_type in TOP250_CHARTS:
+        store[chart_type](chart_type, charts[chart_type])
+    return charts
+
+
+def visual1_1(data_manager, backend='plotly'):
+    """
+    生成三维散点图
+    :param backend: 渲染后端，plotly(Kaleido导出PNG)、matplotlib(Agg渲染PNG)或json(浏览器端渲染)
+    """
+    chart = render_chart(data_manager, '3d_scatter', backend=backend)
+    data_manager.store_visual1_1('3d_scatter', chart)
+    return chart
+
+
+def visual1_2(data_manager, backend='plotly'):
+    """
+    生成平行坐标图
+    :param backend: 渲染后端，plotly(Kaleido导出PNG)、matplotlib(Agg渲染PNG)或json(浏览器端渲染)
+    """
+    chart = render_chart(data_manager, 'parallel_coords', backend=backend)
+    data_manager.store_visual1_2('parallel_coords', chart)
+    return chart
+
+
+def visual1_3(data_manager, backend='plotly'):
+    """
+    生成雷达图
+    :param backend: 渲染后端，plotly(Kaleido导出PNG)、matplotlib(Agg渲染PNG)或json(浏览器端渲染)
+    """
+    chart = render_chart(data_manager, 'radar_chart', backend=backend)
+    data_manager.store_visual1_3('radar_chart', chart)
+    return chart
+
+
+def visual1_4(data_manager):
+    """生成PCA降维图"""
+    chart = render_chart(data_manager, 'pca_plot')
+    data_manager.store_visual1_4('pca_plot', chart)
+    return chart
+
+
+def visual1_5(data_manager):
+    """生成箱线图"""
+    chart = render_chart(data_manager, 'box_plot')
+    data_manager.store_visual1_5('box_plot', chart)
+    return chart
+def visual2(data_manager, country_name, historical_points=10):
+    """
+    生成特定国家电影票房历史数据与预测数据的对比折线图
+    使用同色系颜色区分历史/预测数据，并用实线/虚线加强区分
+
+    参数:
+        data_manager: DataManager实例
+        country_name: 国家名称(如"中国")
+        historical_points: 显示的历史数据点数(默认10)
+    """
+    chart = render_chart(data_manager, 'prediction_comparison',
+                         country_name=country_name, historical_points=historical_points)
+
+    # 存储
+    data_manager.store_visual2('prediction_comparison', chart)
+    return chart
 def visual3(data_manager, movie_name, width=800, height=600,
-            background_color='white', max_words=200, colormap='viridis'):
+            background_color='white', max_words=200, colormap='viridis', font_path=WORDCLOUD_FONT_PATH):
     """
-    根据已清洗的评论数据生成词云并存储到DataManager
+    根据已清洗(分词)的评论数据统计词频生成词云并存储到DataManager
     :param data_manager: DataManager实例
     :param movie_name: 电影名称
     :param width: 词云宽度
@@ -218,44 +724,18 @@ def visual3(data_manager, movie_name, width=800, height=600,
     :param background_color: 背景颜色
     :param max_words: 最大显示词数
     :param colormap: 颜色映射
+    :param font_path: 支持中文的字体文件路径
     :return: 是否生成成功
     """
     try:
-        # 检查数据是否存在
-        if movie_name not in data_manager.cleaned_data_comments:
-            raise ValueError(f"No cleaned comment data available for {movie_name}")
-
-        # 获取清洗后的评论数据
-        df = data_manager.cleaned_data_comments[movie_name]
-
-        # 合并所有评论文本
-        text = ' '.join(df['cleaned_comment'].astype(str))
-
-        # 生成词云
-        wc = WordCloud(
-            width=width,
-            height=height,
-            background_color=background_color,
-            max_words=max_words,
-            colormap=colormap
-        ).generate(text)
-
-        # 将词云转换为base64编码的图片
-        plt.figure(figsize=(10, 6))
-        plt.imshow(wc, interpolation='bilinear')
-        plt.axis('off')
-
-        # 保存到内存缓冲区
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0, dpi=100)
-        plt.close()
-
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-        # 存储到DataManager
+        chart = render_chart(data_manager, 'wordcloud', movie_name=movie_name,
+                             width=width, height=height, background_color=background_color,
+                             max_words=max_words, colormap=colormap, font_path=font_path)
+
+        # 存储到DataManager，data为ChartArtifact，需要内嵌时调用to_data_uri()
         data_manager.store_visual3(f"{movie_name}_wordcloud", {
             'type': 'wordcloud',
-            'data': img_base64,
+            'data': chart,
             'format': 'png',
             'params': {
                 'width': width,
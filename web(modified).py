@@ -1,113 +1,231 @@
-from flask import Flask, request, jsonify, render_template, send_file, send_from_directory
-from storage import DataManager  # 确保你已经导入了DataManager类
+from flask import Flask, request, jsonify, render_template, send_file, send_from_directory, make_response, url_for
+from jobs import job_queue
+from storage import enable_copy_on_write, warm_up
+from visualization import chart_etag, render_chart
+from workspace import init_app, current_workspace
+from exporting import export_response
+import profiling
+import os
 import pandas as pd
-from io import BytesIO
-
-data_manager = DataManager()
 
 app = Flask(__name__, template_folder='templates')
+init_app(app)  # 每个会话使用独立的DataManager(读写锁保护)，数据与结果在请求间保留
+profiling.init_app(app)  # 各阶段耗时写入 Server-Timing 响应头，/metrics 输出性能指标
+enable_copy_on_write()  # 导出快照为惰性拷贝，只在应用入口修改pandas的全局设置
+if os.environ.get('WARM_UP_IMPORTS') == '1':
+    warm_up()  # 重型库默认在首次使用时导入；预先加载应用的主进程中设置该变量，fork出的工作进程直接复用
 
 @app.route('/')
 def main():
     return render_template('index.html')
 
+# ================== API Jobs Block ==================
+
+def submit_job(kind, params):
+    # 提交后台作业并立即返回作业id，完成后结果合并到当前会话
+    job = job_queue.submit(kind, params, workspace=current_workspace())
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('get_job_status', job_id=job.id),
+        'result_url': url_for('get_job_result', job_id=job.id)
+    }), 202
+
+@app.route('/api_jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'作业 {job_id} 不存在或已过期'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api_jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'作业 {job_id} 不存在或已过期'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
+
+# ================== API Export Helper ==================
+
+def stream_export(df, download_name):
+    # 按 ?format=csv/parquet/arrow&compression=gzip/zstd 分批流式导出
+    # df 为只读的内部对象，会话中的结果只会被整体替换，发送期间不会被原地修改
+    try:
+        return export_response(df, download_name, request.args.get('format', 'csv'),
+                               request.args.get('compression') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # ================== API Analyze Block ==================
 
 @app.route('/api_analyze', methods=['GET'])
 def call_api_analyze():
     # 分析豆瓣TOP250 - 静态文件路径
-    data_manager.load_data1('data/douban_top250.csv')
-    data_manager.clean_data1()
-    data_manager.analyze_data()
-    return data_manager.visual1() 
+    # 后台作业完成后的结果为各图表的ETag，图片通过 /api_chart/<chart_type> 获取
+    return submit_job('analyze', {
+        'file_path': 'data/douban_top250.csv',
+        'backend': request.args.get('backend', 'plotly'),
+        'stream': request.args.get('stream') == '1'  # 分块读取清洗，适合大文件
+    })
 
 @app.route('/export_analyze', methods=['GET'])
 def export_analyze():
-    if data_manager.cleaned_data_top250 is None:
+    # 直接导出会话中已有的分析结果，不重新计算
+    with current_workspace().read() as data_manager:
+        result = data_manager.export_analysis_result_top250(copy=False)
+    if result is None:
         return jsonify({'error': '暂无可用的分析结果，请先完成分析操作'}), 400
-    data_manager.load_data1('data/douban_top250.csv')
-    data_manager.clean_data1()
-    data_manager.analyze_data()
-    df = data_manager.export_analysis_result_top250()
-
-    csv_bytes = BytesIO()
-    df.to_csv(csv_bytes, index=False, encoding='utf-8-sig')
-    csv_bytes.seek(0)
-
-    return send_file(
-        csv_bytes,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='豆瓣top250_分析结果.csv'
-    )
+    return stream_export(result['clustered_data'], '豆瓣top250_分析结果')
+
+@app.route('/api_k_sweep', methods=['GET'])
+def call_api_k_sweep():
+    # 并行比较 k_min ~ k_max 个聚类，结果为各k的inertia/silhouette对比表、最优k与按最优k渲染的图表ETag
+    k_min = request.args.get('k_min', 2, type=int)
+    k_max = request.args.get('k_max', 10, type=int)
+    if k_min < 2 or k_max < k_min:
+        return jsonify({'error': '聚类个数范围无效，需满足 2 <= k_min <= k_max'}), 400
+    return submit_job('k_sweep', {
+        'file_path': 'data/douban_top250.csv',
+        'k_min': k_min,
+        'k_max': k_max,
+        'backend': request.args.get('backend', 'plotly')
+    })
 
 # ================== API Predict Block ==================
 
 @app.route('/api_predict', methods=['GET'])
 def call_api_predict():
     country = request.args.get('country', '中国')  # 默认为中国
-    file_path = f'data/country_data_{country}.csv'
-    data_manager.load_data2(country, file_path)
-    data_manager.clean_data2(country)
-    data_manager.predict_data(country)
-    return data_manager.visual2() 
+    return submit_job('predict', {
+        'country': country,
+        'file_path': f'data/country_data_{country}.csv',
+        'auto_order': request.args.get('auto_order') == '1'  # 自动定阶
+    })
 
 @app.route('/export_predict', methods=['GET'])
 def export_predict():
+    # 导出会话中与当前数据文件一致的预测结果；尚未预测或数据已变化时提交预测作业，完成后重新导出
     country = request.args.get('country', '中国')
     file_path = f'data/country_data_{country}.csv'
-    data_manager.load_data2(country, file_path)
-    data_manager.clean_data2(country)
-    data_manager.predict_data(country)
-    df = data_manager.export_prediction_result_country(country)
-
-    if df is None:
-        return jsonify({'error': f'暂无 {country} 的预测结果，请先完成预测操作'}), 400
-
-    csv_bytes = BytesIO()
-    df.to_csv(csv_bytes, index=False, encoding='utf-8-sig')
-    csv_bytes.seek(0)
-
-    return send_file(
-        csv_bytes,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'票房预测_{country}_分析结果.csv'
-    )
+    with current_workspace().read() as data_manager:
+        current = data_manager._read_file(file_path) is data_manager.data_country.get(country)
+        predictions = data_manager.export_prediction_result_country(country, copy=False) if current else None
+    if predictions is None:
+        return submit_job('predict', {'country': country, 'file_path': file_path})
+    # 预测结果为 {指标: 预测值列表}，每个指标一列
+    return stream_export(pd.DataFrame(predictions), f'票房预测_{country}_分析结果')
+
+@app.route('/api_predict_batch', methods=['GET'])
+def call_api_predict_batch():
+    # 一次请求预测多个国家，如 ?country=中国&country=日本；结果为各国预测值与失败序列的错误信息
+    countries = request.args.getlist('country') or ['中国']
+    return submit_job('predict_batch', {
+        'files': {country: f'data/country_data_{country}.csv' for country in countries},
+        'timeout': request.args.get('timeout', type=float),  # 单次拟合超时(秒)
+        'auto_order': request.args.get('auto_order') == '1'  # 自动定阶
+    })
+
+# ================== API Pipeline Block ==================
+
+@app.route('/api_pipeline', methods=['GET'])
+def call_api_pipeline():
+    # 后台作业中通过带记忆的流水线运行：输入文件与参数未变的阶段直接复用上次的结果
+    # ?target=top250&backend=plotly 或 ?target=country&country=中国&country=日本
+    target = request.args.get('target', 'top250')
+    if target == 'top250':
+        return submit_job('pipeline', {
+            'target': 'top250',
+            'file_path': 'data/douban_top250.csv',
+            'backend': request.args.get('backend', 'plotly')
+        })
+    if target == 'country':
+        countries = request.args.getlist('country') or ['中国']
+        return submit_job('pipeline', {
+            'target': 'country',
+            'files': {country: f'data/country_data_{country}.csv' for country in countries},
+            'auto_order': request.args.get('auto_order') == '1'
+        })
+    return jsonify({'error': f'不支持的流水线: {target}'}), 400
+
+@app.route('/api_pipeline/explain', methods=['GET'])
+def call_api_pipeline_explain():
+    # 最近一次流水线运行中各阶段是复用(hit)还是重新运行(run)
+    with current_workspace().read() as data_manager:
+        return jsonify(data_manager.explain_pipeline())
 
 # ================== API Comments Block ==================
 
 @app.route('/api_comments', methods=['GET'])
 def call_api_comments():
     movie = request.args.get('movie', '肖申克的救赎')
-    file_path = f'data/comments_{movie}.csv'
-    data_manager.load_data3(movie, file_path)
-    data_manager.clean_data3(movie)
-    data_manager.analyze_data3(movie) 
-    return data_manager.visual3()  
+    # 后台作业增量更新词频索引(只清洗、统计新增的评论)并生成词云
+    return submit_job('comments', {
+        'movie': movie,
+        'file_path': f'data/comments_{movie}.csv',
+        'stream': request.args.get('stream') == '1'  # 分块读取清洗，不在内存中保留完整评论
+    })
 
 @app.route('/export_comments', methods=['GET'])
 def export_comments():
     movie = request.args.get('movie', '肖申克的救赎')
     file_path = f'data/comments_{movie}.csv'
-    data_manager.load_data3(movie, file_path)
-    data_manager.clean_data3(movie)
-    data_manager.analyze_data3(movie) 
-    df = data_manager.export_analysis_result_comments(movie)
+    with current_workspace().write() as data_manager:
+        if data_manager.load_data3(movie, file_path) or movie not in data_manager.comment_index:
+            data_manager.analyze_data3(movie)
+        df = data_manager.export_analysis_result_comments(movie)
 
     if df is None:
         return jsonify({'error': f'暂无 {movie} 的评论分析结果，请先完成分析操作'}), 400
+    return stream_export(df, f'评论分析_{movie}_词频统计')
 
-    csv_bytes = BytesIO()
-    df.to_csv(csv_bytes, index=False, encoding='utf-8-sig')
-    csv_bytes.seek(0)
-
-    return send_file(
-        csv_bytes,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'评论分析_{movie}_词频统计.csv'
-    )
+@app.route('/export_cleaned_comments', methods=['GET'])
+def export_cleaned_comments():
+    # 导出清洗(分词)后的完整评论数据，数据量大时同样分批流式发送
+    movie = request.args.get('movie', '肖申克的救赎')
+    with current_workspace().write() as data_manager:
+        df = data_manager.export_cleaned_data_comments(movie, copy=False)
+        if df is not None and 'cleaned_comment' not in df.columns:
+            # 载入时只是原始数据快照，导出前完成清洗分词，结果保留供后续导出复用
+            data_manager.clean_data3(movie)
+            df = data_manager.export_cleaned_data_comments(movie, copy=False)
+    if df is None:
+        return jsonify({'error': f'暂无 {movie} 的评论数据，请先完成分析操作'}), 400
+    return stream_export(df, f'评论数据_{movie}_清洗结果')
+
+# ================== API Chart Block ==================
+
+CHART_CACHE_CONTROL = 'private, max-age=0, must-revalidate'  # 浏览器每次用ETag向服务端确认
+
+@app.route('/api_chart/<chart_type>', methods=['GET'])
+def call_api_chart(chart_type):
+    # 图表按输入数据与渲染参数只渲染一次，浏览器携带 If-None-Match 时返回304
+    if chart_type == 'prediction_comparison':
+        params = {'country_name': request.args.get('country', '中国')}
+    elif chart_type == 'wordcloud':
+        params = {'movie_name': request.args.get('movie', '肖申克的救赎')}
+    elif chart_type in ('3d_scatter', 'parallel_coords', 'radar_chart'):
+        # backend: plotly / matplotlib / json(返回Plotly JSON，由浏览器端渲染)
+        params = {'backend': request.args.get('backend', 'plotly')}
+    else:
+        params = {}
+    with current_workspace().read() as data_manager:
+        try:
+            etag = chart_etag(data_manager, chart_type, **params)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            chart = render_chart(data_manager, chart_type, **params)
+            response = send_file(chart.open(), mimetype=chart.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CHART_CACHE_CONTROL
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,15 +1,31 @@
 from flask import Flask, request, jsonify, send_file, render_template
-from storage import DataManager
+from workspace import init_app, current_workspace
+from storage import dataset_cache, enable_copy_on_write, warm_up
+from exporting import export_response
+import profiling
+import os
+import secrets
 import pandas as pd
-from io import BytesIO
 
 app = Flask(__name__)
+init_app(app)  # 每个会话使用独立的DataManager，数据与结果在请求间保留
+profiling.init_app(app)  # 各阶段耗时写入 Server-Timing 响应头，/metrics 输出性能指标
+enable_copy_on_write()  # 导出快照为惰性拷贝，只在应用入口修改pandas的全局设置
+if os.environ.get('WARM_UP_IMPORTS') == '1':
+    warm_up()  # 重型库默认在首次使用时导入；预先加载应用的主进程中设置该变量，fork出的工作进程直接复用
 
 # 主页，显示上传按钮
 @app.route('/')
 def main():
     return render_template('index.html')
 
+def save_upload(workspace, file):
+    # 保存文件到会话目录，文件名唯一，并发上传互不覆盖
+    os.makedirs(workspace.upload_dir, exist_ok=True)
+    filepath = os.path.join(workspace.upload_dir, secrets.token_hex(8) + '.' + file.filename.split('.')[-1])
+    file.save(filepath)
+    return filepath
+
 # API接口：处理文件上传
 @app.route('/api/upload', methods=['POST'])
 def api_upload_file():
@@ -21,23 +37,21 @@ def api_upload_file():
         return jsonify({"error": "No selected file"}), 400
 
     try:
-        # 保存文件到临时位置
-        filepath = 'tempuploadedfile.' + file.filename.split('.')[-1]
-        file.save(filepath)
-
-        # 初始化数据管理器
-        datamanager = DataManager()
-        datamanager.load_data(filepath)
+        workspace = current_workspace()
+        filepath = save_upload(workspace, file)
 
-        # 获取数据信息
-        df = datamanager.export_raw_data()
+        # 按列名识别数据类型，加载到当前会话的数据管理器
+        with workspace.write() as datamanager:
+            info = datamanager.load_data(filepath, file_name=file.filename)
 
         # 返回成功响应
         return jsonify({
             "success": True,
             "message": "File uploaded and processed successfully",
-            "data_shape": str(df.shape),
-            "columns": list(df.columns)
+            "kind": info['kind'],
+            "name": info['name'],
+            "data_shape": str(tuple(info['shape'])),
+            "columns": info['columns']
         }), 200
 
     except ValueError as e:
@@ -45,14 +59,42 @@ def api_upload_file():
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+# API接口：批量上传，一次请求加载TOP250、各国票房、电影评论等多个文件
+@app.route('/api/upload_batch', methods=['POST'])
+def api_upload_batch():
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({"error": "No selected file"}), 400
+
+    try:
+        workspace = current_workspace()
+        paths = {save_upload(workspace, file): file.filename for file in files}
+
+        # 并行解析放在会话锁外，解析结果进入进程级缓存，加载时直接命中
+        dataset_cache.prefetch(list(paths))
+        with workspace.write() as datamanager:
+            results = datamanager.load_files(paths)
+
+        report = [dict(results[path], file=file_name) for path, file_name in paths.items()]
+        failed = sum('error' in item for item in report)
+        return jsonify({
+            "success": failed == 0,
+            "message": f"{len(report) - failed} of {len(report)} files loaded",
+            "files": report
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 # API接口：获取分析结果
 @app.route('/api/analyze', methods=['GET'])
 def api_analyze():
     try:
-        # 初始化数据管理器
-        datamanager = DataManager()
-
-        datamanager.analyze()
+        # 分析当前会话已上传的数据，并生成全部图表
+        with current_workspace().write() as datamanager:
+            datamanager.clean_data1()
+            datamanager.analyze_data()
+            datamanager.visual1()
 
         # 返回成功响应
         return jsonify({
@@ -67,39 +109,42 @@ def api_analyze():
 @app.route('/api/show_image/<vistype>', methods=['GET'])
 def api_show_image(vistype):
     try:
-        # 初始化数据管理器
-        datamanager = DataManager()
-        # 获取指定类型的图表对象
-        image_path = datamanager.get_visual(vistype)
+        # 获取当前会话中指定类型的图表对象
+        with current_workspace().read() as datamanager:
+            chart = datamanager.get_visual(vistype)
+        if chart is None:
+            return jsonify({"error": f"No image available for {vistype}"}), 404
 
-        # 返回图片文件
-        return send_file(image_path, mimetype='image/png')
+        # 直接从内存缓冲区发送原始字节
+        return send_file(chart.open(), mimetype=chart.mimetype)
 
     except Exception as e:
         return jsonify({"error": f"Image display failed: {str(e)}"}), 500
 
-# API接口：导出数据
+# API接口：导出数据，?format=csv/parquet/arrow&compression=gzip/zstd
 @app.route('/api/export/<datatype>', methods=['GET'])
 def api_export(datatype):
     try:
-        # 初始化数据管理器
-        datamanager = DataManager()
-        # 根据类型导出数据
-        if datatype == 'raw':
-            data = datamanager.export_raw_data()
-        elif datatype == 'cleaned':
-            data = datamanager.export_cleaned_data()
-        elif datatype == 'result':
-            data = datamanager.export_analysis_result()
-        else:
-            return jsonify({"error": "Invalid data type"}), 400
-
-        # 将数据转换为CSV格式并返回文件
-        csvfile = BytesIO()
-        data.to_csv(csvfile, index=False)
-        csvfile.seek(0)
-        return send_file(csvfile, mimetype='text/csv', as_attachment=True, download_name=f'{datatype}.csv')
+        with current_workspace().read() as datamanager:
+            # 根据类型导出当前会话的数据(只读，不复制)
+            if datatype == 'raw':
+                data = datamanager.export_data_top250(copy=False)
+            elif datatype == 'cleaned':
+                data = datamanager.export_cleaned_data_top250(copy=False)
+            elif datatype == 'result':
+                result = datamanager.export_analysis_result_top250(copy=False)
+                data = None if result is None else result['clustered_data']
+            else:
+                return jsonify({"error": "Invalid data type"}), 400
+            if data is None:
+                return jsonify({"error": f"No {datatype} data available"}), 404
+
+        # 分批序列化并以分块传输发送，不在内存中生成完整文件
+        return export_response(data, datatype, request.args.get('format', 'csv'),
+                               request.args.get('compression') or None)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Export failed: {str(e)}"}), 500
 
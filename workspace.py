@@ -0,0 +1,274 @@
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from storage import DataManager
+from visualization import ChartArtifact
+
+WORKSPACE_COOKIE = 'workspace_id'  # 保存会话工作区id的cookie名
+WORKSPACE_IDLE_TIMEOUT = 30 * 60  # 工作区闲置多久后被回收(秒)
+WORKSPACE_MAX_ENTRIES = 64  # 同时保留的工作区个数上限
+WORKSPACE_MAX_BYTES = 1024 * 1024 * 1024  # 全部工作区的内存上限(字节)
+WORKSPACE_UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.uploads')  # 会话上传文件目录
+
+_WORKSPACE_ID = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class RWLock:
+    """
+    读写锁：允许多个读者并发，写者独占
+    有写者等待时新的读者排队，避免写者饿死；不可重入
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @property
+    def busy(self):
+        """是否有读者、写者持有或等待该锁"""
+        with self._cond:
+            return bool(self._readers or self._writer or self._waiting_writers)
+
+
+def estimate_nbytes(value, seen=None):
+    """
+    估算对象中DataFrame、Series与图表占用的内存(字节)
+    同一对象只计一次；与数据集缓存共享的DataFrame也计入，结果偏大
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, ChartArtifact):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v, seen) for v in value)
+    return 0
+
+
+class Workspace:
+    """
+    单个会话的工作区：持有该会话的DataManager，读写均需通过 read()/write() 加锁
+    """
+
+    def __init__(self, workspace_id):
+        self.id = workspace_id
+        self.manager = DataManager()
+        self.lock = RWLock()
+        self.last_access = time.monotonic()
+        self.nbytes = 0  # 最近一次写操作结束时估算的内存占用
+        self._pins = 0  # 尚未合并结果的后台作业数
+        self._pins_lock = threading.Lock()
+
+    def pin(self):
+        """有后台作业的结果待合并到该工作区，合并前不被回收"""
+        with self._pins_lock:
+            self._pins += 1
+
+    def unpin(self):
+        """后台作业的结果已合并(或作业失败)"""
+        with self._pins_lock:
+            self._pins -= 1
+
+    @property
+    def pinned(self):
+        with self._pins_lock:
+            return self._pins > 0
+
+    @property
+    def in_use(self):
+        """正在被请求使用，或有待合并结果的后台作业"""
+        return self.lock.busy or self.pinned
+
+    @property
+    def upload_dir(self):
+        """该会话上传文件的保存目录"""
+        return os.path.join(WORKSPACE_UPLOAD_DIR, self.id)
+
+    @contextmanager
+    def read(self):
+        """只读访问DataManager，可与其他读者并发"""
+        self.lock.acquire_read()
+        try:
+            self.last_access = time.monotonic()
+            yield self.manager
+        finally:
+            self.lock.release_read()
+
+    @contextmanager
+    def write(self):
+        """独占访问DataManager，结束时重新估算内存占用"""
+        self.lock.acquire_write()
+        try:
+            self.last_access = time.monotonic()
+            yield self.manager
+        finally:
+            self.nbytes = estimate_nbytes(vars(self.manager))
+            self.lock.release_write()
+
+    def discard(self):
+        """删除该会话上传的文件"""
+        upload_dir = self.upload_dir
+        if not os.path.isdir(upload_dir):
+            return
+        for name in os.listdir(upload_dir):
+            try:
+                os.remove(os.path.join(upload_dir, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(upload_dir)
+        except OSError:
+            pass
+
+
+class WorkspaceStore:
+    """
+    进程内的会话工作区存储
+    - 按会话id复用DataManager，上传、分析、可视化、导出的结果在请求间保留
+    - 闲置超过 idle_timeout 的工作区被回收
+    - 按LRU淘汰，工作区个数不超过 max_entries，估算内存总量不超过 max_bytes
+    - 只接受本进程签发过且仍保留的工作区id，客户端自带的其他id一律换成新签发的id，避免会话固定
+    正在被请求使用或有待合并结果的后台作业的工作区不会被淘汰
+    """
+
+    def __init__(self, idle_timeout=WORKSPACE_IDLE_TIMEOUT, max_entries=WORKSPACE_MAX_ENTRIES,
+                 max_bytes=WORKSPACE_MAX_BYTES):
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._workspaces = OrderedDict()  # key: 工作区id, value: Workspace
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(24)
+
+    @staticmethod
+    def valid_id(workspace_id):
+        return bool(workspace_id) and _WORKSPACE_ID.match(workspace_id) is not None
+
+    def get(self, workspace_id=None):
+        """
+        获取会话工作区，id无效、不是本进程签发的或工作区已被回收时，以新签发的id新建
+        :param workspace_id: 工作区id，通常来自cookie
+        :return: Workspace
+        """
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id) if self.valid_id(workspace_id) else None
+            if workspace is None:
+                workspace_id = self.new_id()
+                workspace = Workspace(workspace_id)
+                self._workspaces[workspace_id] = workspace
+            else:
+                self._workspaces.move_to_end(workspace_id)
+            workspace.last_access = time.monotonic()
+            evicted = self._evict(keep=workspace_id)
+        for old in evicted:
+            old.discard()
+        return workspace
+
+    def drop(self, workspace_id):
+        """删除指定的工作区"""
+        with self._lock:
+            workspace = self._workspaces.pop(workspace_id, None)
+        if workspace is not None:
+            workspace.discard()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(workspace.nbytes for workspace in self._workspaces.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._workspaces)
+
+    def _evict(self, keep):
+        """回收闲置工作区，再按LRU淘汰直到满足个数与内存上限，返回被淘汰的工作区"""
+        now = time.monotonic()
+        evicted = []
+        for workspace_id, workspace in list(self._workspaces.items()):
+            if workspace_id != keep and now - workspace.last_access > self.idle_timeout and not workspace.in_use:
+                evicted.append(self._workspaces.pop(workspace_id))
+
+        total = sum(workspace.nbytes for workspace in self._workspaces.values())
+        for workspace_id, workspace in list(self._workspaces.items()):
+            if len(self._workspaces) <= self.max_entries and total <= self.max_bytes:
+                break
+            if workspace_id == keep or workspace.in_use:
+                continue
+            evicted.append(self._workspaces.pop(workspace_id))
+            total -= workspace.nbytes
+        return evicted
+
+
+workspace_store = WorkspaceStore()  # 进程内共享的会话工作区存储
+
+
+def init_app(app, store=workspace_store):
+    """
+    为Flask应用注册会话工作区：请求开始时按cookie取出工作区(保存在 g.workspace)，
+    新建的工作区在响应中写回cookie
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _attach_workspace():
+        g.workspace = store.get(request.cookies.get(WORKSPACE_COOKIE))
+
+    @app.after_request
+    def _remember_workspace(response):
+        workspace = g.get('workspace')
+        if workspace is not None and request.cookies.get(WORKSPACE_COOKIE) != workspace.id:
+            response.set_cookie(WORKSPACE_COOKIE, workspace.id, max_age=store.idle_timeout,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def current_workspace():
+    """当前请求的会话工作区"""
+    from flask import g
+    return g.workspace